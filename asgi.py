@@ -0,0 +1,5 @@
+from myapp.async_routes import application
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(application, host='127.0.0.1', port=8000)
@@ -11,3 +11,5 @@ pip install Flask-JWT-Extended
 pip install Flask-Cors
 pip install python-dotenv
 pip install Flask-SocketIO
+pip install aiosqlite
+pip install uvicorn
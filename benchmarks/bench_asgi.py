@@ -0,0 +1,283 @@
+""" compares requests/sec and p99 latency of the sync server (gunicorn run:app) and the
+    async one (uvicorn asgi:application) at 100 and 1000 concurrent clients
+
+    usage: python benchmarks/bench_asgi.py [--clients 100 1000] [--seconds 10] [--workers 1]
+                                           [--threads 1] [--write-ratio 0] [--load-processes 2]
+
+    Both servers are started on the same seeded database files. Every client keeps an
+    HTTP/1.1 connection open (reconnecting when the server closes it, as gunicorn's sync
+    workers do after every response) and sends its next request as soon as the previous
+    answer arrives, cycling through the read actions of /customer and the waitlist pages.
+    --write-ratio of the requests are LOG-TRANSACTION instead. Before measuring, every
+    request of the mix is sent to both servers once and the responses are compared.
+    Needs gunicorn and uvicorn.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_asgi.db')
+os.environ.setdefault('SECRETE_KEY', 'fundsflow-benchmark-secret-key-0001')
+os.environ['RATELIMIT_ENABLED'] = '0'
+os.environ['DOCUMENT_WORKERS'] = '0'
+os.environ.setdefault('METRICS_SLOW_REQUEST_SECONDS', '1000')
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+from myapp import app, db  # noqa: E402
+from myapp.models import User, Customer, Transaction, WaitList  # noqa: E402
+from myapp.functions import ledger  # noqa: E402
+
+
+def seed(users, customers, transactions, waitlist):
+    """ fills the database and returns the access token of every user """
+    with app.app_context():
+        db.create_all()
+        accounts = [User(email='owner{}@bench.test'.format(number), password='x') for number in range(users)]
+        db.session.add_all(accounts)
+        db.session.add_all(WaitList(name='entry {}'.format(number), email='entry{}@bench.test'.format(number),
+                                    phone='080{:08d}'.format(number), reg_date=datetime(2024, 1, 1))
+                           for number in range(waitlist))
+        db.session.commit()
+        customer_ids = {}
+        for user in accounts:
+            rows = [Customer(first_name=random.choice(['Ada', 'Obi', 'Ngozi', 'Chinedu', 'Emeka']),
+                             last_name='Customer {}'.format(number), phone_number='0800', shipping_address='Lagos',
+                             user_id=user.id) for number in range(customers)]
+            db.session.add_all(rows)
+            db.session.flush()
+            customer_ids[user.id] = [row.id for row in rows]
+            for row in rows:
+                for number in range(transactions):
+                    transaction = Transaction(customer_id=row.id, product_name='Rice', delivery_address='Lagos',
+                                              rate=50, number_of_items=2, total_price=100, delivery_fee=0,
+                                              amount_payable=100, amount_paid=0, remaining_balance=100,
+                                              payment_status='pending',
+                                              order_date=datetime(2024, 1, 1) + timedelta(days=number))
+                    db.session.add(transaction)
+                    db.session.flush()
+                    ledger.record_transaction_change(row.id, after=ledger.balance_state(transaction))
+        db.session.commit()
+        return [(create_access_token(identity=user), customer_ids[user.id]) for user in accounts]
+
+
+def request_mix(accounts):
+    """ returns the requests clients cycle through: (method, target, body or None, token or None) """
+    mix = []
+    for token, customer_ids in accounts:
+        customer_id = customer_ids[0]
+        mix.extend([
+            ('POST', '/customer?action=FETCH-CUSTOMERS', {}, token),
+            ('POST', '/customer?action=FETCH-CUSTOMER-TRANSACTIONS', {'customer_id': customer_id, 'limit': 20}, token),
+            ('POST', '/customer?action=SEARCH-CUSTOMERS', {'query': 'ngo'}, token),
+            ('POST', '/customer?action=FETCH-BALANCE-SUMMARY', {}, token),
+            ('POST', '/customer?action=FETCH-BALANCE-SUMMARY', {'customer_id': customer_id}, token),
+            ('GET', '/waitlist/fetch?limit=50', None, None),
+        ])
+    return mix
+
+
+def log_transaction(accounts, number):
+    token, customer_ids = accounts[number % len(accounts)]
+    payload = {'customer_id': customer_ids[number % len(customer_ids)], 'product_name': 'Beans',
+               'delivery_address': 'Lagos', 'rate': 10, 'number_of_items': 1, 'total_price': 10, 'delivery_fee': 0}
+    return 'POST', '/transactions?action=LOG-TRANSACTION&response=delta', payload, token
+
+
+def encode_request(method, target, body, token):
+    payload = json.dumps(body).encode() if body is not None else b''
+    head = ['{} {} HTTP/1.1'.format(method, target), 'Host: 127.0.0.1', 'Content-Length: {}'.format(len(payload))]
+    if body is not None:
+        head.append('Content-Type: application/json')
+    if token:
+        head.append('Authorization: Bearer {}'.format(token))
+    return ('\r\n'.join(head) + '\r\n\r\n').encode() + payload
+
+
+async def read_response(reader):
+    """ reads one response and returns (status, body, whether the connection stays open) """
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    status = int(head[0].split()[1])
+    headers = {}
+    for line in head[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        chunks = []
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            chunks.append(await reader.readexactly(size + 2))
+            if size == 0:
+                break
+        body = b''.join(chunk[:-2] for chunk in chunks)
+    else:
+        body = await reader.read()
+    return status, body, headers.get('connection', '').lower() != 'close' and 'content-length' in headers
+
+
+async def exchange(port, connection, data):
+    """ sends one request, reopening the connection if needed, and returns (status, body, connection) """
+    if connection is None:
+        connection = await asyncio.open_connection('127.0.0.1', port)
+    reader, writer = connection
+    writer.write(data)
+    status, body, keep_alive = await read_response(reader)
+    if not keep_alive:
+        writer.close()
+        connection = None
+    return status, body, connection
+
+
+async def client(port, requests, writes, write_ratio, start, warmup_until, deadline, latencies, counts):
+    connection = None
+    number = start
+    while time.perf_counter() < deadline:
+        data = writes[number % len(writes)] if write_ratio and random.random() < write_ratio \
+            else requests[number % len(requests)]
+        number += 1
+        began = time.perf_counter()
+        try:
+            status, _, connection = await exchange(port, connection, data)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            connection, status = None, None
+        if began < warmup_until:
+            continue
+        if status == 200:
+            latencies.append(time.perf_counter() - began)
+        else:
+            counts['errors'] += 1
+    if connection is not None:
+        connection[1].close()
+
+
+def load_process(port, requests, writes, write_ratio, clients, first_client, warmup, seconds, results):
+    resource.setrlimit(resource.RLIMIT_NOFILE, resource.getrlimit(resource.RLIMIT_NOFILE))
+
+    async def main():
+        now = time.perf_counter()
+        latencies, counts = [], {'errors': 0}
+        await asyncio.gather(*(client(port, requests, writes, write_ratio, (first_client + number) * 7,
+                                      now + warmup, now + warmup + seconds, latencies, counts)
+                               for number in range(clients)))
+        return latencies, counts['errors']
+
+    results.put(asyncio.run(main()))
+
+
+def measure(port, requests, writes, args, clients):
+    results = multiprocessing.Queue()
+    share = [clients // args.load_processes + (number < clients % args.load_processes)
+             for number in range(args.load_processes)]
+    processes = [multiprocessing.Process(target=load_process, args=(
+        port, requests, writes, args.write_ratio, count, sum(share[:number]), args.warmup, args.seconds, results))
+        for number, count in enumerate(share) if count]
+    for process in processes:
+        process.start()
+    latencies, errors = [], 0
+    for _ in processes:
+        process_latencies, process_errors = results.get()
+        latencies.extend(process_latencies)
+        errors += process_errors
+    for process in processes:
+        process.join()
+    latencies.sort()
+    percentile = (lambda share: latencies[min(len(latencies) - 1, int(len(latencies) * share))] * 1000) \
+        if latencies else (lambda share: float('nan'))
+    return len(latencies) / args.seconds, percentile(0.5), percentile(0.99), errors
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def start_server(command, port):
+    process = subprocess.Popen(command, cwd=ROOT, env=os.environ.copy(), stdout=subprocess.DEVNULL)
+    for _ in range(300):
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return process
+        except OSError:
+            if process.poll() is not None:
+                raise SystemExit('server did not start: {}'.format(' '.join(command)))
+            time.sleep(0.1)
+    process.terminate()
+    raise SystemExit('server did not start in time: {}'.format(' '.join(command)))
+
+
+async def fetch_all(port, mix):
+    responses, connection = [], None
+    for request in mix:
+        status, body, connection = await exchange(port, connection, encode_request(*request))
+        responses.append((status, body))
+    if connection is not None:
+        connection[1].close()
+    return responses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument('--workers', type=int, default=1, help='server processes of either server')
+    parser.add_argument('--threads', type=int, default=1, help='threads per gunicorn worker (1: sync workers)')
+    parser.add_argument('--write-ratio', type=float, default=0.0)
+    parser.add_argument('--load-processes', type=int, default=2)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--customers', type=int, default=50)
+    parser.add_argument('--transactions', type=int, default=20)
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard if hard != resource.RLIM_INFINITY else 65536, hard))
+
+    accounts = seed(args.users, args.customers, args.transactions, waitlist=500)
+    mix = request_mix(accounts)
+    requests = [encode_request(*request) for request in mix]
+    writes = [encode_request(*log_transaction(accounts, number)) for number in range(100)]
+
+    ports = {'sync': free_port(), 'async': free_port()}
+    commands = {
+        'sync': [sys.executable, '-m', 'gunicorn', '--workers', str(args.workers), '--threads', str(args.threads),
+                 '--backlog', '4096', '--log-level', 'warning', '--bind', '127.0.0.1:{}'.format(ports['sync']),
+                 'run:app'],
+        'async': [sys.executable, '-m', 'uvicorn', '--workers', str(args.workers), '--backlog', '4096',
+                  '--log-level', 'warning', '--no-access-log', '--host', '127.0.0.1', '--port', str(ports['async']),
+                  'asgi:application'],
+    }
+    servers = {mode: start_server(command, ports[mode]) for mode, command in commands.items()}
+    try:
+        sync_responses, async_responses = (asyncio.run(fetch_all(ports[mode], mix)) for mode in ('sync', 'async'))
+        mismatches = sum(1 for left, right in zip(sync_responses, async_responses) if left != right)
+        print('{} requests in the mix, {} responses differ between the servers'.format(len(mix), mismatches))
+        print('workers: {}, gunicorn threads: {}, write ratio: {}, {} s per run'.format(
+            args.workers, args.threads, args.write_ratio, args.seconds))
+        print('{:<6} {:>8} {:>10} {:>9} {:>9} {:>7}'.format('mode', 'clients', 'req/sec', 'p50 ms', 'p99 ms',
+                                                            'errors'))
+        for clients in args.clients:
+            for mode in ('sync', 'async'):
+                rate, p50, p99, errors = measure(ports[mode], requests, writes, args, clients)
+                print('{:<6} {:>8} {:>10.1f} {:>9.1f} {:>9.1f} {:>7}'.format(mode, clients, rate, p50, p99, errors))
+    finally:
+        for server in servers.values():
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+""" compares rows/sec of IMPORT-TRANSACTIONS with one LOG-TRANSACTION call per row
+
+    usage: python benchmarks/bench_bulk_import.py [--rows 20000] [--single-rows 500]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_import.db')
+os.environ.setdefault('SECRETE_KEY', 'fundsflow-benchmark-secret-key-0001')
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+from myapp import app, db  # noqa: E402
+from myapp.models import User, Customer  # noqa: E402
+
+
+def make_row(customer_id, number):
+    return {'customer_id': customer_id, 'product_name': 'Item {}'.format(number), 'product_description': None,
+            'order_date': '2023-01-01 00:00:00', 'delivery_address': 'Lagos', 'delivery_date': None,
+            'rate': 10, 'number_of_items': 3, 'discount': 0, 'total_price': 30, 'delivery_fee': 2,
+            'invoice_link': None, 'receipt_link': None, 'amount_paid': number % 2 * 32,
+            'due_date': '2023-02-01 00:00:00'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--single-rows', type=int, default=500)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        user = User(email='bench@example.com', password='x')
+        db.session.add(user)
+        db.session.commit()
+        customer = Customer(first_name='Bench', phone_number='0800', user_id=user.id)
+        db.session.add(customer)
+        db.session.commit()
+        customer_id = customer.id
+        headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity=user))}
+
+    client = app.test_client()
+
+    start = time.perf_counter()
+    for number in range(args.single_rows):
+        client.post('/transactions?action=LOG-TRANSACTION&response=delta', json=make_row(customer_id, number),
+                    headers=headers)
+    single = args.single_rows / (time.perf_counter() - start)
+
+    rows = [make_row(customer_id, number) for number in range(args.rows)]
+    start = time.perf_counter()
+    response = client.post('/transactions?action=IMPORT-TRANSACTIONS', json=rows, headers=headers)
+    bulk = args.rows / (time.perf_counter() - start)
+    assert response.get_json(force=True)['data']['inserted'] == args.rows
+
+    print('LOG-TRANSACTION per row : {:>10.1f} rows/sec ({} rows)'.format(single, args.single_rows))
+    print('IMPORT-TRANSACTIONS     : {:>10.1f} rows/sec ({} rows, batch size {})'.format(
+        bulk, args.rows, app.config['BULK_IMPORT_BATCH_SIZE']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+""" allocates business ids from several processes at once, checks they are all unique
+    and reports allocations/sec for a few block sizes
+
+    usage: python benchmarks/bench_business_id.py [--allocations 100000] [--processes 4]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_business_id.db')
+os.environ.setdefault('SECRETE_KEY', 'fundsflow-benchmark-secret-key-0001')
+
+from myapp import app, db  # noqa: E402
+from myapp.functions import resources as resource  # noqa: E402
+
+
+def allocate(count, block_size):
+    app.config['BUSINESS_ID_BLOCK_SIZE'] = block_size
+    with app.app_context():
+        db.engine.dispose()  # do not share the parent's connections after fork
+        return [resource.generate_business_id('Benchmark Stores') for _ in range(count)]
+
+
+def run(allocations, processes, block_size):
+    with app.app_context():
+        db.session.execute(db.text('DELETE FROM id_sequence'))
+        db.session.commit()
+    per_process = allocations // processes
+    with multiprocessing.Pool(processes) as pool:
+        start = time.perf_counter()
+        results = pool.starmap(allocate, [(per_process, block_size)] * processes)
+        elapsed = time.perf_counter() - start
+    ids = [business_id for result in results for business_id in result]
+    assert len(set(ids)) == len(ids), 'duplicate business ids'
+    print('block size {:>5}: {:>7} unique ids in {:6.2f}s, {:>9.0f} allocations/sec'.format(
+        block_size, len(ids), elapsed, len(ids) / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--allocations', type=int, default=100000)
+    parser.add_argument('--processes', type=int, default=4)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+    print('{} processes'.format(args.processes))
+    for block_size in (1, 100, 1000):
+        run(args.allocations, args.processes, block_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+""" measures SEARCH-CUSTOMERS latency over a large customer table
+
+    Fills a scratch SQLite database with --customers customers spread over --businesses
+    businesses, then runs type-ahead searches (2 to 5 letter prefixes of a name, street
+    or email, sometimes two words) for random businesses and reports the latency
+    percentiles of search.search_customers:
+
+        python benchmarks/bench_customer_search.py [--customers 1000000] [--businesses 1000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+FIRST_NAMES = ['Ada', 'Adaeze', 'Adamu', 'Bola', 'Chidi', 'Chinedu', 'Emeka', 'Fatima', 'Funke', 'Ibrahim', 'Ifeoma',
+               'Kemi', 'Musa', 'Ngozi', 'Obinna', 'Segun', 'Tunde', 'Uche', 'Yemi', 'Zainab']
+LAST_NAMES = ['Abubakar', 'Adeyemi', 'Bello', 'Eze', 'Nwosu', 'Obi', 'Okafor', 'Okonkwo', 'Olawale', 'Usman']
+STREETS = ['Marina Road', 'Allen Avenue', 'Ahmadu Bello Way', 'Awolowo Road', 'Broad Street', 'Ring Road']
+CITIES = ['Lagos', 'Abuja', 'Kano', 'Ibadan', 'Enugu', 'Kaduna', 'Benin', 'Jos']
+
+
+def customer_rows(count, businesses, first_user_id):
+    for number in range(count):
+        first, last = random.choice(FIRST_NAMES), random.choice(LAST_NAMES)
+        yield {'first_name': first, 'last_name': last,
+               'email': '{}.{}{}@example.com'.format(first, last, number).lower(),
+               'phone_number': '080{:08d}'.format(number),
+               'shipping_address': '{} {}, {}'.format(random.randint(1, 200), random.choice(STREETS),
+                                                      random.choice(CITIES)),
+               'user_id': first_user_id + number % businesses, 'ledger_version': 0}
+
+
+def queries(count):
+    for _ in range(count):
+        word = random.choice(FIRST_NAMES + LAST_NAMES + STREETS + CITIES).split()[0].lower()
+        query = word[:random.randint(2, min(5, len(word)))]
+        if random.random() < 0.3:
+            query = '{} {}'.format(random.choice(FIRST_NAMES).lower(), query)
+        yield query
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--customers', type=int, default=1000000)
+    parser.add_argument('--businesses', type=int, default=1000)
+    parser.add_argument('--searches', type=int, default=2000)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(1)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_search.db')
+    os.environ.setdefault('SECRETE_KEY', 'fundsflow-benchmark-secret-key-0001')
+    from myapp import app, db
+    from myapp.models import User, Customer
+    from myapp.functions import search
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(User), [{'email': 'business{}@example.com'.format(number), 'password': 'x'}
+                                             for number in range(args.businesses)])
+        first_user_id = db.session.query(db.func.min(User.id)).scalar()
+
+        start = time.perf_counter()
+        rows = customer_rows(args.customers, args.businesses, first_user_id)
+        while True:
+            batch = [row for _, row in zip(range(10000), rows)]
+            if not batch:
+                break
+            db.session.execute(db.insert(Customer), batch)
+        db.session.commit()
+        print('{} customers of {} businesses inserted and indexed in {:.1f} s'.format(
+            args.customers, args.businesses, time.perf_counter() - start))
+
+        latencies, found = [], 0
+        for query in queries(args.searches):
+            user_id = first_user_id + random.randrange(args.businesses)
+            start = time.perf_counter()
+            found += len(search.search_customers(user_id, query, args.limit))
+            latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    print('{} searches, {:.1f} results on average'.format(len(latencies), found / len(latencies)))
+    for name, fraction in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99)):
+        print('{}  : {:>8.2f} ms'.format(name, latencies[max(0, int(len(latencies) * fraction) - 1)] * 1000))
+    print('mean : {:>8.2f} ms'.format(statistics.fmean(latencies) * 1000))
+
+
+if __name__ == '__main__':
+    main()
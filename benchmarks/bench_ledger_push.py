@@ -0,0 +1,138 @@
+""" measures how long a LOG-TRANSACTION takes to reach every client subscribed to /ledger
+
+    By default the clients are Socket.IO test clients inside this process, which
+    measures the server-side fan-out cost without any network in between:
+
+        python benchmarks/bench_ledger_push.py [--clients 1000] [--writes 50]
+
+    With --url the clients are real Socket.IO connections to a running server (needs
+    `pip install "python-socketio[client]"`). Pass an access token of an existing user
+    and the id of one of that user's customers:
+
+        python benchmarks/bench_ledger_push.py --url http://localhost:5000 --token <jwt> --customer-id 1
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+TRANSACTION = {'product_name': 'Rice', 'delivery_address': 'Lagos', 'rate': 50, 'number_of_items': 2,
+               'total_price': 100, 'delivery_fee': 10}
+
+
+def report(latencies, clients):
+    latencies = sorted(latencies)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print('{} clients, {} writes'.format(clients, len(latencies)))
+    print('fan-out latency p50 : {:>8.2f} ms'.format(statistics.median(latencies) * 1000))
+    print('fan-out latency p95 : {:>8.2f} ms'.format(p95 * 1000))
+    print('fan-out latency max : {:>8.2f} ms'.format(latencies[-1] * 1000))
+
+
+def run_in_process(args):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_push.db')
+    os.environ.setdefault('SECRETE_KEY', 'fundsflow-benchmark-secret-key-0001')
+    from flask_jwt_extended import create_access_token
+    from myapp import app, db, socketio
+    from myapp.models import User, Customer
+
+    with app.app_context():
+        db.create_all()
+        user = User(email='bench@example.com', password='x')
+        db.session.add(user)
+        db.session.commit()
+        customer = Customer(first_name='Bench', phone_number='0800', user_id=user.id)
+        db.session.add(customer)
+        db.session.commit()
+        customer_id = customer.id
+        token = create_access_token(identity=user)
+
+    clients = [socketio.test_client(app, namespace='/ledger', auth={'token': token}) for _ in range(args.clients)]
+    # half the clients listen on the business room only, the other half on the customer room too
+    for client in clients[::2]:
+        client.emit('subscribe', {'customer_id': customer_id}, namespace='/ledger')
+
+    http = app.test_client()
+    headers = {'Authorization': 'Bearer {}'.format(token)}
+    latencies = []
+    for _ in range(args.writes):
+        start = time.perf_counter()
+        http.post('/transactions?action=LOG-TRANSACTION&response=delta',
+                  json=dict(TRANSACTION, customer_id=customer_id), headers=headers)
+        latencies.append(time.perf_counter() - start)
+        for client in clients:
+            received = client.get_received('/ledger')
+            assert len(received) == 1 and received[0]['name'] == 'transaction_logged'
+    report(latencies, args.clients)
+
+
+def run_against_server(args):
+    import socketio  # python-socketio[client]
+
+    pending = []
+    lock = threading.Lock()
+    received = threading.Event()
+
+    def listen(client):
+        @client.on('transaction_logged', namespace='/ledger')
+        def on_logged(_data):
+            with lock:
+                pending.append(time.perf_counter())
+                if len(pending) == args.clients:
+                    received.set()
+
+    clients = []
+    for _ in range(args.clients):
+        client = socketio.Client()
+        listen(client)
+        client.connect(args.url, namespaces=['/ledger'], auth={'token': args.token}, transports=['websocket'])
+        clients.append(client)
+
+    body = json.dumps(dict(TRANSACTION, customer_id=args.customer_id)).encode()
+    latencies = []
+    for _ in range(args.writes):
+        pending.clear()
+        received.clear()
+        request = urllib.request.Request(args.url + '/transactions?action=LOG-TRANSACTION&response=delta', data=body,
+                                         headers={'Authorization': 'Bearer ' + args.token,
+                                                  'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        urllib.request.urlopen(request).read()
+        if not received.wait(args.timeout):
+            print('only {} of {} clients received the event'.format(len(pending), args.clients))
+            break
+        latencies.append(max(pending) - start)
+
+    for client in clients:
+        client.disconnect()
+    if latencies:
+        report(latencies, args.clients)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--writes', type=int, default=50)
+    parser.add_argument('--url', help='base URL of a running server')
+    parser.add_argument('--token', help='access token used by every client (with --url)')
+    parser.add_argument('--customer-id', type=int, help="one of the token user's customers (with --url)")
+    parser.add_argument('--timeout', type=float, default=10, help='seconds to wait for every client (with --url)')
+    args = parser.parse_args()
+
+    if args.url:
+        if not args.token or not args.customer_id:
+            parser.error('--url needs --token and --customer-id')
+        run_against_server(args)
+    else:
+        run_in_process(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+""" measures /login throughput at several password hash cost settings
+
+    usage: python benchmarks/bench_login.py [--logins 200] [--clients 8]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_login.db')
+os.environ.setdefault('SECRETE_KEY', 'fundsflow-benchmark-secret-key-0001')
+
+from myapp import app, db  # noqa: E402
+from myapp.models import User  # noqa: E402
+
+COST_SETTINGS = ['pbkdf2:sha256:100000', 'pbkdf2:sha256:300000', 'pbkdf2:sha256:600000',
+                 'scrypt:16384:8:1', 'scrypt:32768:8:1']
+PASSWORD = 'BenchPassword123#'
+
+
+def run(method, logins, clients):
+    app.config['PASSWORD_HASH_METHOD'] = method
+    email = '{}@bench.test'.format(method.replace(':', '_'))
+    with app.app_context():
+        User.add_user({'email': email, 'password': PASSWORD})
+
+    def login(_):
+        response = app.test_client().post('/login', json={'email': email, 'password': PASSWORD})
+        return response.get_json(force=True)['status'] == 1
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(login, range(logins)))
+        elapsed = time.perf_counter() - start
+    assert all(results), 'some logins failed'
+    return logins / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--clients', type=int, default=8)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+
+    print('hash workers: {}, clients: {}, logins per setting: {}'.format(
+        app.config['PASSWORD_HASH_WORKERS'], args.clients, args.logins))
+    for method in COST_SETTINGS:
+        print('{:<24} {:>8.1f} logins/sec'.format(method, run(method, args.logins, args.clients)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+""" measures what the request metrics add to a request
+
+    Times the request hooks and the per-statement engine events on their own, then
+    alternates rounds of FETCH-CUSTOMERS requests with METRICS_ENABLED on and off
+    (best round of each, as the difference is small next to the noise) and times
+    rendering /metrics:
+
+        python benchmarks/bench_metrics.py [--requests 2000] [--rounds 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='requests per round')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--customers', type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_metrics.db')
+    os.environ.setdefault('SECRETE_KEY', 'fundsflow-benchmark-secret-key-0001')
+    from flask_jwt_extended import create_access_token
+    from myapp import app, db
+    from myapp.models import User, Customer
+    from myapp.functions import metrics
+
+    with app.app_context():
+        db.create_all()
+        user = User(email='bench@example.com', password='x')
+        db.session.add(user)
+        db.session.commit()
+        db.session.add_all([Customer(first_name='Customer {}'.format(number), phone_number='0800', user_id=user.id)
+                            for number in range(args.customers)])
+        db.session.commit()
+        headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity=user))}
+
+    app.config['METRICS_SLOW_REQUEST_SECONDS'] = float('inf')
+    with app.test_request_context('/customer?action=FETCH-CUSTOMERS', method='POST'):
+        response = app.response_class('{}')
+
+        def hooks():
+            metrics._start_request()
+            metrics._measure_response(response)
+            metrics._finish_request()
+        per_request = min(timeit.repeat(hooks, number=10000, repeat=5)) / 10000
+
+        statement = db.text('SELECT 1')
+        select = lambda: db.session.execute(statement)  # noqa: E731
+        plain = min(timeit.repeat(select, number=10000, repeat=5)) / 10000
+        metrics._start_request()
+        measured = min(timeit.repeat(select, number=10000, repeat=5)) / 10000
+        metrics._finish_request()
+        db.session.remove()
+    metrics.reset()
+
+    print('request hooks : {:>8.1f} µs/request'.format(per_request * 1e6))
+    print('SQL events    : {:>8.1f} µs/statement'.format((measured - plain) * 1e6))
+
+    client = app.test_client()
+
+    def round_time(enabled):
+        app.config['METRICS_ENABLED'] = enabled
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            client.post('/customer?action=FETCH-CUSTOMERS', json={}, headers=headers)
+        return (time.perf_counter() - start) / args.requests
+
+    round_time(True)  # warm up
+    off, on = [], []
+    for _ in range(args.rounds):
+        off.append(round_time(False))
+        on.append(round_time(True))
+
+    print('{} requests x {} rounds of FETCH-CUSTOMERS'.format(args.requests, args.rounds))
+    print('metrics off   : {:>8.1f} µs/request'.format(min(off) * 1e6))
+    print('metrics on    : {:>8.1f} µs/request'.format(min(on) * 1e6))
+    print('difference    : {:>8.1f} µs/request'.format((min(on) - min(off)) * 1e6))
+
+    start = time.perf_counter()
+    with app.app_context():
+        body = metrics.render()
+    print('render        : {:>8.1f} ms for {} bytes'.format((time.perf_counter() - start) * 1000, len(body)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+""" measures the overhead the rate limiter adds to /login, /signup and /waitlist/add
+
+    Times a bare TokenBucketStore.take and a full check of the login limits (IP and
+    email buckets) inside a request context, against a mean budget of 50µs per request:
+
+        python benchmarks/bench_ratelimit.py [--requests 100000] [--clients 1000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+BUDGET_US = 50
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p99 = timings[max(0, int(len(timings) * 0.99) - 1)]
+    mean = statistics.fmean(timings)
+    print('{:<24} mean {:>6.2f} µs   p99 {:>6.2f} µs   {}'.format(
+        name, mean * 1e6, p99 * 1e6, 'ok' if mean * 1e6 <= BUDGET_US else 'OVER BUDGET'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=100000)
+    parser.add_argument('--clients', type=int, default=1000, help='distinct IPs and emails to spread requests over')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'bench_ratelimit.db')
+    os.environ['RATELIMIT_STORE_PATH'] = os.path.join(directory, 'buckets')
+    os.environ.setdefault('SECRETE_KEY', 'fundsflow-benchmark-secret-key-0001')
+    from myapp import app
+    from myapp.functions import ratelimit
+
+    # generous limits so every request takes the full path through both buckets
+    app.config['RATELIMIT_RULES'] = {'login': {'ip': '1000000/second', 'email': '1000000/second'}}
+
+    with app.app_context():
+        store = ratelimit.get_store()
+        timings = []
+        for number in range(args.requests):
+            key = 'login:ip:10.0.{}.{}'.format(number % args.clients // 256, number % 256)
+            start = time.perf_counter()
+            store.take(key, 1000000.0, 1000000)
+            timings.append(time.perf_counter() - start)
+        report('store.take', timings)
+
+    contexts = [app.test_request_context('/login', method='POST', json={'email': 'user{}@example.com'.format(number)},
+                                         environ_base={'REMOTE_ADDR': '10.1.{}.{}'.format(number // 256, number % 256)})
+                for number in range(args.clients)]
+    timings = []
+    for number in range(args.requests):
+        with contexts[number % args.clients]:
+            start = time.perf_counter()
+            ratelimit.check_request('login')
+            timings.append(time.perf_counter() - start)
+    report('check_request(login)', timings)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+""" compares rows/sec of serialising a customer's transactions from ORM objects with
+    strftime and json.dumps against the compiled field plans over result tuples
+
+    usage: python benchmarks/bench_serializers.py [--rows 20000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_serializers.db')
+os.environ.setdefault('SECRETE_KEY', 'fundsflow-benchmark-secret-key-0001')
+
+from myapp import app, db  # noqa: E402
+from myapp.models import User, Customer, Transaction  # noqa: E402
+from myapp.functions import resources as resource  # noqa: E402
+from myapp.functions import serializers  # noqa: E402
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def orm_serialize(customer_id):
+    """ the hand-built dicts the resource functions used before the field plans """
+    rows = []
+    for transaction in Transaction.query.filter_by(customer_id=customer_id).all():
+        rows.append({
+            'transaction_id': transaction.id,
+            'customer_id': transaction.customer_id,
+            'order_id': transaction.order_id,
+            'product_name': transaction.product_name,
+            'product_description': transaction.product_description,
+            'order_date': transaction.order_date.strftime(DATE_FORMAT) if transaction.order_date else None,
+            'delivery_address': transaction.delivery_address,
+            'delivery_date': transaction.delivery_date.strftime(DATE_FORMAT) if transaction.delivery_date else None,
+            'rate': transaction.rate,
+            'quantity': transaction.number_of_items,
+            'discount_applied': transaction.discount_applied,
+            'total_price': transaction.total_price,
+            'delivery_fee': transaction.delivery_fee,
+            'invoice_link': transaction.invoice_link,
+            'receipt_link': transaction.receipt_link,
+            'amount_paid': transaction.amount_paid,
+            'remaining_balance': transaction.remaining_balance,
+            'due_date': transaction.due_date.strftime(DATE_FORMAT) if transaction.due_date else None,
+            'payment_status': transaction.payment_status
+        })
+    return json.dumps({'status': 1, 'data': rows, 'message': '', 'error': [None]})
+
+
+def plan_serialize(customer_id):
+    rows = resource.fetch_customer_transactions(customer_id)
+    return serializers.dumps({'status': 1, 'data': rows, 'message': '', 'error': [None]})
+
+
+def best_rate(func, customer_id, rows, repeat):
+    best = None
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        func(customer_id)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return rows / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        user = User(email='bench@example.com', password='x')
+        db.session.add(user)
+        db.session.commit()
+        customer = Customer(first_name='Bench', phone_number='0800', user_id=user.id)
+        db.session.add(customer)
+        db.session.commit()
+        start_date = datetime(2023, 1, 1)
+        db.session.execute(Transaction.__table__.insert(), [
+            {'customer_id': customer.id, 'product_name': 'Item {}'.format(number), 'delivery_address': 'Lagos',
+             'order_date': start_date + timedelta(minutes=number), 'delivery_date': start_date,
+             'due_date': start_date + timedelta(days=30), 'rate': 10, 'number_of_items': 3, 'discount_applied': 0,
+             'total_price': 30, 'delivery_fee': 2, 'amount_payable': 32, 'amount_paid': 0,
+             'remaining_balance': 32, 'payment_status': 'pending'} for number in range(args.rows)])
+        db.session.commit()
+
+        assert json.loads(orm_serialize(customer.id)) == json.loads(plan_serialize(customer.id))
+        before = best_rate(orm_serialize, customer.id, args.rows, args.repeat)
+        after = best_rate(plan_serialize, customer.id, args.rows, args.repeat)
+
+    print('ORM objects + json.dumps : {:>10.1f} rows/sec'.format(before))
+    print('field plan + {:<12}: {:>10.1f} rows/sec ({:.1f}x)'.format(
+        'orjson' if serializers.orjson else 'json', after, after / before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+""" compares SQLite read/write throughput of several worker processes with and
+    without the production storage profile (WAL, busy_timeout and friends)
+
+    usage: python benchmarks/bench_sqlite_concurrency.py [--workers 4] [--seconds 5] [--write-ratio 0.2]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from myapp.functions.storage import apply_pragmas  # noqa: E402
+
+PROFILES = {
+    'default': {},
+    'production': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 5000,
+                   'cache_size': -20000, 'mmap_size': 268435456, 'temp_store': 'MEMORY'},
+}
+
+
+def setup(path, pragmas):
+    connection = sqlite3.connect(path)
+    apply_pragmas(connection, pragmas)
+    connection.execute('CREATE TABLE ledger (id INTEGER PRIMARY KEY, customer_id INTEGER, amount REAL)')
+    connection.execute('CREATE INDEX ix_ledger_customer_id ON ledger (customer_id)')
+    connection.executemany('INSERT INTO ledger (customer_id, amount) VALUES (?, ?)',
+                           [(number % 500, number) for number in range(50000)])
+    connection.commit()
+    connection.close()
+
+
+def worker(path, pragmas, seconds, write_ratio, results):
+    connection = sqlite3.connect(path)
+    apply_pragmas(connection, pragmas)
+    reads = writes = locked = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        customer_id = random.randrange(500)
+        try:
+            if random.random() < write_ratio:
+                connection.execute('INSERT INTO ledger (customer_id, amount) VALUES (?, ?)', (customer_id, 1.0))
+                connection.commit()
+                writes += 1
+            else:
+                connection.execute('SELECT SUM(amount) FROM ledger WHERE customer_id = ?', (customer_id,)).fetchone()
+                reads += 1
+        except sqlite3.OperationalError:
+            # 'database is locked'
+            connection.rollback()
+            locked += 1
+    results.put((reads, writes, locked))
+
+
+def run(profile, workers, seconds, write_ratio):
+    path = os.path.join(tempfile.mkdtemp(), 'bench_{}.db'.format(profile))
+    setup(path, PROFILES[profile])
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(path, PROFILES[profile], seconds, write_ratio, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    totals = [sum(values) for values in zip(*[results.get() for _ in processes])]
+    for process in processes:
+        process.join()
+    reads, writes, locked = totals
+    print('{:<11} reads/sec {:>9.0f}   writes/sec {:>8.0f}   locked errors {:>6}'.format(
+        profile, reads / seconds, writes / seconds, locked))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    args = parser.parse_args()
+
+    print('{} workers, {:.0%} writes, {}s per profile'.format(args.workers, args.write_ratio, args.seconds))
+    for profile in PROFILES:
+        run(profile, args.workers, args.seconds, args.write_ratio)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""customer search index
+
+Revision ID: 5a7e2c91d4b3
+Revises: ed1beccdea49
+Create Date: 2026-10-18 13:30:33.533218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a7e2c91d4b3'
+down_revision = 'ed1beccdea49'
+branch_labels = None
+depends_on = None
+
+
+# full-text index of customers, kept in sync by triggers (see myapp/functions/search.py)
+COLUMNS = 'user_id, first_name, last_name, email, phone_number, shipping_address'
+NEW = 'new.id, new.user_id, new.first_name, new.last_name, new.email, new.phone_number, new.shipping_address'
+OLD = 'old.id, old.user_id, old.first_name, old.last_name, old.email, old.phone_number, old.shipping_address'
+
+
+def upgrade():
+    op.execute("CREATE VIRTUAL TABLE customer_search USING fts5({}, content='customer', content_rowid='id', "
+               "tokenize='unicode61 remove_diacritics 2', prefix='2 3', detail=column)".format(COLUMNS))
+    op.execute("CREATE TRIGGER customer_search_insert AFTER INSERT ON customer BEGIN "
+               "INSERT INTO customer_search(rowid, {0}) VALUES ({1}); END".format(COLUMNS, NEW))
+    op.execute("CREATE TRIGGER customer_search_delete AFTER DELETE ON customer BEGIN "
+               "INSERT INTO customer_search(customer_search, rowid, {0}) VALUES ('delete', {1}); END"
+               .format(COLUMNS, OLD))
+    op.execute("CREATE TRIGGER customer_search_update AFTER UPDATE OF {0} ON customer BEGIN "
+               "INSERT INTO customer_search(customer_search, rowid, {0}) VALUES ('delete', {1}); "
+               "INSERT INTO customer_search(rowid, {0}) VALUES ({2}); END".format(COLUMNS, OLD, NEW))
+    # index the customers that already exist
+    op.execute("INSERT INTO customer_search(customer_search) VALUES ('rebuild')")
+
+
+def downgrade():
+    op.execute('DROP TRIGGER IF EXISTS customer_search_update')
+    op.execute('DROP TRIGGER IF EXISTS customer_search_delete')
+    op.execute('DROP TRIGGER IF EXISTS customer_search_insert')
+    op.execute('DROP TABLE IF EXISTS customer_search')
@@ -0,0 +1,70 @@
+"""waitlist database
+
+Revision ID: 8bcf7bcae0c2
+Revises: 395e7f4ae58b
+Create Date: 2026-10-18 13:50:55.514718
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from flask import current_app
+
+
+# revision identifiers, used by Alembic.
+revision = '8bcf7bcae0c2'
+down_revision = '395e7f4ae58b'
+branch_labels = None
+depends_on = None
+
+
+# the waitlist moves to its own database (the 'waitlist' bind, WAITLIST_DATABASE_URL). That database is
+# not versioned by alembic: its table is created here, and by create_all when it is new.
+metadata = sa.MetaData()
+wait_list = sa.Table(
+    'wait_list', metadata,
+    sa.Column('wid', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=225), nullable=False),
+    sa.Column('phone', sa.String(length=18), nullable=True),
+    sa.Column('email', sa.String(length=100), nullable=True),
+    sa.Column('business_type', sa.String(length=100), nullable=True),
+    sa.Column('reason', sa.Text(), nullable=True),
+    sa.Column('reg_date', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('wid'),
+    sa.UniqueConstraint('email'),
+    sa.Index('ix_wait_list_phone', 'phone'),
+)
+
+
+def waitlist_engine():
+    """ the engine of the waitlist bind, or None if it is the database being migrated """
+    engine = current_app.extensions['migrate'].db.engines['waitlist']
+    if engine.url == op.get_bind().engine.url:
+        return None
+    return engine
+
+
+def copy_rows(source, target):
+    rows = source.execute(sa.select(wait_list)).mappings().all()
+    if rows:
+        target.execute(wait_list.insert().prefix_with('OR IGNORE'), [dict(row) for row in rows])
+
+
+def upgrade():
+    engine = waitlist_engine()
+    if engine is None:
+        return
+    with engine.begin() as target:
+        wait_list.create(target, checkfirst=True)
+        copy_rows(op.get_bind(), target)
+    with op.batch_alter_table('wait_list', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_wait_list_phone'))
+    op.drop_table('wait_list')
+
+
+def downgrade():
+    engine = waitlist_engine()
+    if engine is None:
+        return
+    wait_list.create(op.get_bind())
+    with engine.connect() as source:
+        copy_rows(source, op.get_bind())
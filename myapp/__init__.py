@@ -4,17 +4,26 @@ from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from flask_sqlalchemy import SQLAlchemy
 from flask_socketio import SocketIO
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 
 app = Flask(__name__)
 app.config.from_pyfile('config.py')
-db = SQLAlchemy(app)
 
-cors = CORS(app, resources={r"/*": {"origins": "*"}})
+from myapp.functions import storage, metrics, conditional, shards
+storage.init_app(app)
+metrics.init_app(app)
+conditional.init_app(app)
+if app.config['PROXY_FIX_X_FOR']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+db = SQLAlchemy(app, session_options={'class_': shards.ShardedSession})
+shards.init_app(app)
+
+cors = CORS(app, resources={r"/*": {"origins": "*"}}, expose_headers=['ETag'])
 app.config['CORS_HEADERS'] = "Content-Type"
-migrate = Migrate(app, db)
+migrate = Migrate(app, db, render_as_batch=True)
 jwt = JWTManager(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+socketio = SocketIO(app, cors_allowed_origins="*", message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'])
 
 """
 Initialize the Flask app.
@@ -26,4 +35,5 @@ Attributes:
 
 # Import routes after db initialization
 from myapp import routes
+from myapp import commands
 
@@ -0,0 +1,473 @@
+""" this module serves the HTTP API over ASGI, see asgi.py
+
+    Logins, the waitlist and the read actions of /customer are served on the event loop
+    and query the databases through async SQLAlchemy (functions/async_db.py). Each of
+    them runs in a Flask request context pushed inside the request's own task (Flask
+    keeps its contexts in contextvars), so the JWT checks, rate limits, ETags, request
+    metrics, compression and CORS headers of the Flask app apply unchanged and the
+    responses match the Flask views'. The JWT checks answer from the per-process user
+    cache and token blocklist; only their rare misses query the database synchronously.
+
+    Every other request, including every action that writes the ledger, runs the Flask
+    app itself on a pool of ASGI_THREADS threads, as a threaded WSGI server would. SQLite
+    takes one writer at a time, so those writes gain little from the event loop, and the
+    ledger bookkeeping keeps a single implementation. With SHARDING_ENABLED, /customer goes
+    to the Flask app as well: shard engines are opened by the sync session only.
+
+    Socket.IO is not served here; clients keep connecting to the WSGI server (run.py).
+"""
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qs
+from flask import Response, request
+from flask_jwt_extended import current_user, verify_jwt_in_request
+from sqlalchemy import delete, func, or_, select
+from werkzeug.exceptions import HTTPException
+from myapp import app
+from myapp.models import User, Customer, CustomerBalance, UserBalance, WaitList
+from myapp.functions import async_db, conditional, ledger, passwords, ratelimit, search, shards
+from myapp.functions import resources as resource
+from myapp.functions.serializers import CUSTOMER_PLAN, TRANSACTION_PLAN, WAITLIST_PLAN, dumps
+
+# (endpoint, method, action) -> coroutine serving it on the event loop, see native()
+NATIVE_VIEWS = {}
+# endpoints whose tables move to the business shards with SHARDING_ENABLED
+SHARDED_ENDPOINTS = frozenset(('customer',))
+
+_executor = None
+
+
+def native(endpoint: str, method: str, *actions):
+    """ registers a coroutine as the event loop version of a Flask view's actions """
+    def decorator(view):
+        for action in actions or (None,):
+            NATIVE_VIEWS[(endpoint, method, action)] = view
+        return view
+    return decorator
+
+
+def invalid_action(data):
+    message = 'Invalid request action argument or no valid resource parameter in request data'
+    return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+
+
+@native('login', 'POST')
+async def login():
+    """ routes.login on async SQLAlchemy """
+    limited = ratelimit.limited_response('login')
+    if limited:
+        return limited
+    data = request.get_json()
+
+    if 'email' in data and 'password' in data:
+        email, password = data['email'], data['password']
+        async with async_db.session() as session:
+            user = await session.scalar(select(User).filter_by(email=email).limit(1))
+            # check if user exists
+            if not user:
+                message = 'User does not exist.'
+                return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+
+            # check if password matches
+            try:
+                password_ok = await passwords.verify_password_async(user.password, password)
+            except passwords.PasswordCheckBusy:
+                message = 'Server is busy. Please try again shortly.'
+                return dumps({'status': 2, 'data': None, 'message': message, 'error': [message]}), 503
+            if not password_ok:
+                message = 'Password is incorrect.'
+                return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+
+            # check if user is active
+            if user.activated != 1:
+                message = 'User has not confirmed their email'
+                return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+
+            # check if user is blocked
+            if user.block_stat != 0:
+                message = 'Account is blocked. Pleased contact admin.'
+                return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+
+            # upgrade the stored hash if the configured cost has changed since it was made
+            if passwords.needs_rehash(user.password):
+                user.password = await asyncio.to_thread(passwords.hash_password, password)
+                await session.commit()
+
+        # log user in
+        response = user.encode_auth_token(user)
+        if response['status'] == 1:
+            worker = resource.serialize_user(user)
+            worker['access_token'] = response['access_token']
+            worker['refresh_token'] = response['refresh_token']
+            message = 'Login was successful.'
+            return dumps({'status': 1, 'data': worker, 'message': message, 'error': [None]})
+
+        # else
+        message = 'Login was not successful.'
+        return dumps({'status': 2, 'data': data, 'message': message, 'error': response['error']})
+
+    message = 'user parameters not recognised.'
+    return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+
+
+@native('customer', 'POST', 'FETCH-CUSTOMERS')
+async def fetch_customers():
+    """ FETCH-CUSTOMERS of routes.customer on async SQLAlchemy """
+    verify_jwt_in_request()
+    request.get_json()
+    async with async_db.session() as session:
+        # the version is read before the data, so a concurrent write can only make the tag older
+        version = await session.scalar(select(User.ledger_version).where(User.id == current_user.id))
+        etag = conditional.make_etag('FETCH-CUSTOMERS', current_user.id, version)
+        if conditional.is_fresh(etag):
+            return conditional.not_modified(etag)
+
+        worker = CUSTOMER_PLAN.rows(await session.execute(resource.customer_query(current_user.id)))
+    return conditional.tagged(dumps({'status': 1, 'data': worker, 'message': 'Succeeded.', 'error': [None]}), etag)
+
+
+@native('customer', 'POST', 'FETCH-CUSTOMER-TRANSACTIONS')
+async def fetch_customer_transactions():
+    """ FETCH-CUSTOMER-TRANSACTIONS of routes.customer on async SQLAlchemy """
+    verify_jwt_in_request()
+    data = request.get_json()
+    if 'customer_id' not in data:
+        return invalid_action(data)
+
+    filters = {key: data[key] for key in ('payment_status', 'due_date_from', 'due_date_to',
+                                          'order_date_from', 'order_date_to') if data.get(key)}
+    version_query = select(Customer.ledger_version).where(Customer.id == data['customer_id'],
+                                                          Customer.user_id == current_user.id)
+    async with async_db.session() as session:
+        version = await session.scalar(version_query)
+        if version is None:
+            message = 'Customer not found'
+            return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+
+        etag = conditional.make_etag('FETCH-CUSTOMER-TRANSACTIONS', current_user.id, data['customer_id'], version,
+                                     filters, data.get('limit'), data.get('cursor'))
+        if conditional.is_fresh(etag):
+            return conditional.not_modified(etag)
+
+        try:
+            if 'limit' in data or 'cursor' in data:
+                # keyset pagination: data holds 'transactions' and 'next_cursor'
+                limit = int(data.get('limit') or app.config['TRANSACTIONS_PAGE_SIZE'])
+                limit = max(1, min(limit, app.config['TRANSACTIONS_MAX_PAGE_SIZE']))
+                statement = resource.customer_transactions_page_query(data['customer_id'], limit,
+                                                                      data.get('cursor'), filters)
+                rows = (await session.execute(statement)).all()
+                worker = resource.customer_transactions_page(rows, limit, await session.scalar(version_query))
+            else:
+                statement = resource.filter_customer_transactions(data['customer_id'], filters)
+                worker = TRANSACTION_PLAN.rows(await session.execute(statement))
+        except (TypeError, ValueError) as e:
+            message = str(e)
+            return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+
+    body = dumps({'status': 1, 'data': worker, 'message': 'Succeeded', 'error': [None]})
+    return conditional.tagged(body, etag)
+
+
+@native('customer', 'POST', 'SEARCH-CUSTOMERS')
+async def search_customers():
+    """ SEARCH-CUSTOMERS of routes.customer on async SQLAlchemy """
+    verify_jwt_in_request()
+    data = request.get_json()
+    if 'query' not in data:
+        return invalid_action(data)
+
+    if not isinstance(data['query'], str):
+        message = 'query must be a string'
+        return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+    try:
+        limit = int(data.get('limit') or app.config['CUSTOMER_SEARCH_LIMIT'])
+    except (TypeError, ValueError) as e:
+        return dumps({'status': 2, 'data': data, 'message': str(e), 'error': [str(e)]})
+    limit = max(1, min(limit, app.config['CUSTOMER_SEARCH_MAX_LIMIT']))
+    worker = []
+    statement = search.search_query(current_user.id, data['query'], limit)
+    if statement is not None:
+        async with async_db.session() as session:
+            worker = CUSTOMER_PLAN.rows(await session.execute(statement))
+    return dumps({'status': 1, 'data': worker, 'message': 'Succeeded.', 'error': [None]})
+
+
+@native('customer', 'POST', 'FETCH-BALANCE-SUMMARY')
+async def fetch_balance_summary():
+    """ FETCH-BALANCE-SUMMARY of routes.customer on async SQLAlchemy """
+    verify_jwt_in_request()
+    data = request.get_json()
+    user_id, customer_id = current_user.id, data.get('customer_id')
+    async with async_db.session() as session:
+        if customer_id is None:
+            worker = ledger.balance_summary({'user_id': user_id}, await session.get(UserBalance, user_id))
+        elif await session.scalar(select(func.count(Customer.id)).filter_by(id=customer_id, user_id=user_id)):
+            worker = ledger.balance_summary({'customer_id': customer_id},
+                                            await session.get(CustomerBalance, customer_id))
+        else:
+            message = 'Customer not found'
+            return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+
+    return dumps({'status': 1, 'data': worker, 'message': 'Succeeded.', 'error': [None]})
+
+
+async def stream_waitlist(batch_size=500):
+    """ resources.stream_waitlist on async SQLAlchemy """
+    async with async_db.session() as session:
+        result = await session.stream(WAITLIST_PLAN.select().order_by(WaitList.wid)
+                                      .execution_options(yield_per=batch_size))
+        async for row in result:
+            yield (dumps(WAITLIST_PLAN.one(row)) + '\n').encode()
+
+
+@native('waitList', 'GET', 'fetch')
+async def fetch_waitlist():
+    """ waitlist 'fetch' of routes.waitList on async SQLAlchemy """
+    if request.args.get('format') == 'ndjson':
+        # one entry per line, built lazily from a server-side cursor
+        return Response(stream_waitlist(), mimetype='application/x-ndjson')
+
+    async with async_db.session() as session:
+        if 'limit' in request.args or 'cursor' in request.args:
+            try:
+                limit = int(request.args.get('limit') or app.config['WAITLIST_PAGE_SIZE'])
+                limit = max(1, min(limit, app.config['WAITLIST_MAX_PAGE_SIZE']))
+                statement = resource.waitlist_page_query(limit, request.args.get('cursor'))
+            except (TypeError, ValueError) as e:
+                return dumps({'status': 2, 'data': None, 'message': str(e), 'error': [str(e)]}), 400
+            waitlist_data = resource.waitlist_page((await session.execute(statement)).all(), limit)
+        else:
+            waitlist_data = WAITLIST_PLAN.rows(await session.execute(WAITLIST_PLAN.select().order_by(WaitList.wid)))
+
+    return dumps({'status': 1, 'data': waitlist_data, 'message': 'Waitlist data fetched successfully',
+                  'error': [None]}), 200
+
+
+@native('waitList', 'POST', 'add')
+async def add_waitlist_entry():
+    """ waitlist 'add' of routes.waitList on async SQLAlchemy """
+    limited = ratelimit.limited_response('waitlist_add')
+    if limited:
+        return limited
+
+    data = request.get_json()
+    async with async_db.session() as session:
+        # check if email or phone number already exists
+        existing = (await session.execute(select(WaitList.email, WaitList.phone).where(
+            or_(WaitList.email == data['email'], WaitList.phone == data['phone'])))).all()
+        if any(email == data['email'] for email, _ in existing):
+            message = 'Email already exists'
+            return dumps({'status': 2, 'data': None, 'message': message, 'error': [message]}), 201
+        if existing:
+            message = 'Phone number already exists'
+            return dumps({'status': 2, 'data': None, 'message': message, 'error': [message]}), 201
+
+        # add new user to waitlist
+        new_waitlist_user = WaitList(
+            name=data['name'],
+            email=data['email'],
+            phone=data['phone'],
+            business_type=data['business_type'],
+            reason=data['reason'],
+            reg_date=datetime.now()
+        )
+        session.add(new_waitlist_user)
+        await session.commit()
+
+    # echo back only the new entry
+    worker = resource.serialize_waitlist_entry(new_waitlist_user)
+    worker['name'] = worker['name'].title()
+    return dumps({'status': 1, 'data': worker, 'message': 'Waitlist user added successfully', 'error': [None]}), 201
+
+
+@native('waitList', 'DELETE', 'remove')
+async def remove_waitlist_entry():
+    """ waitlist 'remove' of routes.waitList on async SQLAlchemy """
+    data = request.get_json()
+    if 'wid' in data:
+        try:
+            async with async_db.session() as session:
+                await session.execute(delete(WaitList).where(WaitList.wid == int(data['wid'])))
+                await session.commit()
+            return dumps({'status': 1, 'data': None, 'message': 'Waitlist user removed successfully',
+                          'error': [None]}), 200
+        except Exception:
+            # the same (unformatted) message as the Flask view
+            return dumps({'status': 2, 'data': None, 'message': 'Error deleteing user record: {e}',
+                          'error': ['Error deleting user record {e}']}), 200
+
+    return dumps({'status': 2, 'data': None, 'message': 'Invalid query', 'error': ['Invalid query']}), 200
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """ returns the thread pool that runs the Flask app, creating it on first use """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=app.config['ASGI_THREADS'], thread_name_prefix='asgi-wsgi')
+    return _executor
+
+
+async def read_body(receive) -> bytes:
+    """ reads the whole request body, or returns None if the client went away first """
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+def wsgi_environ(scope: dict, body: bytes) -> dict:
+    """ builds the WSGI environ of an ASGI http request whose body has been read """
+    server_name, server_port = scope.get('server') or ('localhost', None)
+    client_host, client_port = scope.get('client') or ('', 0)
+    root_path, path = scope.get('root_path', ''), scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode().decode('latin-1'),
+        'PATH_INFO': path.encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port or 80),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'REMOTE_ADDR': client_host,
+        'REMOTE_PORT': str(client_port),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1').upper().replace('-', '_'), value.decode('latin-1')
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = name if name == 'CONTENT_TYPE' else 'HTTP_' + name
+        environ[key] = '{},{}'.format(environ[key], value) if key in environ else value
+    return environ
+
+
+def native_view(environ: dict):
+    """ returns the coroutine serving a request on the event loop, or None if the Flask app serves it """
+    try:
+        endpoint, view_args = app.url_map.bind_to_environ(environ).match()
+    except HTTPException:
+        return None
+    if endpoint in SHARDED_ENDPOINTS and shards.enabled():
+        return None
+    action = view_args.get('query') or (parse_qs(environ['QUERY_STRING']).get('action') or [None])[0]
+    return NATIVE_VIEWS.get((endpoint, environ['REQUEST_METHOD'], action))
+
+
+def _asgi_headers(headers) -> list:
+    return [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+
+async def serve_native(view, environ: dict, send):
+    """ runs a native view the way Flask's wsgi_app runs a view, then sends its response """
+    with app.request_context(environ):
+        try:
+            try:
+                rv = app.preprocess_request()
+                if rv is None:
+                    rv = await view()
+            except Exception as e:
+                rv = app.handle_user_exception(e)
+            response = app.finalize_request(rv)
+        except Exception as e:
+            response = app.handle_exception(e)
+
+        # sent inside the context, so the teardown hooks (metrics) see the whole response
+        await send({'type': 'http.response.start', 'status': response.status_code,
+                    'headers': _asgi_headers(response.get_wsgi_headers(environ).to_wsgi_list())})
+        if hasattr(response.response, '__aiter__'):
+            async for chunk in response.response:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            body = b''
+        else:
+            body = b''.join(response.get_app_iter(environ))
+        await send({'type': 'http.response.body', 'body': body, 'more_body': False})
+
+
+async def serve_wsgi(environ: dict, send):
+    """ runs the Flask app on the thread pool, streaming its response back through the event loop """
+    loop = asyncio.get_running_loop()
+
+    def deliver(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    def run():
+        start = {}
+        started = False
+
+        def write(data):
+            nonlocal started
+            if not started:
+                deliver(start)
+                started = True
+            if data:
+                deliver({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+        def start_response(status, headers, exc_info=None):
+            start.update({'type': 'http.response.start', 'status': int(status.split(' ', 1)[0]),
+                          'headers': _asgi_headers(headers)})
+            return write
+
+        body = app(environ, start_response)
+        try:
+            for chunk in body:
+                write(chunk)
+            write(b'')
+            deliver({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+    await loop.run_in_executor(get_executor(), run)
+
+
+async def lifespan(receive, send):
+    global _executor
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await async_db.dispose()
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+                _executor = None
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """ the ASGI application: native views on the event loop, every other request on the Flask app """
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        # websockets (Socket.IO) are served by the WSGI entry point
+        if scope['type'] == 'websocket':
+            await send({'type': 'websocket.close', 'code': 1003})
+        return
+
+    body = await read_body(receive)
+    if body is None:
+        return
+    environ = wsgi_environ(scope, body)
+    view = native_view(environ)
+    if view is None:
+        await serve_wsgi(environ, send)
+    else:
+        await serve_native(view, environ, send)
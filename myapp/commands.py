@@ -0,0 +1,52 @@
+""" flask CLI commands for maintenance tasks. run them with `flask <command>` """
+import click
+from myapp import app
+from myapp.functions import ledger, reports, documents, outbox, search, overdue
+from myapp.functions import myfunctions as myfunc
+
+
+@app.cli.command('rebuild-balances')
+@click.option('--check', is_flag=True, help='Only report summaries that differ from the ledger.')
+def rebuild_balances(check):
+    """ recomputes the customer and user balance summaries from the transactions table """
+    differences = ledger.rebuild_balance_summaries(check_only=check)
+    for difference in differences:
+        click.echo(difference)
+    if check:
+        click.echo('{} summaries out of step with the ledger.'.format(len(differences)))
+    else:
+        click.echo('Balance summaries rebuilt ({} corrected).'.format(len(differences)))
+
+
+@app.cli.command('rollup-aging')
+@click.option('--date', 'as_of', default=None, help='Day to compute (YYYY-MM-DD), today if omitted.')
+def rollup_aging(as_of):
+    """ stores the receivables aging buckets of every user for the day. schedule it daily """
+    as_of = myfunc.parse_datetime(as_of).date() if as_of else None
+    click.echo('Aging rollup stored for {} users.'.format(reports.rollup_aging(as_of)))
+
+
+@app.cli.command('render-documents')
+def render_documents():
+    """ renders the document jobs still queued, e.g. after a restart, in this process """
+    click.echo('{} document jobs processed.'.format(documents.render_queued_jobs()))
+
+
+@app.cli.command('send-receipts')
+@click.option('--once', is_flag=True, help='Exit once nothing is due instead of polling for new receipts.')
+def send_receipts(once):
+    """ delivers the receipt emails queued in the outbox. run it as a long-lived worker """
+    click.echo('{} receipts attempted.'.format(outbox.send_receipts(app.config, once)))
+
+
+@app.cli.command('rebuild-customer-search')
+def rebuild_customer_search():
+    """ recreates the customer search index and its triggers, e.g. after a batch migration of customer """
+    click.echo('{} customers indexed.'.format(search.rebuild_index()))
+
+
+@app.cli.command('sweep-overdue')
+@click.option('--once', is_flag=True, help='Sweep once and exit instead of every OVERDUE_SWEEP_SECONDS.')
+def sweep_overdue(once):
+    """ marks pending transactions overdue once their due date has passed. run it as a worker or from cron """
+    click.echo('{} transactions marked overdue.'.format(overdue.run_sweeper(app.config, once)))
@@ -1,15 +1,167 @@
 import os
+import tempfile
 from datetime import timedelta
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 db_path = os.path.join(basedir, 'data', 'fundsflow.db')
 
-SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', f'sqlite:///{db_path}')
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+
+def _waitlist_url(url):
+    """ a sqlite file <name>_wait.db next to the main database file, or the same database otherwise """
+    if url.startswith('sqlite:///') and url.endswith('.db'):
+        return url[:-len('.db')] + '_wait.db'
+    return url
+
+
+# the waitlist gets its own database, so marketing signups never wait for the write lock of payments
+WAITLIST_DATABASE_URL = os.environ.get('WAITLIST_DATABASE_URL', _waitlist_url(SQLALCHEMY_DATABASE_URI))
+SQLALCHEMY_BINDS = {'waitlist': WAITLIST_DATABASE_URL}
+
+# sqlite storage profile applied to every new connection, see functions/storage.py.
+# SQLITE_STORAGE_PROFILE=default keeps sqlite's own defaults (rollback journal, synchronous=FULL).
+if os.environ.get('SQLITE_STORAGE_PROFILE', 'production') == 'default':
+    SQLITE_PRAGMAS = {}
+else:
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -20000)),  # negative values are KiB
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 268435456)),
+        'temp_store': os.environ.get('SQLITE_TEMP_STORE', 'MEMORY'),
+    }
+
+# connection pool of file databases (in-memory databases keep a single shared connection)
+if SQLALCHEMY_DATABASE_URI not in ('sqlite://', 'sqlite:///:memory:'):
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 3600)),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '0') == '1',
+    }
+
+# one database file per business for customer and transaction rows, see functions/shards.py
+SHARDING_ENABLED = os.environ.get('SHARDING_ENABLED', '0') == '1'
+SHARD_DIR = os.environ.get('SHARD_DIR', os.path.join(basedir, 'data', 'shards'))
+SHARD_MAX_OPEN = int(os.environ.get('SHARD_MAX_OPEN', 64))  # engines per process, least recently used closed first
+SHARD_IDLE_SECONDS = int(os.environ.get('SHARD_IDLE_SECONDS', 300))
+SHARD_ENGINE_OPTIONS = {'pool_size': 2, 'max_overflow': 8, 'pool_timeout': 30}
+SHARD_ID_BLOCK_SIZE = 1000  # customer and transaction ids reserved per database round trip
+
 SECRETE_KEY = os.environ.get('SECRETE_KEY')
 
 JWT_SECRET_KEY = os.environ.get('SECRETE_KEY')
 JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)  # Token expires after 1 hour of inactivity
 JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)  # Refresh token validity
 
+# revoked token checks, see functions/blocklist.py
+JWT_BLOCKLIST_BLOOM_CAPACITY = 100000
+JWT_BLOCKLIST_BLOOM_ERROR_RATE = 0.001
+JWT_BLOCKLIST_CACHE_SIZE = 10000
+JWT_BLOCKLIST_SYNC_SECONDS = 2  # how long a logout in another worker may take to be noticed
+JWT_BLOCKLIST_PURGE_SECONDS = 3600  # 0 disables the background purge
+
+# password hashing, see functions/passwords.py. Stored hashes are upgraded
+# to PASSWORD_HASH_METHOD the next time their owner logs in.
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 4))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 32))
+PASSWORD_HASH_QUEUE_TIMEOUT = 5  # seconds
+
+# business ids reserved per database round trip by each process
+BUSINESS_ID_BLOCK_SIZE = 100
+
+# per-process cache of the user behind each JWT
+USER_CACHE_SIZE = 10000
+USER_CACHE_TTL_SECONDS = 60
+
 CORS_HEADERS = "Content-Type"
+
+# keyset pagination of customer transactions
+TRANSACTIONS_PAGE_SIZE = 50
+TRANSACTIONS_MAX_PAGE_SIZE = 500
+
+# rows per executemany/commit in IMPORT-TRANSACTIONS
+BULK_IMPORT_BATCH_SIZE = 1000
+
+# rows fetched per server-side cursor round trip and per chunk in /export
+EXPORT_BATCH_SIZE = 1000
+
+# customers returned by SEARCH-CUSTOMERS, see functions/search.py
+CUSTOMER_SEARCH_LIMIT = 20
+CUSTOMER_SEARCH_MAX_LIMIT = 100
+
+# keyset pagination of the waitlist
+WAITLIST_PAGE_SIZE = 100
+WAITLIST_MAX_PAGE_SIZE = 1000
+
+# gzip responses of at least COMPRESS_MIN_SIZE bytes for clients that accept it, see functions/conditional.py
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+
+# broker (e.g. redis://localhost:6379/0) that fans Socket.IO events out across
+# workers, see sockets.py. A single process needs none
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+
+# invoice and receipt rendering, see functions/documents.py. With 0 workers
+# documents are rendered inside the request
+DOCUMENT_DIR = os.environ.get('DOCUMENT_DIR', os.path.join(basedir, 'data', 'documents'))
+DOCUMENT_WORKERS = int(os.environ.get('DOCUMENT_WORKERS', 2))
+
+# receipt emails, queued in the receipt_outbox table and delivered by `flask send-receipts`,
+# see functions/outbox.py
+SMTP_HOST = os.environ.get('SMTP_HOST', 'localhost')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 25))
+SMTP_USERNAME = os.environ.get('SMTP_USERNAME')
+SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD')
+SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', '0') == '1'
+SMTP_TIMEOUT = 10  # seconds
+SMTP_POOL_SIZE = int(os.environ.get('SMTP_POOL_SIZE', 4))  # connections, and messages in flight
+MAIL_SENDER = os.environ.get('MAIL_SENDER', 'receipts@fundsflow.local')
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_POLL_SECONDS = 5
+OUTBOX_LEASE_SECONDS = 300  # a claimed batch is retried by another sender after this long
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BACKOFF_SECONDS = 30  # doubled after every failed attempt
+OUTBOX_MAX_BACKOFF_SECONDS = 3600
+
+# marking pending transactions overdue once their due date passes, run by `flask sweep-overdue`,
+# see functions/overdue.py
+OVERDUE_SWEEP_SECONDS = int(os.environ.get('OVERDUE_SWEEP_SECONDS', 60))
+OVERDUE_SWEEP_BATCH_SIZE = 1000  # transactions marked per commit
+# how far the sweep mark trails the clock: longer than any write transaction, so a transaction
+# committed as pending just after a sweep is still looked at by the next one
+OVERDUE_SWEEP_LAG_SECONDS = int(os.environ.get('OVERDUE_SWEEP_LAG_SECONDS', 300))
+
+# token bucket limits of the unauthenticated endpoints, shared by all workers on
+# the host through RATELIMIT_STORE_PATH, see functions/ratelimit.py
+RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', '1') == '1'
+RATELIMIT_STORE_PATH = os.environ.get('RATELIMIT_STORE_PATH',
+                                      os.path.join(tempfile.gettempdir(), 'fundsflow-ratelimit.bin'))
+RATELIMIT_SLOTS = 65536
+RATELIMIT_RULES = {
+    'login': {'ip': '30/minute', 'email': '10/minute'},
+    'signup': {'ip': '10/minute', 'email': '5/minute'},
+    'waitlist_add': {'ip': '10/minute', 'email': '3/minute'},
+}
+# request metrics served on /metrics, see functions/metrics.py. With METRICS_TOKEN set,
+# scrapers must send it as a bearer token, on /metrics and /stats/cache
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+METRICS_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)  # bytes
+METRICS_MAX_SERIES = 2000  # label sets per process, later ones are counted under action="other"
+METRICS_SLOW_REQUEST_SECONDS = float(os.environ.get('METRICS_SLOW_REQUEST_SECONDS', 1.0))
+METRICS_SLOW_SQL_LIMIT = 50  # statements listed per slow request
+
+# threads of the ASGI entry point (asgi.py) that run the requests it does not serve on
+# the event loop, see async_routes.py
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 8))
+
+# number of reverse proxies in front of the app whose X-Forwarded-For is trusted for
+# the client IP; 0 when clients connect directly
+PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 0))
@@ -0,0 +1,80 @@
+""" this module gives the ASGI entry point (asgi.py) async sessions over the app's databases
+
+    The async engines are opened from the same settings as Flask-SQLAlchemy's: SQLite
+    URLs switch to the aiosqlite driver, and every bind (the waitlist database) gets an
+    engine of its own, so a session routes each table where the sync app does. The
+    SQLite storage profile is applied to the aiosqlite connections too. An in-memory
+    database is private to its connection, so the async engines need database files.
+
+    Engines are opened on first use in the serving process and disposed at shutdown.
+"""
+from contextlib import asynccontextmanager
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from myapp import db
+from myapp.functions import storage
+
+_engines = {}
+_sessionmaker = None
+
+
+def async_url(url: str):
+    """
+    Returns the async driver URL of a database URL, e.g. sqlite+aiosqlite:///fundsflow.db.
+
+    Raises:
+        ValueError: For an in-memory SQLite database, which other connections cannot see.
+    """
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            raise ValueError('the async engines need a database file, not an in-memory database')
+        url = url.set(drivername='sqlite+aiosqlite')
+    return url
+
+
+def get_engine(bind_key: str = None) -> AsyncEngine:
+    """ returns the async engine of the main database (bind_key None) or of a bind, opening it on first use """
+    engine = _engines.get(bind_key)
+    if engine is None:
+        config = current_app.config
+        url = config['SQLALCHEMY_DATABASE_URI'] if bind_key is None else config['SQLALCHEMY_BINDS'][bind_key]
+        engine = _engines[bind_key] = create_async_engine(async_url(url),
+                                                          **config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        pragmas = config.get('SQLITE_PRAGMAS')
+        if pragmas and engine.dialect.name == 'sqlite':
+            # storage.init_app's hook only recognises sqlite3 connections, not aiosqlite's adapter
+            event.listen(engine.sync_engine, 'connect',
+                         lambda dbapi_connection, _record: storage.apply_pragmas(dbapi_connection, pragmas))
+    return engine
+
+
+def get_sessionmaker() -> async_sessionmaker:
+    """ returns the factory of async sessions, with every bound table routed to its bind's engine """
+    global _sessionmaker
+    if _sessionmaker is None:
+        binds = {table: get_engine(key) for key, metadata in db.metadatas.items() if key is not None
+                 for table in metadata.tables.values()}
+        # committed objects stay readable: handlers serialise what they just wrote
+        _sessionmaker = async_sessionmaker(bind=get_engine(), binds=binds, class_=AsyncSession,
+                                           expire_on_commit=False)
+    return _sessionmaker
+
+
+@asynccontextmanager
+async def session():
+    """ yields a new async session, closed (and rolled back if not committed) on the way out """
+    async with get_sessionmaker()() as async_session:
+        yield async_session
+
+
+async def dispose():
+    """ closes every async engine. the next session opens them again """
+    global _sessionmaker
+    engines = list(_engines.values())
+    _engines.clear()
+    _sessionmaker = None
+    for engine in engines:
+        await engine.dispose()
@@ -0,0 +1,148 @@
+""" this module answers 'is this JWT revoked?' mostly from memory
+
+    Every process keeps a Bloom filter of all revoked token ids. A token that is not in
+    the filter is definitely not revoked, which is the answer for nearly every request.
+    Filter hits are confirmed against the database and the result is kept in an LRU cache.
+    Revocations made by other workers are pulled into the filter every
+    JWT_BLOCKLIST_SYNC_SECONDS, and expired rows are purged by a background thread.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from flask import current_app
+from myapp import db
+from myapp.models import RevokedToken
+from myapp.functions.cache import LRUCache
+
+
+def utcnow() -> datetime:
+    """ returns the current UTC time as a naive datetime, the way it is stored in the database """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class BloomFilter:
+    """
+    A fixed-size Bloom filter over strings.
+
+    Attributes:
+        size (int): Number of bits in the filter.
+        hash_count (int): Number of bit positions set per key.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class TokenBlocklist:
+    """
+    Process-wide view of the revoked token table.
+    """
+
+    def __init__(self):
+        self._bloom = None
+        self._cache = None
+        self._last_id = 0
+        self._last_sync = 0.0
+        self._lock = threading.Lock()
+        self._purger = None
+
+    def _setup(self):
+        config = current_app.config
+        if self._bloom is None:
+            with self._lock:
+                if self._bloom is None:
+                    self._cache = LRUCache(config['JWT_BLOCKLIST_CACHE_SIZE'])
+                    self._rebuild()
+        if self._purger is None and config['JWT_BLOCKLIST_PURGE_SECONDS']:
+            self._start_purger(current_app._get_current_object())
+
+    def _rebuild(self):
+        """ reloads the filter from every stored revocation, dropping purged ones """
+        config = current_app.config
+        bloom = BloomFilter(config['JWT_BLOCKLIST_BLOOM_CAPACITY'], config['JWT_BLOCKLIST_BLOOM_ERROR_RATE'])
+        last_id = 0
+        for row_id, jti in db.session.query(RevokedToken.id, RevokedToken.jti).yield_per(5000):
+            bloom.add(jti)
+            last_id = max(last_id, row_id)
+        self._bloom, self._last_id, self._last_sync = bloom, last_id, time.monotonic()
+        self._cache.clear()
+
+    def sync(self):
+        """ adds revocations stored since the last sync (possibly by other workers) to the filter """
+        with self._lock:
+            rows = db.session.query(RevokedToken.id, RevokedToken.jti) \
+                .filter(RevokedToken.id > self._last_id).all()
+            for row_id, jti in rows:
+                self._bloom.add(jti)
+                # a cached 'not revoked' answer for this jti is now wrong
+                self._cache.pop(jti)
+                self._last_id = max(self._last_id, row_id)
+            self._last_sync = time.monotonic()
+
+    def revoke(self, jti: str, user_id: int, expires: datetime):
+        """ stores a revoked token and makes this process reject it immediately """
+        self._setup()
+        RevokedToken.add_revoked_token(jti, user_id, expires)
+        with self._lock:
+            self._bloom.add(jti)
+            self._cache.set(jti, True)
+
+    def is_revoked(self, jti: str) -> bool:
+        """ returns True if the token with this jti has been revoked """
+        self._setup()
+        if time.monotonic() - self._last_sync >= current_app.config['JWT_BLOCKLIST_SYNC_SECONDS']:
+            self.sync()
+        if jti not in self._bloom:
+            return False
+        revoked = self._cache.get(jti)
+        if revoked is None:
+            revoked = RevokedToken.is_token_revoked(jti)
+            self._cache.set(jti, revoked)
+        return revoked
+
+    def purge(self) -> int:
+        """ deletes expired revocations and rebuilds the filter without them """
+        deleted = RevokedToken.purge_expired(utcnow())
+        with self._lock:
+            self._rebuild()
+        return deleted
+
+    def _start_purger(self, app):
+        def run():
+            while True:
+                time.sleep(app.config['JWT_BLOCKLIST_PURGE_SECONDS'])
+                with app.app_context():
+                    try:
+                        self.purge()
+                    except Exception as e:
+                        app.logger.warning('Purging revoked tokens failed: %s', e)
+                    finally:
+                        db.session.remove()
+
+        with self._lock:
+            if self._purger is None:
+                self._purger = threading.Thread(target=run, name='revoked-token-purger', daemon=True)
+                self._purger.start()
+
+    def stats(self) -> dict:
+        """ returns the cache counters, for monitoring """
+        return self._cache.stats() if self._cache is not None else {}
+
+
+blocklist = TokenBlocklist()
@@ -0,0 +1,66 @@
+""" this module contains small in-process caches shared by the request handlers """
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    A thread-safe least-recently-used cache with an optional time-to-live.
+
+    Attributes:
+        maxsize (int): The maximum number of entries kept before the oldest is evicted.
+        ttl (float): Seconds an entry stays valid, or None to keep entries until evicted.
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups that found nothing (or only an expired entry).
+    """
+
+    _missing = object()
+
+    def __init__(self, maxsize: int = 1024, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """ returns the cached value for key or default if it is absent or expired """
+        with self._lock:
+            entry = self._data.get(key, self._missing)
+            if entry is not self._missing:
+                value, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """ stores value under key, evicting the least recently used entry when full """
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        """ removes key from the cache if present """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """ removes every entry but keeps the hit/miss counters """
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """ returns the size and hit/miss counters of the cache """
+        return {'size': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
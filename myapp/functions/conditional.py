@@ -0,0 +1,62 @@
+""" this module lets polling clients skip unchanged responses and shrinks large ones
+
+    Fetch actions tag their response with an ETag derived from the ledger version of
+    the user or customer they read (see ledger.py) and the request parameters. A client
+    that sends the tag back in If-None-Match gets an empty 304 after a single primary key
+    lookup instead of the full query. Bodies of COMPRESS_MIN_SIZE bytes or more are
+    gzipped for clients that send Accept-Encoding: gzip.
+"""
+import gzip
+import hashlib
+import json
+from flask import Response, current_app, request
+
+
+def make_etag(*parts) -> str:
+    """ returns an opaque tag identifying the response built from parts """
+    key = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def is_fresh(etag: str) -> bool:
+    """ tells whether the client's If-None-Match already holds etag """
+    # the comparison is weak because gzip changes the bytes but not the content
+    return request.if_none_match.contains_weak(etag)
+
+
+def not_modified(etag: str) -> Response:
+    """ returns the body-less 304 sent when the client's copy is current """
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+
+def tagged(body: str, etag: str) -> Response:
+    """ wraps a response body and tags it with etag """
+    response = Response(body)
+    response.set_etag(etag, weak=True)
+    return response
+
+
+def compress_response(response: Response) -> Response:
+    """ gzips a buffered response body if it is large enough and the client accepts gzip """
+    if response.status_code != 200 or response.direct_passthrough or response.is_streamed \
+            or 'Content-Encoding' in response.headers:
+        return response
+
+    data = response.get_data()
+    if len(data) < current_app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if not request.accept_encodings.quality('gzip'):
+        return response
+
+    response.set_data(gzip.compress(data, compresslevel=current_app.config['COMPRESS_LEVEL']))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def init_app(app):
+    """ registers the response compression hook """
+    app.after_request(compress_response)
@@ -0,0 +1,351 @@
+""" this module renders invoices and receipts off the request path
+
+    A render request stores a DocumentJob and answers with its id straight away. The
+    document is drawn in a pool of DOCUMENT_WORKERS processes from a plain dict of
+    the fields printed on it, and written to DOCUMENT_DIR under the SHA-256 of that
+    dict. Once the file is in place the job is marked done and the transaction's
+    invoice_link or receipt_link points at it. Requests whose content hash already
+    has a file are answered from it without rendering again.
+
+    PDFs are written by hand (Helvetica text on A4 pages), so rendering needs no
+    third-party library.
+"""
+import hashlib
+import html
+import json
+import os
+import textwrap
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+from flask import current_app
+from myapp import db, sockets
+from myapp.models import User, Customer, Transaction, DocumentJob
+from myapp.functions import ledger, shards
+from myapp.functions import resources
+from myapp.functions.serializers import datetime_text
+
+KINDS = ('invoice', 'receipt')
+FORMATS = ('pdf', 'html')
+LINK_COLUMNS = {'invoice': 'invoice_link', 'receipt': 'receipt_link'}
+LINK_PREFIX = '/documents/'
+# bump when the layout changes so documents cached under the old layout are drawn again
+LAYOUT_VERSION = 1
+
+
+def money(value):
+    return '{:,.2f}'.format(value) if value is not None else None
+
+
+def document_context(user_id: int, transaction_id: int) -> dict:
+    """
+    Collects everything printed on a transaction's documents.
+
+    Args:
+        user_id (int): The user the transaction's customer must belong to.
+        transaction_id (int): The ID of the transaction.
+
+    Returns:
+        dict: The business, customer and transaction fields, or None if the user has no such transaction.
+    """
+    # user is read on its own: with sharding it lives in another database than the transaction
+    row = db.session.query(Transaction, Customer) \
+        .join(Customer, Customer.id == Transaction.customer_id) \
+        .filter(Transaction.id == transaction_id, Customer.user_id == user_id).first()
+    if row is None:
+        return None
+
+    transaction, customer = row
+    user = db.session.get(User, user_id)
+    return {
+        'business': {'name': user.business_name, 'email': user.business_email or user.email,
+                     'phone': user.business_phone},
+        'customer': {'name': ' '.join(filter(None, (customer.first_name, customer.last_name))),
+                     'email': customer.email, 'phone': customer.phone_number,
+                     'address': customer.shipping_address or transaction.delivery_address},
+        'transaction': {'id': transaction.id, 'order_id': transaction.order_id,
+                        'product_name': transaction.product_name,
+                        'product_description': transaction.product_description,
+                        'order_date': datetime_text(transaction.order_date),
+                        'delivery_date': datetime_text(transaction.delivery_date),
+                        'due_date': datetime_text(transaction.due_date),
+                        'rate': transaction.rate, 'quantity': transaction.number_of_items,
+                        'total_price': transaction.total_price, 'discount': transaction.discount_applied,
+                        'delivery_fee': transaction.delivery_fee, 'amount_payable': transaction.amount_payable,
+                        'amount_paid': transaction.amount_paid,
+                        'remaining_balance': transaction.remaining_balance,
+                        'payment_status': transaction.payment_status},
+    }
+
+
+def content_hash(kind: str, file_format: str, context: dict) -> str:
+    """ returns the SHA-256 naming the rendered document, which changes with any printed field """
+    key = json.dumps([LAYOUT_VERSION, kind, file_format, context], sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def document_sections(kind: str, context: dict) -> list:
+    """
+    Lays out a document as titled sections of (label, value) rows, leaving out empty values.
+
+    Returns:
+        list of tuple: (heading, [(label, value), ...]) pairs, business details first.
+    """
+    business, customer, transaction = context['business'], context['customer'], context['transaction']
+    number = transaction['order_id'] or '#{}'.format(transaction['id'])
+    sections = [
+        (business['name'] or '', [('Email', business['email']), ('Phone', business['phone'])]),
+        ('Invoice' if kind == 'invoice' else 'Receipt',
+         [('Number', number), ('Order date', transaction['order_date']),
+          ('Delivery date', transaction['delivery_date']),
+          ('Due date', transaction['due_date'] if kind == 'invoice' else None),
+          ('Status', transaction['payment_status'] if kind == 'receipt' else None)]),
+        ('Billed to', [('Name', customer['name']), ('Email', customer['email']), ('Phone', customer['phone']),
+                       ('Address', customer['address'])]),
+        ('Item', [('Product', transaction['product_name']), ('Description', transaction['product_description']),
+                  ('Rate', money(transaction['rate'])), ('Quantity', transaction['quantity']),
+                  ('Subtotal', money(transaction['total_price']))]),
+        ('Amounts', [('Discount', money(transaction['discount'])), ('Delivery fee', money(transaction['delivery_fee'])),
+                     ('Amount payable', money(transaction['amount_payable'])),
+                     ('Amount paid', money(transaction['amount_paid']) if kind == 'receipt' else None),
+                     ('Balance', money(transaction['remaining_balance']) if kind == 'receipt' else None)]),
+    ]
+    return [(heading, [(label, str(value)) for label, value in rows if value not in (None, '')])
+            for heading, rows in sections]
+
+
+def render_html(kind: str, context: dict) -> bytes:
+    """ draws a document as a standalone HTML page """
+    title = kind.upper()
+    parts = ['<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{}</title>'.format(title),
+             '<style>body{font-family:Helvetica,Arial,sans-serif;margin:40px}'
+             'th{text-align:left;padding-right:24px;font-weight:normal;color:#555}</style></head><body>',
+             '<h1>{}</h1>'.format(title)]
+    for heading, rows in document_sections(kind, context):
+        parts.append('<h2>{}</h2><table>'.format(html.escape(heading)))
+        parts.extend('<tr><th>{}</th><td>{}</td></tr>'.format(html.escape(label), html.escape(value))
+                     for label, value in rows)
+        parts.append('</table>')
+    parts.append('</body></html>\n')
+    return ''.join(parts).encode()
+
+
+PAGE_WIDTH, PAGE_HEIGHT, MARGIN = 595, 842, 50  # A4 in points
+
+
+def _pdf_text(text: str) -> bytes:
+    """ encodes text as a PDF string literal in the WinAnsi encoding of the standard fonts """
+    data = ' '.join(text.split()).encode('cp1252', 'replace')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def render_pdf(kind: str, context: dict) -> bytes:
+    """ draws a document as a text-only PDF, starting a new A4 page when one fills up """
+    pages, ops, y = [], [], PAGE_HEIGHT - MARGIN
+
+    def row(size, advance, *cells):
+        """ writes (font, x, text) cells on one baseline and moves down by advance """
+        nonlocal ops, y
+        if y - advance < MARGIN:
+            pages.append(ops)
+            ops, y = [], PAGE_HEIGHT - MARGIN
+        for font, x, text in filter(lambda cell: cell[2], cells):
+            ops.append(b'BT /%s %d Tf %d %d Td %s Tj ET' % (font, size, x, y - size, _pdf_text(text)))
+        y -= advance
+
+    row(20, 36, (b'F2', MARGIN, kind.upper()))
+    for heading, rows in document_sections(kind, context):
+        row(12, 20, (b'F2', MARGIN, heading))
+        for label, value in rows:
+            for index, chunk in enumerate(textwrap.wrap(value, 70) or ['']):
+                row(10, 15, (b'F1', MARGIN, label if index == 0 else ''), (b'F1', MARGIN + 130, chunk))
+        y -= 10
+    pages.append(ops)
+
+    # objects 1-4 are the catalog, page tree and fonts; each page adds a page and a content object
+    page_numbers = [5 + 2 * index for index in range(len(pages))]
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>',
+               b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(b'%d 0 R' % n for n in page_numbers),
+                                                             len(pages)),
+               b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+               b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>']
+    for number, page_ops in zip(page_numbers, pages):
+        stream = b'\n'.join(page_ops)
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+                       b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>'
+                       % (PAGE_WIDTH, PAGE_HEIGHT, number + 1))
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+
+    document = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(document))
+        document += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(document)
+    document += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    document += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    document += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(document)
+
+
+RENDERERS = {'html': render_html, 'pdf': render_pdf}
+
+
+def render_to_file(kind: str, file_format: str, context: dict, path: str) -> str:
+    """ renders a document and moves it into place at path. runs in the worker processes """
+    data = RENDERERS[file_format](kind, context)
+    partial_path = '{}.{}.part'.format(path, os.getpid())
+    with open(partial_path, 'wb') as document:
+        document.write(data)
+    os.replace(partial_path, path)
+    return path
+
+
+_executor = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """ returns the process-wide render pool, starting it on first use """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=current_app.config['DOCUMENT_WORKERS'])
+    return _executor
+
+
+def serialize_job(job) -> dict:
+    """ converts a DocumentJob into the dictionary returned to clients. link is set once the job is done """
+    return {'job_id': job.id, 'transaction_id': job.transaction_id, 'kind': job.kind, 'format': job.file_format,
+            'status': job.status, 'link': job.link if job.status == 'done' else None, 'error': job.error}
+
+
+def _document_path(job) -> str:
+    return os.path.join(current_app.config['DOCUMENT_DIR'], job.link[len(LINK_PREFIX):])
+
+
+def complete_job(job_id: int, error: str = None):
+    """
+    Marks a job done and links its document from the transaction, or records why it failed.
+
+    A transaction whose link changes gets a new ledger version and a transaction_updated event.
+    """
+    job = db.session.get(DocumentJob, job_id)
+    job.finished = datetime.now()
+    if error is not None:
+        job.status, job.error = 'failed', error
+        db.session.commit()
+        return
+
+    job.status = 'done'
+    # completions also run on the pool's result thread, outside the request of the business
+    with shards.use_business(job.user_id):
+        transaction = db.session.get(Transaction, job.transaction_id)
+        column = LINK_COLUMNS[job.kind]
+        if transaction is None or getattr(transaction, column) == job.link:
+            db.session.commit()
+            return
+
+        setattr(transaction, column, job.link)
+        version = ledger.record_transaction_edit(transaction.customer_id)
+        db.session.commit()
+    sockets.publish_transaction('transaction_updated', job.user_id, resources.serialize_transaction(transaction),
+                                version)
+
+
+def _rendered(app, job_id, future):
+    """ runs in the pool's result thread when a worker finishes a job """
+    with app.app_context():
+        error = future.exception()
+        try:
+            complete_job(job_id, None if error is None else repr(error))
+        except Exception:
+            app.logger.exception('could not complete document job %s', job_id)
+            db.session.rollback()
+
+
+def render_job(job, context: dict):
+    """ renders a queued job in this process and completes it """
+    try:
+        render_to_file(job.kind, job.file_format, context, _document_path(job))
+    except Exception as e:
+        complete_job(job.id, repr(e))
+    else:
+        complete_job(job.id)
+
+
+def request_document(user_id: int, transaction_id: int, kind: str, file_format: str) -> dict:
+    """
+    Queues an invoice or receipt of a transaction and returns the job without waiting for it.
+
+    Args:
+        user_id (int): The user asking for the document.
+        transaction_id (int): The ID of one of the user's transactions.
+        kind (str): 'invoice' or 'receipt'.
+        file_format (str): 'pdf' or 'html'.
+
+    Returns:
+        dict: The job, see serialize_job. It is already done if the same document was rendered before.
+              None if the user has no such transaction.
+
+    Raises:
+        ValueError: If kind or file_format is not supported.
+    """
+    if kind not in KINDS:
+        raise ValueError('Unsupported document kind. Use invoice or receipt')
+    if file_format not in FORMATS:
+        raise ValueError('Unsupported document format. Use pdf or html')
+
+    context = document_context(user_id, transaction_id)
+    if context is None:
+        return None
+
+    digest = content_hash(kind, file_format, context)
+    in_flight = DocumentJob.query.filter_by(content_hash=digest, status='queued').first()
+    if in_flight is not None:
+        return serialize_job(in_flight)
+
+    job = DocumentJob(transaction_id=transaction_id, user_id=user_id, kind=kind, file_format=file_format,
+                      content_hash=digest, link='{}{}.{}'.format(LINK_PREFIX, digest, file_format), status='queued')
+    db.session.add(job)
+    db.session.commit()
+
+    path = _document_path(job)
+    if os.path.exists(path):
+        complete_job(job.id)
+    elif current_app.config['DOCUMENT_WORKERS'] <= 0:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        render_job(job, context)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        future = get_executor().submit(render_to_file, kind, file_format, context, path)
+        future.add_done_callback(partial(_rendered, current_app._get_current_object(), job.id))
+
+    return serialize_job(job)
+
+
+def fetch_job(user_id: int, job_id: int) -> dict:
+    """ returns one of the user's jobs, or None if the user has no such job """
+    job = DocumentJob.query.filter_by(id=job_id, user_id=user_id).first()
+    return serialize_job(job) if job else None
+
+
+def render_queued_jobs() -> int:
+    """
+    Renders, in this process, the jobs still queued, e.g. after the server stopped before its workers finished.
+
+    Returns:
+        int: The number of jobs processed.
+    """
+    jobs = DocumentJob.query.filter_by(status='queued').order_by(DocumentJob.id).all()
+    for job in jobs:
+        with shards.use_business(job.user_id):
+            context = document_context(job.user_id, job.transaction_id)
+        if context is None:
+            complete_job(job.id, 'Transaction no longer exists')
+            continue
+        # the transaction may have changed since the job was queued
+        job.content_hash = content_hash(job.kind, job.file_format, context)
+        job.link = '{}{}.{}'.format(LINK_PREFIX, job.content_hash, job.file_format)
+        db.session.commit()
+        os.makedirs(os.path.dirname(_document_path(job)), exist_ok=True)
+        render_job(job, context)
+    return len(jobs)
@@ -0,0 +1,156 @@
+""" this module imports historical transactions in bulk
+
+    Rows are validated with the same rules as LOG-TRANSACTION, then inserted with
+    executemany in batches of BULK_IMPORT_BATCH_SIZE. Each batch is one commit that
+    also carries the ledger bookkeeping of the customers it touched. An upload that
+    cannot be read to the end keeps the batches before the failure, and the report
+    says which row the import stopped after.
+"""
+import csv
+import io
+import json
+import time
+from sqlalchemy import insert
+from myapp import db
+from myapp.models import Customer, Transaction
+from myapp.functions import ledger, shards
+from myapp.functions import resources as resource
+
+REQUIRED_FIELDS = ('customer_id', 'product_name', 'delivery_address', 'rate', 'number_of_items',
+                   'total_price', 'delivery_fee')
+NUMBER_FIELDS = {'customer_id': int, 'number_of_items': int, 'rate': float, 'total_price': float,
+                 'delivery_fee': float, 'discount': float, 'amount_paid': float}
+
+
+class UnreadableUpload(ValueError):
+    """ raised by read_upload when the rest of an upload cannot be decoded or parsed """
+
+
+def read_upload(stream, file_format: str):
+    """
+    Yields the rows of an uploaded CSV (with a header line) or NDJSON file.
+
+    Args:
+        stream: The binary file object of the upload.
+        file_format (str): 'csv' or 'ndjson'.
+
+    Yields:
+        dict or str: One row per record. NDJSON lines that are not valid JSON are yielded
+                     as an error message so they show up in the import report.
+
+    Raises:
+        ValueError: If the format is not supported.
+        UnreadableUpload: If the file is not UTF-8 or not valid CSV from some point on.
+    """
+    if file_format not in ('csv', 'ndjson'):
+        raise ValueError("Unsupported import format '{}'. Use csv or ndjson".format(file_format))
+
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        if file_format == 'csv':
+            yield from csv.DictReader(text)
+        else:
+            for line in text:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError as e:
+                        yield 'invalid JSON: {}'.format(e)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise UnreadableUpload('the upload could not be read any further: {}'.format(e)) from e
+
+
+def coerce_row(row: dict) -> dict:
+    """ turns the strings of a CSV row into the types LOG-TRANSACTION expects. empty cells become None """
+    coerced = {}
+    for key, value in row.items():
+        if isinstance(value, str):
+            value = value.strip()
+            if value == '':
+                value = None
+            elif key in NUMBER_FIELDS:
+                value = NUMBER_FIELDS[key](value)
+        coerced[key] = value
+    return coerced
+
+
+def import_transactions(user_id: int, rows, batch_size: int, customer_id: int = None) -> dict:
+    """
+    Validates and inserts transactions for a user's customers.
+
+    Args:
+        user_id (int): The ID of the importing user. Rows for other users' customers are rejected.
+        rows (iterable): LOG-TRANSACTION payloads.
+        batch_size (int): The number of rows inserted per executemany and commit.
+        customer_id (int, optional): Used for rows that do not name a customer.
+
+    Returns:
+        dict: {'inserted': int, 'failed': int, 'errors': [{'row': int, 'error': str}],
+               'ledger_versions': {customer_id: int}, 'last_row': int, 'seconds': float,
+               'rows_per_sec': float}
+               Rows are numbered from 1 in input order. last_row is the last row read: when an
+               upload becomes unreadable, the rows after it are neither inserted nor reported,
+               and the error is reported as row last_row + 1.
+
+    Raises:
+        ValueError: If the upload format is not supported, before anything is inserted.
+    """
+    started = time.perf_counter()
+    customer_ids = {row_id for row_id, in db.session.query(Customer.id).filter_by(user_id=user_id)}
+    report = {'inserted': 0, 'failed': 0, 'errors': [], 'ledger_versions': {}, 'last_row': 0}
+    batch = []
+
+    def flush():
+        if shards.enabled():
+            # executemany skips the before_insert hook that gives sharded rows their ids
+            for values in batch:
+                values['id'] = shards.next_id('transaction')
+        db.session.execute(insert(Transaction), batch)
+        changes = {}
+        for values in batch:
+            changes.setdefault(values['customer_id'], []).append((None, values))
+        for batch_customer_id, customer_changes in changes.items():
+            version = ledger.record_transaction_changes(batch_customer_id, customer_changes)
+            report['ledger_versions'][batch_customer_id] = version
+        db.session.commit()
+        report['inserted'] += len(batch)
+        batch.clear()
+
+    rows = iter(rows)
+    while True:
+        try:
+            row = next(rows)
+        except StopIteration:
+            break
+        except UnreadableUpload as e:
+            report['failed'] += 1
+            report['errors'].append({'row': report['last_row'] + 1, 'error': str(e)})
+            break
+        number = report['last_row'] = report['last_row'] + 1
+        try:
+            if not isinstance(row, dict):
+                raise ValueError(row if isinstance(row, str) else 'row is not an object')
+            row = coerce_row(row)
+            if customer_id is not None and row.get('customer_id') is None:
+                row['customer_id'] = customer_id
+            missing = [field for field in REQUIRED_FIELDS if row.get(field) is None]
+            if missing:
+                raise ValueError('missing required fields: {}'.format(', '.join(missing)))
+            if row['customer_id'] not in customer_ids:
+                raise ValueError('customer {} not found'.format(row['customer_id']))
+            values = resource.transaction_values(row)
+        except (KeyError, TypeError, ValueError) as e:
+            report['failed'] += 1
+            report['errors'].append({'row': number, 'error': str(e)})
+            continue
+
+        batch.append(values)
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+
+    report['seconds'] = round(time.perf_counter() - started, 4)
+    report['rows_per_sec'] = round(report['inserted'] / report['seconds'], 1) if report['seconds'] else None
+    return report
@@ -0,0 +1,254 @@
+""" this module keeps the per-customer ledger bookkeeping in step with transaction writes
+
+    Every write to a transaction must call record_transaction_change before committing.
+    It bumps the customer's and the user's ledger versions and applies the change to
+    the running balance summaries and today's aging rollup in the same database
+    transaction as the write itself.
+    Writes that only change the customer list call bump_user_version.
+"""
+from sqlalchemy import case, func, update
+from sqlalchemy.dialects.sqlite import insert
+from myapp import db
+from myapp.functions import reports, shards
+from myapp.models import User, Customer, Transaction, CustomerBalance, UserBalance
+
+# payment_status values with a count column on the balance summaries
+STATUS_COUNT_COLUMNS = {'paid': 'paid_count', 'pending': 'pending_count', 'overdue': 'overdue_count'}
+SUMMARY_COLUMNS = ('total_payable', 'total_paid', 'outstanding', 'transaction_count') + \
+                  tuple(STATUS_COUNT_COLUMNS.values())
+
+
+def balance_state(transaction) -> dict:
+    """ returns the fields of a transaction that feed the balance summaries """
+    return {'amount_payable': transaction.amount_payable, 'amount_paid': transaction.amount_paid,
+            'remaining_balance': transaction.remaining_balance, 'payment_status': transaction.payment_status,
+            'due_date': transaction.due_date}
+
+
+def _summary_deltas(before, after) -> dict:
+    """ works out how the summary columns change when a transaction goes from before to after """
+    deltas = dict.fromkeys(SUMMARY_COLUMNS, 0)
+    for state, sign in ((before, -1), (after, 1)):
+        if state is None:
+            continue
+        deltas['total_payable'] += sign * (state['amount_payable'] or 0)
+        deltas['total_paid'] += sign * (state['amount_paid'] or 0)
+        deltas['outstanding'] += sign * (state['remaining_balance'] or 0)
+        deltas['transaction_count'] += sign
+        if state['payment_status'] in STATUS_COUNT_COLUMNS:
+            deltas[STATUS_COUNT_COLUMNS[state['payment_status']]] += sign
+    return deltas
+
+
+def _add_to_summary(model, keys, deltas):
+    """ upserts a summary row, adding deltas to whatever it already holds """
+    statement = insert(model).values(**keys, **deltas)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(model.__table__.primary_key.columns),
+        set_={name: getattr(model, name) + statement.excluded[name] for name in deltas})
+    db.session.execute(statement)
+
+
+def bump_ledger_version(customer_id: int):
+    """
+    Increments the ledger version of a customer inside the current database transaction.
+
+    Args:
+        customer_id (int): The ID of the customer whose ledger changed.
+
+    Returns:
+        tuple: The new ledger version and the customer's user_id, or (None, None)
+               if the customer does not exist.
+    """
+    row = db.session.execute(update(Customer).where(Customer.id == customer_id)
+                             .values(ledger_version=Customer.ledger_version + 1)
+                             .returning(Customer.ledger_version, Customer.user_id)).first()
+    return (row.ledger_version, row.user_id) if row else (None, None)
+
+
+def bump_user_version(user_id: int):
+    """ increments the ledger version of a user inside the current database transaction """
+    db.session.execute(update(User).where(User.id == user_id).values(ledger_version=User.ledger_version + 1))
+
+
+def record_transaction_change(customer_id: int, before=None, after=None) -> int:
+    """
+    Records a transaction write in the customer's ledger bookkeeping.
+
+    Call it before committing the write so everything lands in the same commit.
+
+    Args:
+        customer_id (int): The ID of the customer the transaction belongs to.
+        before (dict, optional): balance_state of the transaction before the write, None if it was created.
+        after (dict, optional): balance_state of the transaction after the write, None if it was deleted.
+
+    Returns:
+        int: The customer's new ledger version, or None if the customer does not exist.
+    """
+    return record_transaction_changes(customer_id, [(before, after)])
+
+
+def record_transaction_write(customer_id: int, before=None, after=None) -> tuple:
+    """
+    Records a transaction write like record_transaction_change, also returning who owns the customer.
+
+    Returns:
+        tuple: The customer's new ledger version and the customer's user_id, the business
+               whose room hears about the write. (None, None) if the customer does not exist.
+    """
+    return _record_changes(customer_id, [(before, after)])
+
+
+def record_transaction_changes(customer_id: int, changes) -> int:
+    """
+    Records several writes to one customer's transactions as a single ledger version.
+
+    Args:
+        customer_id (int): The ID of the customer the transactions belong to.
+        changes (iterable): (before, after) pairs as taken by record_transaction_change.
+
+    Returns:
+        int: The customer's new ledger version, or None if the customer does not exist.
+    """
+    return _record_changes(customer_id, changes)[0]
+
+
+def _record_changes(customer_id: int, changes) -> tuple:
+    """ applies changes to the customer's bookkeeping, returns (version, user_id) as bump_ledger_version """
+    version, user_id = bump_ledger_version(customer_id)
+    if version is None:
+        return None, None
+
+    changes = list(changes)
+    deltas = dict.fromkeys(SUMMARY_COLUMNS, 0)
+    for before, after in changes:
+        for column, delta in _summary_deltas(before, after).items():
+            deltas[column] += delta
+    _add_to_summary(CustomerBalance, {'customer_id': customer_id, 'user_id': user_id}, deltas)
+    _add_to_summary(UserBalance, {'user_id': user_id}, deltas)
+    # the customer list carries every customer's ledger_version, so it changes too
+    bump_user_version(user_id)
+    reports.apply_aging_changes(user_id, changes)
+    return version, user_id
+
+
+def record_transaction_edit(customer_id: int) -> int:
+    """
+    Records a write to a transaction that leaves every amount unchanged, e.g. a new document link.
+
+    Returns:
+        int: The customer's new ledger version, or None if the customer does not exist.
+    """
+    version, user_id = bump_ledger_version(customer_id)
+    if version is not None:
+        bump_user_version(user_id)
+    return version
+
+
+def fetch_ledger_version(customer_id: int, user_id: int = None) -> int:
+    """
+    returns the current ledger version of a customer or None if the customer does not exist,
+    or does not belong to user_id when one is given
+    """
+    query = db.session.query(Customer.ledger_version).filter_by(id=customer_id)
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    return query.scalar()
+
+
+def fetch_user_version(user_id: int) -> int:
+    """ returns the current ledger version of a user or None if the user does not exist """
+    return db.session.query(User.ledger_version).filter_by(id=user_id).scalar()
+
+
+def fetch_balance_summary(user_id: int, customer_id: int = None) -> dict:
+    """
+    Fetches the running balance summary of a user or of one of the user's customers.
+
+    Args:
+        user_id (int): The ID of the user.
+        customer_id (int, optional): The ID of the customer. The user's summary is returned if omitted.
+
+    Returns:
+        dict: The summary figures, all zero if nothing has been recorded yet.
+              None if the customer does not belong to the user.
+    """
+    if customer_id is None:
+        return balance_summary({'user_id': user_id}, db.session.get(UserBalance, user_id))
+
+    if not Customer.query.filter_by(id=customer_id, user_id=user_id).count():
+        return None
+    return balance_summary({'customer_id': customer_id}, db.session.get(CustomerBalance, customer_id))
+
+
+def balance_summary(result: dict, summary) -> dict:
+    """ adds the figures of a UserBalance or CustomerBalance row (all zero if it is None) to result """
+    result.update(summary.to_dict() if summary else dict.fromkeys(SUMMARY_COLUMNS, 0))
+    return result
+
+
+def compute_balance_summaries():
+    """
+    Recomputes every customer summary from the transactions table.
+
+    Returns:
+        dict: {customer_id: (user_id, {column: value})}
+    """
+    status_counts = [func.sum(case((Transaction.payment_status == status, 1), else_=0)).label(column)
+                     for status, column in STATUS_COUNT_COLUMNS.items()]
+    rows = db.session.query(
+        Customer.id, Customer.user_id,
+        func.coalesce(func.sum(Transaction.amount_payable), 0).label('total_payable'),
+        func.coalesce(func.sum(Transaction.amount_paid), 0).label('total_paid'),
+        func.coalesce(func.sum(Transaction.remaining_balance), 0).label('outstanding'),
+        func.count(Transaction.id).label('transaction_count'),
+        *status_counts
+    ).join(Transaction, Transaction.customer_id == Customer.id).group_by(Customer.id, Customer.user_id)
+
+    return {row.id: (row.user_id, {column: getattr(row, column) for column in SUMMARY_COLUMNS}) for row in rows}
+
+
+def rebuild_balance_summaries(check_only=False) -> list:
+    """
+    Recomputes the balance summary tables from scratch.
+
+    Args:
+        check_only (bool): Only compare the stored summaries with the recomputed ones.
+
+    Returns:
+        list of str: A description of every stored summary that differed from the recomputed one.
+    """
+    customers, stored_customers = {}, {}
+    for _ in shards.each_business():
+        customers.update(compute_balance_summaries())
+        stored_customers.update((row.customer_id, row.to_dict()) for row in CustomerBalance.query.all())
+    users = {}
+    for user_id, figures in customers.values():
+        totals = users.setdefault(user_id, dict.fromkeys(SUMMARY_COLUMNS, 0))
+        for column, value in figures.items():
+            totals[column] += value
+
+    differences = []
+    stored_users = {row.user_id: row.to_dict() for row in UserBalance.query.all()}
+    for model, key, expected, stored in (
+            (CustomerBalance, 'customer_id', {k: v[1] for k, v in customers.items()}, stored_customers),
+            (UserBalance, 'user_id', users, stored_users)):
+        for row_id in sorted(set(stored) | set(expected)):
+            want = expected.get(row_id, dict.fromkeys(SUMMARY_COLUMNS, 0))
+            have = stored.get(row_id, dict.fromkeys(SUMMARY_COLUMNS, 0))
+            drift = {column: (have[column], want[column]) for column in SUMMARY_COLUMNS
+                     if abs((have[column] or 0) - (want[column] or 0)) > 1e-6}
+            if drift:
+                differences.append('{} {}={}: {}'.format(model.__tablename__, key, row_id, drift))
+
+    if not check_only:
+        for business in shards.each_business():
+            CustomerBalance.query.delete()
+            db.session.add_all(CustomerBalance(customer_id=customer_id, user_id=user_id, **figures)
+                               for customer_id, (user_id, figures) in customers.items() if business in (None, user_id))
+            db.session.flush()
+        UserBalance.query.delete()
+        db.session.add_all(UserBalance(user_id=user_id, **figures) for user_id, figures in users.items())
+        db.session.commit()
+
+    return differences
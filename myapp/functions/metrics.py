@@ -0,0 +1,212 @@
+""" this module measures every request by route and action and exposes the numbers to Prometheus
+
+    Most endpoints dispatch on ?action=, so a request is labelled with its URL rule,
+    method, status and action (the ?action= argument, or the <query> of /waitlist).
+    For each label set the module keeps a latency histogram, a response size histogram
+    and the number and total time of the SQL statements the request executed, counted
+    by engine events. GET /metrics renders them in the Prometheus text format.
+
+    Requests slower than METRICS_SLOW_REQUEST_SECONDS are logged together with the
+    SQL they ran. The numbers are kept per process, like /stats/cache.
+"""
+import contextvars
+import re
+import threading
+import time
+from bisect import bisect_left
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+ACTION_PATTERN = re.compile(r'[A-Za-z][A-Za-z0-9_-]{0,39}\Z')
+OTHER = 'other'
+
+
+class Histogram:
+    """ a fixed-bucket histogram, as Prometheus expects it """
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def buckets(self):
+        """ yields (le, cumulative count) pairs, ending with +Inf """
+        total = 0
+        for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class Series:
+    """ the measurements of one (method, route, action, status) label set """
+    __slots__ = ('latency', 'size', 'sql_statements', 'sql_seconds')
+
+    def __init__(self, latency_buckets: tuple, size_buckets: tuple):
+        self.latency = Histogram(latency_buckets)
+        self.size = Histogram(size_buckets)
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+
+
+class RequestStats:
+    """ what the current request has done so far """
+    __slots__ = ('started', 'sql_statements', 'sql_seconds', 'statements', 'status', 'size')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.statements = []  # (sql, seconds) of the first METRICS_SLOW_SQL_LIMIT statements
+        self.status = 500  # unless a response is returned
+        self.size = None
+
+
+_current = contextvars.ContextVar('fundsflow_request_stats', default=None)
+_series = {}
+_lock = threading.Lock()
+
+
+def reset():
+    """ forgets every measurement """
+    with _lock:
+        _series.clear()
+
+
+def request_labels(status: int) -> tuple:
+    """ returns the (method, route, action, status) labels of the current request """
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    action = request.args.get('action') or (request.view_args or {}).get('query') or ''
+    if action and not ACTION_PATTERN.match(action):
+        action = OTHER
+    return request.method, route, action, str(status)
+
+
+def record(labels: tuple, seconds: float, stats: RequestStats):
+    config = current_app.config
+    with _lock:
+        series = _series.get(labels)
+        if series is None:
+            if len(_series) >= config['METRICS_MAX_SERIES']:
+                # made-up actions must not grow the registry without bound
+                labels = labels[:2] + (OTHER,) + labels[3:]
+                series = _series.get(labels)
+            if series is None:
+                series = _series[labels] = Series(config['METRICS_LATENCY_BUCKETS'], config['METRICS_SIZE_BUCKETS'])
+        series.latency.observe(seconds)
+        if stats.size is not None:
+            series.size.observe(stats.size)
+        series.sql_statements += stats.sql_statements
+        series.sql_seconds += stats.sql_seconds
+
+
+def log_slow_request(labels: tuple, seconds: float, stats: RequestStats):
+    method, route, action, status = labels
+    statements = ''.join('\n  {:8.2f} ms  {}'.format(elapsed * 1000, ' '.join(sql.split()))
+                         for sql, elapsed in stats.statements)
+    if stats.sql_statements > len(stats.statements):
+        statements += '\n  ... {} more'.format(stats.sql_statements - len(stats.statements))
+    current_app.logger.warning('Slow request %s %s action=%s status=%s took %.1f ms, %d SQL statements in %.1f ms:%s',
+                               method, route, action or '-', status, seconds * 1000, stats.sql_statements,
+                               stats.sql_seconds * 1000, statements)
+
+
+def _start_request():
+    if current_app.config['METRICS_ENABLED']:
+        _current.set(RequestStats())
+
+
+def _measure_response(response):
+    stats = _current.get()
+    if stats is not None:
+        stats.status = response.status_code
+        # asking an iterable body for its length would buffer it, so only trust a declared one
+        stats.size = response.calculate_content_length() if response.is_sequence else response.content_length
+    return response
+
+
+def _finish_request(_exc=None):
+    stats = _current.get()
+    if stats is None:
+        return
+    _current.set(None)
+    seconds = time.perf_counter() - stats.started
+    labels = request_labels(stats.status)
+    record(labels, seconds, stats)
+    if seconds >= current_app.config['METRICS_SLOW_REQUEST_SECONDS']:
+        log_slow_request(labels, seconds, stats)
+
+
+def _label_text(labels: tuple) -> str:
+    method, route, action, status = labels
+    return 'method="{}",route="{}",action="{}",status="{}"'.format(method, route.replace('"', '\\"'), action, status)
+
+
+def _histogram_lines(name: str, labels: str, histogram: Histogram) -> list:
+    lines = ['{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, count) for bound, count in histogram.buckets()]
+    lines.append('{}_sum{{{}}} {!r}'.format(name, labels, histogram.sum))
+    lines.append('{}_count{{{}}} {}'.format(name, labels, histogram.count))
+    return lines
+
+
+def render() -> str:
+    """ returns every measurement in the Prometheus text exposition format """
+    with _lock:
+        series = sorted(_series.items())
+        latency, size, statements, seconds = [], [], [], []
+        for labels, measured in series:
+            text = _label_text(labels)
+            latency.extend(_histogram_lines('fundsflow_request_duration_seconds', text, measured.latency))
+            if measured.size.count:
+                size.extend(_histogram_lines('fundsflow_response_size_bytes', text, measured.size))
+            statements.append('fundsflow_sql_statements_total{{{}}} {}'.format(text, measured.sql_statements))
+            seconds.append('fundsflow_sql_duration_seconds_total{{{}}} {!r}'.format(text, measured.sql_seconds))
+
+    lines = ['# HELP fundsflow_request_duration_seconds Time spent handling requests.',
+             '# TYPE fundsflow_request_duration_seconds histogram', *latency,
+             '# HELP fundsflow_response_size_bytes Size of buffered response bodies.',
+             '# TYPE fundsflow_response_size_bytes histogram', *size,
+             '# HELP fundsflow_sql_statements_total SQL statements executed by requests.',
+             '# TYPE fundsflow_sql_statements_total counter', *statements,
+             '# HELP fundsflow_sql_duration_seconds_total Time requests spent executing SQL statements.',
+             '# TYPE fundsflow_sql_duration_seconds_total counter', *seconds]
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """ registers the request hooks and the engine events that feed the measurements """
+    # registered before the compression hook, so this after_request runs after it and sees the bytes sent
+    app.before_request(_start_request)
+    app.after_request(_measure_response)
+    app.teardown_request(_finish_request)
+    slow_sql_limit = app.config['METRICS_SLOW_SQL_LIMIT']
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _start_statement(conn, _cursor, _statement, _parameters, _context, _executemany):
+        if _current.get() is not None:
+            conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _finish_statement(conn, _cursor, statement, _parameters, _context, _executemany):
+        stats = _current.get()
+        started = conn.info.get('metrics_started')
+        if stats is None or not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        stats.sql_statements += 1
+        stats.sql_seconds += elapsed
+        if len(stats.statements) < slow_sql_limit:
+            stats.statements.append((statement, elapsed))
+
+    @event.listens_for(Engine, 'handle_error')
+    def _fail_statement(context):
+        started = context.connection.info.get('metrics_started') if context.connection is not None else None
+        if started:
+            started.pop()
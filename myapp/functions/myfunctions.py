@@ -1,5 +1,7 @@
 """ this module contains utility functions """
 import re
+import json
+import base64
 import random
 import time
 from datetime import datetime
@@ -69,3 +71,28 @@ def get_time_duration_in_minutes(start, end) -> int:
 
     return int(difference)
 
+
+def parse_datetime(value):
+    """ converts a 'YYYY-MM-DD HH:MM:SS' or 'YYYY-MM-DD' string into a datetime object
+        raises ValueError if the value matches neither format
+    """
+    for date_format in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, date_format)
+        except (TypeError, ValueError):
+            continue
+    raise ValueError("Invalid date '{}'. Expected format is YYYY-MM-DD HH:MM:SS or YYYY-MM-DD".format(value))
+
+
+def encode_cursor(*values) -> str:
+    """ packs the sort key of the last row on a page into an opaque url-safe cursor string """
+    packed = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(packed).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> list:
+    """ reverses encode_cursor. raises ValueError if the cursor is malformed """
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (AttributeError, TypeError, ValueError) as e:
+        raise ValueError('Invalid pagination cursor') from e
@@ -0,0 +1,231 @@
+""" this module delivers receipt emails through a transactional outbox
+
+    A payment that settles a transaction writes a ReceiptOutbox row in the same commit
+    (queue_receipt), so a receipt is queued if and only if the payment is stored, and
+    no request ever waits for a mail server. The sender (`flask send-receipts`) runs an
+    asyncio loop that claims due rows in batches, delivers them over a small pool of
+    reused SMTP connections and reschedules failed messages with exponential backoff.
+"""
+import asyncio
+import queue
+import random
+import smtplib
+from datetime import timedelta
+from email.message import EmailMessage
+from email.utils import formataddr
+from sqlalchemy import select, update
+from myapp import db
+from myapp.models import User, Customer, ReceiptOutbox
+from myapp.functions.blocklist import utcnow
+from myapp.functions.documents import money
+
+
+def queue_receipt(transaction):
+    """
+    Adds the receipt of a settled transaction to the outbox, in the caller's database transaction.
+
+    Args:
+        transaction (Transaction): The transaction that has just become paid.
+
+    Returns:
+        ReceiptOutbox: The queued message, or None if the customer has no email address.
+    """
+    customer = db.session.get(Customer, transaction.customer_id)
+    if customer is None or not customer.email:
+        return None
+
+    business = db.session.get(User, customer.user_id)
+    business_name = business.business_name or 'FundsFlow'
+    lines = ['Dear {},'.format(customer.first_name or 'customer'), '',
+             'We have received your payment for {}. Thank you!'.format(transaction.product_name), '',
+             'Order: {}'.format(transaction.order_id or '#{}'.format(transaction.id)),
+             'Amount payable: {}'.format(money(transaction.amount_payable)),
+             'Amount paid: {}'.format(money(transaction.amount_paid)),
+             'Balance: {}'.format(money(transaction.remaining_balance))]
+    if transaction.receipt_link:
+        lines.append('Receipt: {}'.format(transaction.receipt_link))
+    lines.extend(['', business_name])
+
+    message = ReceiptOutbox(transaction_id=transaction.id, user_id=customer.user_id, recipient=customer.email,
+                            subject='Payment receipt from {}'.format(business_name), body='\n'.join(lines),
+                            status='pending', attempts=0, next_attempt_at=utcnow())
+    db.session.add(message)
+    return message
+
+
+def is_permanent(error) -> bool:
+    """ tells whether an SMTP error will not go away by retrying (a 5xx reply) """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+class SMTPPool:
+    """
+    Keeps SMTP connections open between messages for the sender's threads to reuse.
+    The sender never sends more than SMTP_POOL_SIZE messages at once, so that is
+    also the most connections the pool opens.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._idle = queue.LifoQueue()
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.config['SMTP_HOST'], self.config['SMTP_PORT'], timeout=self.config['SMTP_TIMEOUT'])
+        if self.config['SMTP_STARTTLS']:
+            smtp.starttls()
+        if self.config['SMTP_USERNAME']:
+            smtp.login(self.config['SMTP_USERNAME'], self.config['SMTP_PASSWORD'])
+        return smtp
+
+    def send(self, message: EmailMessage):
+        """ sends one message, blocking. runs in a worker thread """
+        try:
+            smtp, reused = self._idle.get_nowait(), True
+        except queue.Empty:
+            smtp, reused = self._connect(), False
+
+        try:
+            try:
+                smtp.send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                if not reused:
+                    raise
+                # the server dropped the idle connection, try once more on a fresh one
+                smtp = self._connect()
+                smtp.send_message(message)
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException):
+            # the server refused this message, the connection itself can be reused
+            self._release(smtp, reset=True)
+            raise
+        except BaseException:
+            smtp.close()
+            raise
+        self._release(smtp)
+
+    def _release(self, smtp: smtplib.SMTP, reset=False):
+        try:
+            if reset:
+                smtp.rset()
+        except smtplib.SMTPException:
+            smtp.close()
+            return
+        self._idle.put(smtp)
+
+    def close(self):
+        while True:
+            try:
+                smtp = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                smtp.quit()
+            except smtplib.SMTPException:
+                smtp.close()
+
+
+class OutboxSender:
+    """
+    Drains the receipt outbox: claims due messages in batches and delivers them concurrently.
+
+    Several senders may run against one database. A claimed batch is leased for
+    OUTBOX_LEASE_SECONDS, after which another sender retries whatever is still pending.
+    """
+
+    def __init__(self, config, pool: SMTPPool = None):
+        self.config = config
+        self.pool = pool or SMTPPool(config)
+
+    def claim_batch(self) -> list:
+        """ leases up to OUTBOX_BATCH_SIZE due messages to this sender and returns them """
+        now = utcnow()
+        due = select(ReceiptOutbox.id) \
+            .where(ReceiptOutbox.status == 'pending', ReceiptOutbox.next_attempt_at <= now) \
+            .order_by(ReceiptOutbox.next_attempt_at, ReceiptOutbox.id) \
+            .limit(self.config['OUTBOX_BATCH_SIZE'])
+        lease = now + timedelta(seconds=self.config['OUTBOX_LEASE_SECONDS'])
+        rows = db.session.execute(
+            update(ReceiptOutbox).where(ReceiptOutbox.id.in_(due.scalar_subquery()))
+            .values(next_attempt_at=lease)
+            .returning(ReceiptOutbox.id, ReceiptOutbox.recipient, ReceiptOutbox.subject, ReceiptOutbox.body,
+                       ReceiptOutbox.attempts),
+            execution_options={'synchronize_session': False}).all()
+        db.session.commit()
+        return rows
+
+    def build_message(self, row) -> EmailMessage:
+        message = EmailMessage()
+        message['From'] = formataddr(('FundsFlow', self.config['MAIL_SENDER']))
+        message['To'] = row.recipient
+        message['Subject'] = row.subject
+        # a stable id lets mail servers drop the duplicate if a retry follows a lost reply
+        message['Message-ID'] = '<receipt-{}@{}>'.format(row.id, self.config['MAIL_SENDER'].rpartition('@')[2])
+        message.set_content(row.body)
+        return message
+
+    def backoff(self, attempts: int) -> float:
+        """ returns the seconds to wait after the given number of failed attempts, with jitter """
+        delay = min(self.config['OUTBOX_BACKOFF_SECONDS'] * 2 ** (attempts - 1),
+                    self.config['OUTBOX_MAX_BACKOFF_SECONDS'])
+        return delay * random.uniform(0.5, 1)
+
+    def record(self, rows, errors):
+        """ marks delivered messages sent and schedules or gives up on the others """
+        now = utcnow()
+        for row, error in zip(rows, errors):
+            if error is None:
+                values = {'status': 'sent', 'sent_at': now, 'last_error': None}
+            else:
+                attempts = row.attempts + 1
+                values = {'attempts': attempts, 'last_error': repr(error)}
+                if is_permanent(error) or attempts >= self.config['OUTBOX_MAX_ATTEMPTS']:
+                    values['status'] = 'failed'
+                else:
+                    values['next_attempt_at'] = now + timedelta(seconds=self.backoff(attempts))
+            db.session.execute(update(ReceiptOutbox).where(ReceiptOutbox.id == row.id).values(**values),
+                               execution_options={'synchronize_session': False})
+        db.session.commit()
+
+    async def deliver(self, row, slots: asyncio.Semaphore):
+        """ sends one message on a pooled connection and returns the error, if any """
+        async with slots:
+            try:
+                await asyncio.to_thread(self.pool.send, self.build_message(row))
+            except Exception as e:
+                return e
+        return None
+
+    async def run_once(self) -> int:
+        """ delivers one batch and returns how many messages it held """
+        rows = self.claim_batch()
+        if rows:
+            slots = asyncio.Semaphore(self.config['SMTP_POOL_SIZE'])
+            errors = await asyncio.gather(*(self.deliver(row, slots) for row in rows))
+            self.record(rows, errors)
+        return len(rows)
+
+    async def run(self, once=False) -> int:
+        """
+        Delivers batches until the outbox has nothing due, then waits OUTBOX_POLL_SECONDS and
+        checks again. With once=True it returns instead of waiting.
+
+        Returns:
+            int: The number of messages attempted.
+        """
+        attempted = 0
+        try:
+            while True:
+                count = await self.run_once()
+                attempted += count
+                if count < self.config['OUTBOX_BATCH_SIZE']:
+                    if once:
+                        return attempted
+                    await asyncio.sleep(self.config['OUTBOX_POLL_SECONDS'])
+        finally:
+            self.pool.close()
+
+
+def send_receipts(config, once=False) -> int:
+    """ runs the outbox sender in a new event loop. needs an app context """
+    return asyncio.run(OutboxSender(config).run(once))
@@ -0,0 +1,167 @@
+""" this module marks pending transactions overdue once their due date has passed
+
+    The sweeper keeps a high-water mark on due_date in the sweep_mark table: every
+    pending transaction due up to the mark has already been marked. A run only reads
+    the due dates after the mark, through ix_transaction_due_date_status, so it never
+    rescans the table. Transactions written with a due date that has already passed are
+    marked overdue when they are written (resources.payment_status).
+
+    resources.payment_status decides pending or overdue before the writer commits, so a
+    transaction due just before a sweep can still commit as pending after it. The mark
+    therefore trails the sweep by OVERDUE_SWEEP_LAG_SECONDS, longer than any write
+    transaction: each run marks everything due up to now, but the next run looks again
+    at what fell due in the lag, and finds any such late commit.
+
+    Each batch moves the mark with a compare-and-set in the same database transaction
+    as the rows it marks, so a batch is swept exactly once however many sweepers run,
+    and a crashed batch is retried as a whole. After the commit every affected business
+    gets one 'transactions_overdue' event on the /ledger Socket.IO namespace; a sweeper
+    running outside the web workers needs SOCKETIO_MESSAGE_QUEUE for that to reach them.
+
+    due_date is stored in local time, like the dates users enter, so the sweeper uses
+    local time too.
+"""
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, update
+from myapp import db, sockets
+from myapp.models import Customer, Transaction, SweepMark
+from myapp.functions import ledger, shards
+
+SWEEP_NAME = 'overdue'
+
+
+def fetch_mark():
+    """ returns the high-water mark, creating it (as None: nothing swept yet) on the first run """
+    # read as a column, not an entity: every shard has a mark of the same name
+    statement = select(SweepMark.high_water).where(SweepMark.name == SWEEP_NAME)
+    mark = db.session.execute(statement).first()
+    if mark is None:
+        db.session.execute(SweepMark.__table__.insert().prefix_with('OR IGNORE').values(name=SWEEP_NAME))
+        db.session.commit()
+        mark = db.session.execute(statement).first()
+    return mark.high_water
+
+
+def _window(high_water):
+    """ the pending transactions due after high_water """
+    conditions = [Transaction.payment_status == 'pending']
+    if high_water is not None:
+        conditions.append(Transaction.due_date > high_water)
+    return conditions
+
+
+def sweep_batch(now: datetime, batch_size: int, lag_seconds: int = 300):
+    """
+    Marks overdue the next batch of pending transactions due after the mark and no later than now.
+
+    The batch ends at the due date of the batch_size-th such transaction (all transactions
+    due at that moment are included), or at now if fewer are left. The mark moves to the
+    end of the batch, but no further than lag_seconds before now.
+
+    Args:
+        now (datetime): The local time to sweep up to.
+        batch_size (int): About how many transactions to mark in one database transaction.
+        lag_seconds (int): How far the mark trails now, see the module docstring.
+
+    Returns:
+        tuple: (the due date the batch swept up to, {user_id: [{'customer_id', 'transaction_ids',
+               'ledger_version'}]}). If another sweeper moved the mark first, the dict is None
+               and the first item is that sweeper's mark.
+    """
+    high_water = fetch_mark()
+    if high_water is not None and high_water >= now:
+        return high_water, {}
+
+    boundary = db.session.execute(
+        select(Transaction.due_date).where(*_window(high_water), Transaction.due_date <= now)
+        .order_by(Transaction.due_date).offset(batch_size - 1).limit(1)).scalar()
+    swept_to = boundary or now
+    new_mark = min(swept_to, now - timedelta(seconds=lag_seconds))
+    if high_water is not None:
+        new_mark = max(new_mark, high_water)
+
+    moved = db.session.execute(
+        update(SweepMark)
+        .where(SweepMark.name == SWEEP_NAME,
+               SweepMark.high_water.is_(None) if high_water is None else SweepMark.high_water == high_water)
+        .values(high_water=new_mark, updated=datetime.now()),
+        execution_options={'synchronize_session': False})
+    if moved.rowcount != 1:
+        db.session.rollback()
+        return fetch_mark(), None
+
+    rows = db.session.execute(
+        update(Transaction).where(*_window(high_water), Transaction.due_date <= swept_to)
+        .values(payment_status='overdue')
+        .returning(Transaction.id, Transaction.customer_id, Transaction.amount_payable,
+                   Transaction.amount_paid, Transaction.remaining_balance),
+        execution_options={'synchronize_session': False}).all()
+
+    changes = {}
+    for row in rows:
+        state = {'amount_payable': row.amount_payable, 'amount_paid': row.amount_paid,
+                 'remaining_balance': row.remaining_balance}
+        changes.setdefault(row.customer_id, []).append(
+            (row.id, dict(state, payment_status='pending'), dict(state, payment_status='overdue')))
+
+    owners = dict(db.session.execute(select(Customer.id, Customer.user_id)
+                                     .where(Customer.id.in_(changes))).all()) if changes else {}
+    affected = {}
+    for customer_id, customer_changes in sorted(changes.items()):
+        version = ledger.record_transaction_changes(customer_id, [(before, after)
+                                                                  for _, before, after in customer_changes])
+        if version is not None:
+            affected.setdefault(owners[customer_id], []).append(
+                {'customer_id': customer_id, 'transaction_ids': [row_id for row_id, _, _ in customer_changes],
+                 'ledger_version': version})
+    db.session.commit()
+    return swept_to, affected
+
+
+def sweep_overdue(now: datetime = None, batch_size: int = 1000, lag_seconds: int = 300) -> int:
+    """
+    Marks overdue every pending transaction due since the last sweep, batch by batch, and
+    announces each batch to the businesses it affected.
+
+    Running it again, or in several processes at once, marks nothing twice.
+
+    Args:
+        now (datetime, optional): The local time to sweep up to. The current time if omitted.
+        batch_size (int): Transactions marked per database transaction.
+        lag_seconds (int): How far the mark trails now, see sweep_batch.
+
+    Returns:
+        int: The number of transactions this call marked overdue.
+    """
+    now = now or datetime.now()
+    marked = 0
+    while True:
+        swept_to, affected = sweep_batch(now, batch_size, lag_seconds)
+        for user_id, customers in (affected or {}).items():
+            sockets.publish_transactions_overdue(user_id, customers)
+            marked += sum(len(customer['transaction_ids']) for customer in customers)
+        if swept_to >= now:
+            return marked
+
+
+def run_sweeper(config, once=False) -> int:
+    """
+    Sweeps, then waits OVERDUE_SWEEP_SECONDS and sweeps again. With once=True it returns
+    after the first sweep. Needs an app context.
+
+    Returns:
+        int: The number of transactions marked overdue.
+    """
+    marked = 0
+    while True:
+        try:
+            # with sharding, every business' shard keeps its own mark
+            for _ in shards.each_business():
+                marked += sweep_overdue(batch_size=config['OVERDUE_SWEEP_BATCH_SIZE'],
+                                        lag_seconds=config['OVERDUE_SWEEP_LAG_SECONDS'])
+        finally:
+            db.session.remove()
+        if once:
+            return marked
+        time.sleep(config['OVERDUE_SWEEP_SECONDS'])
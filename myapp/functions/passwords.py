@@ -0,0 +1,88 @@
+""" this module hashes and verifies user passwords
+
+    Password hashing is deliberately CPU-heavy. Verification runs on a small shared
+    thread pool (hashlib releases the GIL while hashing) so that a burst of logins
+    cannot occupy every request thread at once. Requests that cannot get a slot
+    within PASSWORD_HASH_QUEUE_TIMEOUT seconds are turned away instead of piling up.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class PasswordCheckBusy(Exception):
+    """ raised when every password verification slot is taken """
+
+
+_executor = None
+_slots = None
+_methods = {}
+_lock = threading.Lock()
+
+
+def _pool():
+    """ returns the verification pool and its admission semaphore, creating both on first use """
+    global _executor, _slots
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                workers = current_app.config['PASSWORD_HASH_WORKERS']
+                _slots = threading.BoundedSemaphore(workers + current_app.config['PASSWORD_HASH_MAX_PENDING'])
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+    return _executor, _slots
+
+
+def hash_method() -> str:
+    """ returns the configured hash method with werkzeug's defaults filled in, e.g. 'scrypt:32768:8:1' """
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    if method not in _methods:
+        _methods[method] = generate_password_hash('', method=method).split('$', 1)[0]
+    return _methods[method]
+
+
+def hash_password(password: str) -> str:
+    """ hashes a password with the configured method and cost """
+    return generate_password_hash(password, method=hash_method())
+
+
+def verify_password(pwhash: str, password: str) -> bool:
+    """
+    Checks a password against a stored hash on the verification pool.
+
+    Args:
+        pwhash (str): The stored password hash.
+        password (str): The plaintext password.
+
+    Returns:
+        bool: True if the password matches.
+
+    Raises:
+        PasswordCheckBusy: If no verification slot frees up in time.
+    """
+    executor, slots = _pool()
+    if not slots.acquire(timeout=current_app.config['PASSWORD_HASH_QUEUE_TIMEOUT']):
+        raise PasswordCheckBusy('Too many logins in progress')
+    try:
+        return executor.submit(check_password_hash, pwhash, password).result()
+    finally:
+        slots.release()
+
+
+async def verify_password_async(pwhash: str, password: str) -> bool:
+    """ verify_password for the event loop: waits for a slot and for the hash without blocking the loop """
+    executor, slots = _pool()
+    if not slots.acquire(blocking=False):
+        acquired = await asyncio.to_thread(slots.acquire, timeout=current_app.config['PASSWORD_HASH_QUEUE_TIMEOUT'])
+        if not acquired:
+            raise PasswordCheckBusy('Too many logins in progress')
+    try:
+        return await asyncio.wrap_future(executor.submit(check_password_hash, pwhash, password))
+    finally:
+        slots.release()
+
+
+def needs_rehash(pwhash: str) -> bool:
+    """ returns True if a stored hash was made with a different method or cost than the configured one """
+    return pwhash.split('$', 1)[0] != hash_method()
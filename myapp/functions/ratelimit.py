@@ -0,0 +1,202 @@
+""" this module rate limits the unauthenticated endpoints with token buckets
+
+    Buckets live in a small memory-mapped file (RATELIMIT_STORE_PATH) that every
+    worker process on the host maps, so a limit holds no matter which worker a
+    request lands on. The file is a fixed-size open-addressing table of
+    (key hash, tokens, last update) slots guarded by an flock, which keeps a check
+    to a few microseconds and the file to RATELIMIT_SLOTS * 24 bytes. When a probe
+    window is full, the slot touched longest ago is reused; its bucket has refilled
+    by then in all but the busiest stores.
+
+    Limits are configured per route in RATELIMIT_RULES as '<count>/<period>' strings,
+    keyed by client IP and, where the request carries one, by email address.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from functools import lru_cache, wraps
+from flask import current_app, request
+from myapp.functions.serializers import dumps
+
+SLOT = struct.Struct('<Qdd')  # key hash, tokens, last update (unix time)
+PROBES = 8
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+@lru_cache(maxsize=None)
+def parse_limit(limit: str) -> tuple:
+    """
+    Turns '<count>/<period>' (e.g. '10/minute') into a token bucket.
+
+    Returns:
+        tuple: (rate in tokens per second, burst size).
+
+    Raises:
+        ValueError: If the limit is malformed.
+    """
+    count, _, period = limit.partition('/')
+    if period not in PERIODS or not count.isdigit() or int(count) < 1:
+        raise ValueError('Invalid rate limit {!r}, expected e.g. 10/minute'.format(limit))
+    return int(count) / PERIODS[period], int(count)
+
+
+class TokenBucketStore:
+    """
+    Token buckets shared by every process that maps the same file.
+
+    Attributes:
+        path (str): The backing file.
+        slots (int): How many buckets the table holds.
+    """
+
+    def __init__(self, path: str, slots: int):
+        self.path = path
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _open(self):
+        # flock is held per open file, so every process (including forked workers) opens its own
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = self.slots * SLOT.size
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size != size:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+        self._pid = os.getpid()
+
+    def take(self, key: str, rate: float, burst: int, now: float = None) -> float:
+        """
+        Takes one token from the bucket of key.
+
+        Args:
+            key (str): Identifies the bucket, e.g. 'login:ip:203.0.113.7'.
+            rate (float): Tokens added per second.
+            burst (int): Bucket size.
+            now (float, optional): The current unix time, for tests.
+
+        Returns:
+            float: 0 if the request may proceed, else the seconds until a token is available.
+        """
+        return self.take_many([(key, rate, burst)], now)
+
+    def take_many(self, buckets: list, now: float = None) -> float:
+        """
+        Takes one token from each of several buckets under a single lock, stopping at the
+        first empty one.
+
+        Args:
+            buckets (list): (key, rate, burst) tuples, as for take.
+            now (float, optional): The current unix time, for tests.
+
+        Returns:
+            float: 0 if the request may proceed, else the seconds until a token is available.
+        """
+        digests = [int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+                   for key, _, _ in buckets]
+        now = time.time() if now is None else now
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                for digest, (_, rate, burst) in zip(digests, buckets):
+                    wait = self._take(digest, rate, burst, now)
+                    if wait:
+                        return wait
+                return 0.0
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _take(self, digest, rate, burst, now):
+        first = digest % self.slots
+        offset, tokens = None, float(burst)
+        oldest_offset, oldest = None, None
+        for probe in range(PROBES):
+            candidate = ((first + probe) % self.slots) * SLOT.size
+            slot_key, slot_tokens, slot_updated = SLOT.unpack_from(self._map, candidate)
+            if slot_key == digest:
+                offset = candidate
+                tokens = min(float(burst), slot_tokens + max(0.0, now - slot_updated) * rate)
+                break
+            if slot_key == 0:
+                offset = candidate
+                break
+            if oldest is None or slot_updated < oldest:
+                oldest_offset, oldest = candidate, slot_updated
+        if offset is None:
+            offset = oldest_offset
+
+        if tokens >= 1:
+            SLOT.pack_into(self._map, offset, digest, tokens - 1, now)
+            return 0.0
+        SLOT.pack_into(self._map, offset, digest, tokens, now)
+        return (1 - tokens) / rate
+
+
+_stores = {}
+
+
+def get_store() -> TokenBucketStore:
+    """ returns the process-wide store for the configured file """
+    path = current_app.config['RATELIMIT_STORE_PATH']
+    if path not in _stores:
+        _stores[path] = TokenBucketStore(path, current_app.config['RATELIMIT_SLOTS'])
+    return _stores[path]
+
+
+def check_request(route: str) -> float:
+    """
+    Applies the limits of a route to the current request.
+
+    Args:
+        route (str): The key of the route in RATELIMIT_RULES.
+
+    Returns:
+        float: 0 if the request may proceed, else the seconds the client should wait.
+    """
+    rules = current_app.config['RATELIMIT_RULES'].get(route, {})
+    buckets = []
+    if 'ip' in rules:
+        buckets.append(('{}:ip:{}'.format(route, request.remote_addr or ''),) + parse_limit(rules['ip']))
+    if 'email' in rules:
+        data = request.get_json(silent=True)
+        email = data.get('email') if isinstance(data, dict) else None
+        if isinstance(email, str) and email:
+            buckets.append(('{}:email:{}'.format(route, email.strip().lower()),) + parse_limit(rules['email']))
+    return get_store().take_many(buckets) if buckets else 0.0
+
+
+def limited_response(route: str):
+    """
+    Returns the 429 response for a request over the limits of RATELIMIT_RULES[route],
+    or None if the request may proceed.
+    """
+    if not current_app.config['RATELIMIT_ENABLED']:
+        return None
+    wait = check_request(route)
+    if not wait:
+        return None
+
+    retry_after = max(1, int(wait + 0.999))
+    message = 'Too many requests. Please try again in {} seconds.'.format(retry_after)
+    return dumps({'status': 2, 'data': None, 'message': message, 'error': [message]}), 429, \
+        {'Retry-After': str(retry_after)}
+
+
+def limit(route: str):
+    """ decorates a view so requests over the limits of RATELIMIT_RULES[route] get a 429 """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            return limited_response(route) or view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,164 @@
+""" this module builds the business-level reports served by /reports """
+from datetime import date, datetime
+from sqlalchemy import case, func, update
+from sqlalchemy.dialects.sqlite import insert
+from myapp import db
+from myapp.models import Customer, Transaction, AgingRollup
+from myapp.functions import shards
+
+AGING_BUCKETS = ('current', 'days_1_30', 'days_31_60', 'days_61_90', 'days_over_90')
+
+
+def compute_aging(as_of: date, user_id: int = None) -> dict:
+    """
+    Computes the receivables aging buckets with one grouped aggregate over the ledger.
+
+    A transaction counts towards the bucket of the number of whole days between its
+    due_date and as_of. Transactions without a due date, or not yet due, are 'current'.
+    Only transactions with a remaining balance are included.
+
+    Args:
+        as_of (date): The day to age the balances against.
+        user_id (int, optional): Restrict the report to one user. All users are computed if omitted.
+
+    Returns:
+        dict: {user_id: {bucket: outstanding amount}}
+    """
+    days_past_due = func.julianday(as_of.isoformat()) - func.julianday(func.date(Transaction.due_date))
+    bucket = case(
+        (Transaction.due_date.is_(None), 'current'),
+        (days_past_due <= 0, 'current'),
+        (days_past_due <= 30, 'days_1_30'),
+        (days_past_due <= 60, 'days_31_60'),
+        (days_past_due <= 90, 'days_61_90'),
+        else_='days_over_90').label('bucket')
+
+    query = db.session.query(Customer.user_id, bucket, func.sum(Transaction.remaining_balance)) \
+        .join(Customer, Customer.id == Transaction.customer_id) \
+        .filter(Transaction.remaining_balance > 0)
+    if user_id is not None:
+        query = query.filter(Customer.user_id == user_id)
+
+    report = {}
+    for row_user_id, row_bucket, amount in query.group_by(Customer.user_id, bucket):
+        report.setdefault(row_user_id, dict.fromkeys(AGING_BUCKETS, 0))[row_bucket] = amount
+    return report
+
+
+def aging_bucket(due_date, as_of: date) -> str:
+    """ returns the bucket compute_aging puts a balance due on due_date in, as of the given day """
+    if due_date is None:
+        return 'current'
+    days_past_due = (as_of - (due_date.date() if isinstance(due_date, datetime) else due_date)).days
+    if days_past_due <= 0:
+        return 'current'
+    if days_past_due <= 30:
+        return 'days_1_30'
+    if days_past_due <= 60:
+        return 'days_31_60'
+    if days_past_due <= 90:
+        return 'days_61_90'
+    return 'days_over_90'
+
+
+def aging_deltas(changes, as_of: date) -> dict:
+    """
+    Works out how the aging buckets change when transactions go from before to after.
+
+    Args:
+        changes (iterable): (before, after) pairs of ledger.balance_state dicts, None for
+                            a created or deleted transaction.
+        as_of (date): The day the buckets are aged against.
+
+    Returns:
+        dict: {bucket: amount to add}
+    """
+    deltas = dict.fromkeys(AGING_BUCKETS, 0)
+    for before, after in changes:
+        for state, sign in ((before, -1), (after, 1)):
+            if state is not None and (state['remaining_balance'] or 0) > 0:
+                deltas[aging_bucket(state.get('due_date'), as_of)] += sign * state['remaining_balance']
+    return deltas
+
+
+def store_aging_rollup(user_id: int, as_of: date, buckets: dict):
+    """ upserts one day's aging buckets for a user. the caller commits """
+    values = {'user_id': user_id, 'as_of': as_of, 'computed_at': datetime.now(), **buckets}
+    statement = insert(AgingRollup).values(**values)
+    statement = statement.on_conflict_do_update(
+        index_elements=['user_id', 'as_of'],
+        set_={name: statement.excluded[name] for name in values if name not in ('user_id', 'as_of')})
+    db.session.execute(statement)
+
+
+def _serialize_rollup(user_id, as_of, buckets):
+    report = {'user_id': user_id, 'as_of': as_of.isoformat(), 'total_outstanding': sum(buckets.values())}
+    report.update(buckets)
+    return report
+
+
+def fetch_aging_report(user_id: int, as_of: date = None, fresh: bool = False) -> dict:
+    """
+    Returns a user's aging report from the daily rollup, computing it on a miss.
+
+    Every ledger write moves its amounts between the buckets of today's rollup, so a
+    hit is never stale and only the first read of a day aggregates the ledger. Other
+    days are served exactly as they were stored.
+
+    Args:
+        user_id (int): The ID of the user.
+        as_of (date, optional): The day of the report, today if omitted.
+        fresh (bool): Recompute today's report even if a rollup exists.
+
+    Returns:
+        dict: The buckets plus total_outstanding, or None if there is no rollup
+              for a past day.
+    """
+    today = date.today()
+    as_of = as_of or today
+    rollup = None if fresh else db.session.get(AgingRollup, (user_id, as_of))
+    if rollup is not None:
+        return _serialize_rollup(user_id, as_of, {name: getattr(rollup, name) for name in AGING_BUCKETS})
+    if as_of != today:
+        return None
+
+    buckets = compute_aging(as_of, user_id).get(user_id, dict.fromkeys(AGING_BUCKETS, 0))
+    store_aging_rollup(user_id, as_of, buckets)
+    db.session.commit()
+    return _serialize_rollup(user_id, as_of, buckets)
+
+
+def apply_aging_changes(user_id: int, changes):
+    """
+    Applies transaction writes to the user's rollup of today, if it has one. the caller commits
+
+    Args:
+        user_id (int): The ID of the user the transactions belong to.
+        changes (iterable): (before, after) pairs as taken by aging_deltas.
+    """
+    today = date.today()
+    deltas = {name: delta for name, delta in aging_deltas(changes, today).items() if delta}
+    if deltas:
+        db.session.execute(update(AgingRollup)
+                           .where(AgingRollup.user_id == user_id, AgingRollup.as_of == today)
+                           .values({name: getattr(AgingRollup, name) + delta for name, delta in deltas.items()}))
+
+
+def rollup_aging(as_of: date = None) -> int:
+    """
+    Computes and stores the aging rollup of every user with outstanding balances.
+
+    Args:
+        as_of (date, optional): The day to compute, today if omitted.
+
+    Returns:
+        int: The number of rollup rows written.
+    """
+    as_of = as_of or date.today()
+    report = {}
+    for business in shards.each_business():
+        report.update(compute_aging(as_of, business))
+    for user_id, buckets in report.items():
+        store_aging_rollup(user_id, as_of, buckets)
+    db.session.commit()
+    return len(report)
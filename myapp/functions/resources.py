@@ -1,21 +1,38 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, or_
+from myapp import db
 from myapp.functions import myfunctions as myfunc
-from myapp.models import User, Customer, Transaction
+from myapp.functions import ledger
+from myapp.functions import id_allocator
+from myapp.functions.serializers import USER_PLAN, CUSTOMER_PLAN, TRANSACTION_PLAN, WAITLIST_PLAN, dumps
+from myapp.models import User, Customer, Transaction, WaitList
 
 
 def generate_business_id(business_name: str) -> str:
-    """ attaches a random 4-digit code to surname to form userid
-        ensures userid is unique
+    """ builds a unique business id from the business name and a code drawn from the
+        'business_id' sequence, e.g. 'adasons_k3x9q1'. the code alone is unique, so
+        no lookup or retry is needed
     """
+    allocator = id_allocator.get_allocator('business_id', current_app.config['BUSINESS_ID_BLOCK_SIZE'])
+    code = id_allocator.encode_number(allocator.allocate())
+    prefix = id_allocator.slugify(business_name)
+    return '{}_{}'.format(prefix, code) if prefix else code
 
-    def generate_random_code():
-        """generates random code of 4-digits numbers and attaches it to the first-four letters of the business name"""
-        code = myfunc.random_numbers(4)
-        userid = "{}_{}".format(business_name.lower()[3:], code)
-        if User.query.filter_by(business_id=userid).count() > 0:
-            generate_random_code()
-        return userid
 
-    return generate_random_code()
+def serialize_user(user) -> dict:
+    """
+    Converts a User instance into the dictionary returned to clients.
+
+    Args:
+        user (User): The user to convert.
+
+    Returns:
+        dict: The user information.
+    """
+    user_info = USER_PLAN.from_object(user)
+    user_info['customers'] = []
+    return user_info
 
 
 def fetch_user_info(user_id: int) -> dict:
@@ -29,17 +46,21 @@ def fetch_user_info(user_id: int) -> dict:
         dict : A dictionary containing user information if the user exists in the database.
                       Returns empty dict if the user does not exist.
     """
-    user = User.query.filter_by(id=user_id).first()
-    if user is None:
+    row = db.session.execute(USER_PLAN.select().where(User.id == user_id)).first()
+    if row is None:
         return {}
 
-    mr = {'user_id': user.id, 'first_name': user.first_name, 'last_name': user.last_name, 'phone': user.phone_number,
-          'email': user.email, 'business_name': user.business_name, 'business_phone': user.business_phone,
-          'business_email': user.business_email, 'blocked_status': user.blockstat, 'activated': user.activated,
-          'business_type': user.business_type, 'logo': user.business_logo_link, 'admin_type': user.admin_type,
-          'business_id': user.business_id, 'customers': []}
+    user_info = USER_PLAN.one(row)
+    user_info['customers'] = []
+    return user_info
+
 
-    return mr
+def customer_query(user_id, customer_id=None):
+    """ returns the SELECT of CUSTOMER_PLAN's columns behind fetch_customer_info """
+    statement = CUSTOMER_PLAN.select().where(Customer.user_id == user_id)
+    if customer_id is not None:
+        statement = statement.where(Customer.id == customer_id)
+    return statement
 
 
 def fetch_customer_info(user_id, customer_id=None):
@@ -61,80 +82,292 @@ def fetch_customer_info(user_id, customer_id=None):
     if user_id is None:
         raise ValueError("User ID must be provided.")
 
+    statement = customer_query(user_id, customer_id)
+
     if customer_id is not None:
         # Fetch info for a specific customer
-        customer = Customer.query.filter_by(user_id=user_id, id=customer_id).first()
-        if customer:
-            return {
-                'id': customer.id,
-                'first_name': customer.first_name,
-                'last_name': customer.last_name,
-                'email': customer.email,
-                'phone_number': customer.phone_number,
-                'shipping_address': customer.shipping_address,
-                'user_id': customer.user_id
-            }
-        else:
-            return {}
+        row = db.session.execute(statement).first()
+        return CUSTOMER_PLAN.one(row) if row else {}
+
+    # Fetch info for all customers associated with the user_id
+    return CUSTOMER_PLAN.rows(db.session.execute(statement))
+
+
+TRANSACTION_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def payment_status(remaining_balance: float, due_date: datetime = None) -> str:
+    """ returns 'paid' for a settled balance, else 'overdue' once due_date has passed and 'pending' before.
+        the overdue sweeper (functions/overdue.py) only looks at due dates after its mark, so a
+        transaction written with a past due date must be marked overdue here
+    """
+    if remaining_balance == 0:
+        return 'paid'
+    if due_date is not None and due_date <= datetime.now():
+        return 'overdue'
+    return 'pending'
+
+
+def transaction_values(data: dict) -> dict:
+    """
+    Works out the column values of a new Transaction from a LOG-TRANSACTION payload.
+
+    Args:
+        data (dict): The invoice data. 'customer_id', 'product_name', 'delivery_address', 'rate',
+                     'number_of_items', 'total_price' and 'delivery_fee' are required; dates are
+                     'YYYY-MM-DD HH:MM:SS' strings.
+
+    Returns:
+        dict: Keyword arguments for Transaction, including the derived amount_payable,
+              remaining_balance and payment_status.
+
+    Raises:
+        KeyError: If a required field is missing.
+        ValueError: If a date cannot be parsed.
+        TypeError: If an amount is not a number.
+    """
+    date_format = TRANSACTION_DATE_FORMAT
+    discount = data.get('discount') or 0
+    amount_paid = data.get('amount_paid') or 0
+    amount_payable = data['total_price'] + data['delivery_fee'] - discount
+    remaining_balance = amount_payable - amount_paid
+    due_date = datetime.strptime(data['due_date'], date_format) if data.get('due_date') else None
+
+    return {
+        'customer_id': data['customer_id'],
+        'product_name': data['product_name'],
+        'product_description': data.get('product_description'),
+        'order_date': datetime.strptime(data['order_date'], date_format) if data.get('order_date') else None,
+        'delivery_address': data['delivery_address'],
+        'delivery_date': datetime.strptime(data['delivery_date'], date_format) if data.get('delivery_date') else None,
+        'rate': data['rate'],
+        'number_of_items': data['number_of_items'],
+        'discount_applied': discount,
+        'total_price': data['total_price'],
+        'delivery_fee': data['delivery_fee'],
+        'amount_payable': amount_payable,
+        'invoice_link': data.get('invoice_link'),
+        'receipt_link': data.get('receipt_link'),
+        'amount_paid': amount_paid,
+        'remaining_balance': remaining_balance,
+        'due_date': due_date,
+        'payment_status': payment_status(remaining_balance, due_date)
+    }
+
 
-    else:
-        # Fetch info for all customers associated with the user_id
-        customers = Customer.query.filter_by(user_id=user_id).all()
-        customers_info = []
-        for customer in customers:
-            customer_info = {
-                'id': customer.id,
-                'first_name': customer.first_name,
-                'last_name': customer.last_name,
-                'email': customer.email,
-                'phone_number': customer.phone_number,
-                'shipping_address': customer.shipping_address,
-                'user_id': customer.user_id
-            }
-            customers_info.append(customer_info)
+def serialize_transaction(transaction) -> dict:
+    """
+    Converts a Transaction instance into the dictionary returned to clients.
+
+    Args:
+        transaction (Transaction): The transaction to convert.
+
+    Returns:
+        dict: The transaction information.
+    """
+    return TRANSACTION_PLAN.from_object(transaction)
+
+
+def owned_transaction(user_id, transaction_id):
+    """
+    Loads a transaction if its customer belongs to the given user.
+
+    Args:
+        user_id (int): The ID of the user.
+        transaction_id (int): The ID of the transaction.
+
+    Returns:
+        Transaction: The transaction, or None if it does not exist or belongs to another business.
+    """
+    return Transaction.query.join(Customer, Customer.id == Transaction.customer_id) \
+        .filter(Transaction.id == transaction_id, Customer.user_id == user_id).first()
 
-        return customers_info
 
+def filter_customer_transactions(customer_id, filters=None):
+    """
+    Builds the SELECT of a customer's transactions narrowed down by the supported filters.
+
+    Args:
+        customer_id (int): The ID of the customer.
+        filters (dict, optional): Any of 'payment_status' (str or list of str), 'due_date_from',
+                                  'due_date_to', 'order_date_from' and 'order_date_to'.
+                                  Dates are 'YYYY-MM-DD HH:MM:SS' or 'YYYY-MM-DD' strings and
+                                  the ranges are inclusive: a date-only '_to' bound takes in
+                                  that whole day.
+
+    Returns:
+        Select: The filtered SELECT of TRANSACTION_PLAN's columns.
+
+    Raises:
+        ValueError: If a date filter cannot be parsed.
+    """
+    statement = TRANSACTION_PLAN.select().where(Transaction.customer_id == customer_id)
+    filters = filters or {}
+
+    payment_status = filters.get('payment_status')
+    if payment_status:
+        if isinstance(payment_status, str):
+            payment_status = [payment_status]
+        statement = statement.where(Transaction.payment_status.in_(payment_status))
+
+    date_ranges = (('due_date', Transaction.due_date), ('order_date', Transaction.order_date))
+    for name, column in date_ranges:
+        if filters.get(name + '_from'):
+            statement = statement.where(column >= myfunc.parse_datetime(filters[name + '_from']))
+        if filters.get(name + '_to'):
+            upper = myfunc.parse_datetime(filters[name + '_to'])
+            if len(filters[name + '_to']) == len('YYYY-MM-DD'):
+                # a date without a time takes in the whole of that day
+                statement = statement.where(column < upper + timedelta(days=1))
+            else:
+                statement = statement.where(column <= upper)
 
-def fetch_customer_transactions(customer_id):
+    return statement
+
+
+def fetch_customer_transactions(customer_id, filters=None):
     """
     Fetches all transaction instances associated with a given customer ID.
 
     Args:
         customer_id (int): The ID of the customer.
+        filters (dict, optional): Narrows the result, see filter_customer_transactions.
 
     Returns:
         list of dict: A list of dictionaries containing information of all transactions
                       associated with the provided customer_id.
     """
-    transactions = Transaction.query.filter_by(customer_id=customer_id).all()
-    transactions_info = []
-
-    date_format = '%Y-%m-%d %H:%M:%S'  # Change this format based on your preference
-
-    for transaction in transactions:
-        transaction_info = {
-            'transaction_id': transaction.id,
-            'customer_id': transaction.customer_id,
-            'order_id': transaction.order_id,
-            'product_name': transaction.product_name,
-            'product_description': transaction.product_description,
-            'order_date': transaction.order_date.strftime(date_format) if transaction.order_date else None,
-            'delivery_address': transaction.delivery_address,
-            'delivery_date': transaction.delivery_date.strftime(date_format) if transaction.delivery_date else None,
-            'rate': transaction.rate,
-            'quantity': transaction.quantity,
-            'discount_applied': transaction.discount_applied,
-            'total_price': transaction.total_price,
-            'delivery_fee': transaction.delivery_fee,
-            'invoice_link': transaction.invoice_link,
-            'receipt_link': transaction.receipt_link,
-            'amount_paid': transaction.amount_paid,
-            'remaining_balance': transaction.remaining_balance,
-            'due_date': transaction.due_date.strftime(date_format) if transaction.due_date else None,
-            'payment_status': transaction.payment_status
-        }
-        transactions_info.append(transaction_info)
-
-    return transactions_info
+    return TRANSACTION_PLAN.rows(db.session.execute(filter_customer_transactions(customer_id, filters)))
+
 
+def fetch_customer_transactions_page(customer_id, limit, cursor=None, filters=None):
+    """
+    Fetches one page of a customer's transactions, newest order_date first.
+
+    Pages are keyset-paginated on (order_date, id) so every page costs the same
+    regardless of how deep into the history the client has scrolled.
+    Transactions without an order_date come last.
+
+    Args:
+        customer_id (int): The ID of the customer.
+        limit (int): The maximum number of transactions on the page.
+        cursor (str, optional): The next_cursor returned with the previous page.
+        filters (dict, optional): Narrows the result, see filter_customer_transactions.
+
+    Returns:
+        dict: {'transactions': list of dict, 'next_cursor': str or None, 'ledger_version': int}.
+              next_cursor is None on the last page.
+
+    Raises:
+        ValueError: If the cursor or a date filter is malformed.
+    """
+    rows = db.session.execute(customer_transactions_page_query(customer_id, limit, cursor, filters)).all()
+    return customer_transactions_page(rows, limit, ledger.fetch_ledger_version(customer_id))
+
+
+def customer_transactions_page_query(customer_id, limit, cursor=None, filters=None):
+    """ returns the SELECT of one page of fetch_customer_transactions_page, plus one row to spot a next page """
+    statement = filter_customer_transactions(customer_id, filters)
+
+    if cursor:
+        order_date, last_id = myfunc.decode_cursor(cursor)
+        if order_date is None:
+            statement = statement.where(Transaction.order_date.is_(None), Transaction.id < last_id)
+        else:
+            order_date = datetime.fromisoformat(order_date)
+            statement = statement.where(or_(Transaction.order_date < order_date,
+                                            and_(Transaction.order_date == order_date, Transaction.id < last_id),
+                                            Transaction.order_date.is_(None)))
+
+    # fetch one extra row to find out whether another page follows
+    return statement.order_by(Transaction.order_date.desc(), Transaction.id.desc()).limit(limit + 1)
+
+
+def customer_transactions_page(rows, limit, ledger_version) -> dict:
+    """ builds the page returned by fetch_customer_transactions_page from the rows of its query """
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = myfunc.encode_cursor(last.order_date, last.id)
+
+    return {'transactions': TRANSACTION_PLAN.rows(rows),
+            'next_cursor': next_cursor,
+            'ledger_version': ledger_version}
+
+
+def serialize_waitlist_entry(entry) -> dict:
+    """
+    Converts a WaitList instance into the dictionary returned to clients.
+
+    Args:
+        entry (WaitList): The waitlist entry to convert.
+
+    Returns:
+        dict: The waitlist entry information.
+    """
+    return WAITLIST_PLAN.from_object(entry)
+
+
+def fetch_waitlist():
+    """
+    Fetches every waitlist entry in signup order.
+
+    Returns:
+        list of dict: The waitlist entries.
+    """
+    return WAITLIST_PLAN.rows(db.session.execute(WAITLIST_PLAN.select().order_by(WaitList.wid)))
+
+
+def fetch_waitlist_page(limit, cursor=None):
+    """
+    Fetches one page of waitlist entries in signup order, keyset-paginated on wid.
+
+    Args:
+        limit (int): The maximum number of entries on the page.
+        cursor (str, optional): The next_cursor returned with the previous page.
+
+    Returns:
+        dict: {'waitlist': list of dict, 'next_cursor': str or None}.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    return waitlist_page(db.session.execute(waitlist_page_query(limit, cursor)).all(), limit)
+
+
+def waitlist_page_query(limit, cursor=None):
+    """ returns the SELECT of one page of fetch_waitlist_page, plus one row to spot a next page """
+    statement = WAITLIST_PLAN.select()
+    if cursor:
+        last_wid, = myfunc.decode_cursor(cursor)
+        statement = statement.where(WaitList.wid > int(last_wid))
+    return statement.order_by(WaitList.wid).limit(limit + 1)
+
+
+def waitlist_page(rows, limit) -> dict:
+    """ builds the page returned by fetch_waitlist_page from the rows of its query """
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = myfunc.encode_cursor(rows[-1].wid)
+
+    return {'waitlist': WAITLIST_PLAN.rows(rows), 'next_cursor': next_cursor}
+
+
+def stream_waitlist(batch_size=500):
+    """
+    Yields every waitlist entry as one line of NDJSON, in signup order.
+
+    Rows are read through a server-side cursor batch_size at a time, so memory use
+    does not grow with the size of the waitlist.
+
+    Args:
+        batch_size (int): The number of rows fetched from the database at a time.
+
+    Yields:
+        str: A JSON document followed by a newline.
+    """
+    result = db.session.execute(WAITLIST_PLAN.select().order_by(WaitList.wid).execution_options(yield_per=batch_size))
+    for row in result:
+        yield dumps(WAITLIST_PLAN.one(row)) + '\n'
@@ -0,0 +1,114 @@
+""" this module searches a business' customers through an SQLite FTS5 index
+
+    customer_search is an external-content FTS5 table over the name, email, phone and
+    address columns of customer, so it stores only the index and reads nothing else.
+    Triggers keep it in sync with every insert, delete and update of those columns
+    (ledger_version bumps do not touch it). user_id is indexed as well, and every
+    query ANDs the business' user_id token with the words typed, so FTS5 itself drops
+    other businesses' customers before they are ranked or joined. The prefix indexes on 2 and 3 characters keep
+    type-ahead queries like 'ad' cheap, and detail=column leaves out the token
+    positions, which only phrase and NEAR queries need.
+
+    The table and triggers are created with the customer table (create_all) and by
+    migration 5a7e2c91d4b3. A batch migration that rebuilds the customer table drops its
+    triggers: run `flask rebuild-customer-search` afterwards.
+"""
+import re
+from sqlalchemy import DDL, column, event, func, select, table, text
+from myapp import db
+from myapp.models import Customer
+from myapp.functions import shards
+from myapp.functions.serializers import CUSTOMER_PLAN
+
+SEARCH_TABLE = 'customer_search'
+SEARCH_COLUMNS = ('first_name', 'last_name', 'email', 'phone_number', 'shipping_address')
+# relevance weights of user_id and SEARCH_COLUMNS in bm25(); user_id matches every row, so it counts for nothing
+WEIGHTS = (0.0, 10.0, 10.0, 5.0, 5.0, 1.0)
+
+_indexed = ', '.join(('user_id',) + SEARCH_COLUMNS)
+_new = ', '.join('new.' + name for name in ('id', 'user_id') + SEARCH_COLUMNS)
+_old = ', '.join('old.' + name for name in ('id', 'user_id') + SEARCH_COLUMNS)
+
+SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS customer_search USING fts5({}, content='customer', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3', detail=column)".format(_indexed),
+    "CREATE TRIGGER IF NOT EXISTS customer_search_insert AFTER INSERT ON customer BEGIN "
+    "INSERT INTO customer_search(rowid, {0}) VALUES ({1}); END".format(_indexed, _new),
+    "CREATE TRIGGER IF NOT EXISTS customer_search_delete AFTER DELETE ON customer BEGIN "
+    "INSERT INTO customer_search(customer_search, rowid, {0}) VALUES ('delete', {1}); END".format(_indexed, _old),
+    "CREATE TRIGGER IF NOT EXISTS customer_search_update AFTER UPDATE OF {0} ON customer BEGIN "
+    "INSERT INTO customer_search(customer_search, rowid, {0}) VALUES ('delete', {1}); "
+    "INSERT INTO customer_search(rowid, {0}) VALUES ({2}); END".format(_indexed, _old, _new),
+]
+
+for _statement in SEARCH_DDL:
+    event.listen(Customer.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+# the index would otherwise outlive the table it indexes, e.g. between tests
+event.listen(Customer.__table__, 'before_drop',
+             DDL('DROP TABLE IF EXISTS customer_search').execute_if(dialect='sqlite'))
+
+_search = table(SEARCH_TABLE, column('rowid'), column(SEARCH_TABLE))
+# letters and digits, as the unicode61 tokenizer splits them: a query word must not become a phrase
+_TOKEN = re.compile(r'[^\W_]+')
+
+
+def match_expression(user_id: int, query: str) -> str:
+    """
+    Turns what a user typed into an FTS5 query for the customers of one business.
+    Every word is matched as a prefix, so 'ada lag' finds Ada from Lagos.
+
+    Returns:
+        str: The MATCH expression, or None if the query has no words.
+    """
+    words = _TOKEN.findall(query or '')
+    if not words:
+        return None
+    terms = ' '.join('"{}"*'.format(word) for word in words)
+    return 'user_id:"{}" AND {{{}}}: ({})'.format(int(user_id), ' '.join(SEARCH_COLUMNS), terms)
+
+
+def search_customers(user_id: int, query: str, limit: int) -> list:
+    """
+    Finds the customers of a business whose name, email, phone number or address match query.
+
+    Args:
+        user_id (int): The business whose customers are searched.
+        query (str): What the user typed.
+        limit (int): The most customers returned.
+
+    Returns:
+        list: Customers as returned by FETCH-CUSTOMERS, best matches first.
+    """
+    statement = search_query(user_id, query, limit)
+    if statement is None:
+        return []
+    return CUSTOMER_PLAN.rows(db.session.execute(statement))
+
+
+def search_query(user_id: int, query: str, limit: int):
+    """ returns the SELECT behind search_customers, or None if the query has no words """
+    match = match_expression(user_id, query)
+    if match is None:
+        return None
+
+    rank = func.bm25(_search.c[SEARCH_TABLE], *WEIGHTS)
+    return (select(*CUSTOMER_PLAN.columns)
+            .join(_search, _search.c.rowid == Customer.id)
+            .where(_search.c[SEARCH_TABLE].op('MATCH')(match), Customer.user_id == user_id)
+            .order_by(rank, Customer.id)
+            .limit(limit))
+
+
+def rebuild_index() -> int:
+    """ (re)creates the index and its triggers and reindexes every customer. returns the number indexed """
+    indexed = 0
+    for _ in shards.each_business():
+        # text() names no table, so say which database (or shard) it is for
+        bind_arguments = {'mapper': Customer}
+        for statement in SEARCH_DDL:
+            db.session.execute(text(statement), bind_arguments=bind_arguments)
+        db.session.execute(text("INSERT INTO customer_search(customer_search) VALUES ('rebuild')"),
+                           bind_arguments=bind_arguments)
+        db.session.commit()
+        indexed += db.session.query(func.count(Customer.id)).scalar()
+    return indexed
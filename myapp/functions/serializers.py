@@ -0,0 +1,172 @@
+""" this module turns database rows into the JSON returned to clients
+
+    A FieldPlan is compiled once per model: the output keys, the columns to select
+    and the converters for the few values JSON cannot hold (datetimes). Resource
+    functions select plan.columns and hand the result tuples straight to the plan,
+    so no ORM objects are built for read-only responses. dumps() uses orjson when it
+    is installed and falls back to the standard json module.
+"""
+import json
+from sqlalchemy import select
+from myapp.models import User, Customer, Transaction, WaitList
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+
+def dumps(obj) -> str:
+    """ encodes obj as JSON text with the fastest available backend """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj)
+
+
+def datetime_text(value):
+    """ formats a datetime as 'YYYY-MM-DD HH:MM:SS', passing None through """
+    return value.isoformat(' ', 'seconds') if value is not None else None
+
+
+def datetime_text_or_blank(value):
+    """ formats a datetime as 'YYYY-MM-DD HH:MM:SS', or '' for None """
+    return value.isoformat(' ', 'seconds') if value is not None else ''
+
+
+class FieldPlan:
+    """
+    Compiled description of how a model is serialised.
+
+    Attributes:
+        keys (tuple): The output keys, in select order.
+        columns (tuple): The columns to select, one per key.
+    """
+
+    def __init__(self, *fields):
+        """
+        Args:
+            fields: (key, column) or (key, column, converter) tuples. Converters receive
+                    the raw column value (which may be None) and return the output value.
+        """
+        self.keys = tuple(field[0] for field in fields)
+        self.columns = tuple(field[1] for field in fields)
+        self._converters = tuple((index, field[2]) for index, field in enumerate(fields) if len(field) > 2)
+        self._attributes = tuple(column.key for column in self.columns)
+
+    def select(self):
+        """ returns a SELECT of the plan's columns, ready for .where()/.order_by() """
+        return select(*self.columns)
+
+    def index(self, key: str) -> int:
+        """ returns the position of key in the selected row tuples """
+        return self.keys.index(key)
+
+    def values(self, row) -> list:
+        """ returns the converted values of one row tuple, in key order """
+        values = list(row)
+        for index, converter in self._converters:
+            values[index] = converter(values[index])
+        return values
+
+    def one(self, row) -> dict:
+        """ serialises one row tuple """
+        return dict(zip(self.keys, self.values(row)))
+
+    def rows(self, rows) -> list:
+        """ serialises an iterable of row tuples """
+        keys = self.keys
+        if not self._converters:
+            return [dict(zip(keys, row)) for row in rows]
+        return [dict(zip(keys, self.values(row))) for row in rows]
+
+    def from_object(self, obj) -> dict:
+        """ serialises a loaded ORM instance, for responses that already hold one """
+        return self.one([getattr(obj, attribute) for attribute in self._attributes])
+
+
+USER_PLAN = FieldPlan(
+    ('user_id', User.id),
+    ('first_name', User.first_name),
+    ('last_name', User.last_name),
+    ('phone', User.phone_number),
+    ('email', User.email),
+    ('business_name', User.business_name),
+    ('business_phone', User.business_phone),
+    ('business_email', User.business_email),
+    ('blocked_status', User.block_stat),
+    ('activated', User.activated),
+    ('business_type', User.business_type),
+    ('logo', User.business_logo_link),
+    ('admin_type', User.admin_type),
+    ('business_id', User.business_id),
+)
+
+CUSTOMER_PLAN = FieldPlan(
+    ('id', Customer.id),
+    ('first_name', Customer.first_name),
+    ('last_name', Customer.last_name),
+    ('email', Customer.email),
+    ('phone_number', Customer.phone_number),
+    ('shipping_address', Customer.shipping_address),
+    ('user_id', Customer.user_id),
+    ('ledger_version', Customer.ledger_version),
+)
+
+TRANSACTION_PLAN = FieldPlan(
+    ('transaction_id', Transaction.id),
+    ('customer_id', Transaction.customer_id),
+    ('order_id', Transaction.order_id),
+    ('product_name', Transaction.product_name),
+    ('product_description', Transaction.product_description),
+    ('order_date', Transaction.order_date, datetime_text),
+    ('delivery_address', Transaction.delivery_address),
+    ('delivery_date', Transaction.delivery_date, datetime_text),
+    ('rate', Transaction.rate),
+    ('quantity', Transaction.number_of_items),
+    ('discount_applied', Transaction.discount_applied),
+    ('total_price', Transaction.total_price),
+    ('delivery_fee', Transaction.delivery_fee),
+    ('invoice_link', Transaction.invoice_link),
+    ('receipt_link', Transaction.receipt_link),
+    ('amount_paid', Transaction.amount_paid),
+    ('remaining_balance', Transaction.remaining_balance),
+    ('due_date', Transaction.due_date, datetime_text),
+    ('payment_status', Transaction.payment_status),
+)
+
+WAITLIST_PLAN = FieldPlan(
+    ('wid', WaitList.wid),
+    ('name', WaitList.name),
+    ('email', WaitList.email),
+    ('phone', WaitList.phone),
+    ('business_type', WaitList.business_type),
+    ('reason', WaitList.reason),
+    ('registered_at', WaitList.reg_date, datetime_text_or_blank),
+)
+
+EXPORT_PLAN = FieldPlan(
+    ('customer_id', Customer.id),
+    ('customer_first_name', Customer.first_name),
+    ('customer_last_name', Customer.last_name),
+    ('customer_email', Customer.email),
+    ('customer_phone_number', Customer.phone_number),
+    ('transaction_id', Transaction.id),
+    ('order_id', Transaction.order_id),
+    ('product_name', Transaction.product_name),
+    ('product_description', Transaction.product_description),
+    ('order_date', Transaction.order_date, datetime_text),
+    ('delivery_address', Transaction.delivery_address),
+    ('delivery_date', Transaction.delivery_date, datetime_text),
+    ('rate', Transaction.rate),
+    ('quantity', Transaction.number_of_items),
+    ('discount_applied', Transaction.discount_applied),
+    ('total_price', Transaction.total_price),
+    ('delivery_fee', Transaction.delivery_fee),
+    ('amount_payable', Transaction.amount_payable),
+    ('amount_paid', Transaction.amount_paid),
+    ('remaining_balance', Transaction.remaining_balance),
+    ('due_date', Transaction.due_date, datetime_text),
+    ('payment_status', Transaction.payment_status),
+    ('invoice_link', Transaction.invoice_link),
+    ('receipt_link', Transaction.receipt_link),
+)
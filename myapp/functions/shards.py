@@ -0,0 +1,221 @@
+""" this module optionally places each business' customers and transactions in its own SQLite file
+
+    With SHARDING_ENABLED, the tables in SHARDED_TABLES live in one database per
+    business (SHARD_DIR/business_<user_id>.db) and everything else stays in the main
+    database. ShardedSession.get_bind sends statements on a sharded table to the shard
+    of the current business: the one selected with use_business, else the identity of
+    the request's JWT. A business' writes then only take its own file's write lock.
+
+    Shard engines are opened on first use and kept in a process-wide registry. The
+    least recently used ones are closed when more than SHARD_MAX_OPEN are open, and any
+    left unused for SHARD_IDLE_SECONDS, so a worker keeps a bounded number of files open.
+    A new shard file gets its tables (and the customer search index) on first open;
+    migrations only ever run against the main database.
+
+    Customer and transaction ids are drawn from id sequences in the main database
+    while sharding is on, so an id still names one row across all shards, and
+    document jobs, receipts and socket rooms can keep referring to rows by id alone.
+    Jobs that work across businesses loop over each_business. A ledger write updates
+    the shard and the user's summary in the main database in two commits: after a
+    crash between them, `flask rebuild-balances` puts the summaries right.
+"""
+import contextvars
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import sqlalchemy as sa
+from flask import current_app, has_request_context
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+
+SHARDED_TABLES = frozenset(('customer', 'transaction', 'customer_balance', 'sweep_mark'))
+SHARD_FILE = re.compile(r'business_(\d+)\.db\Z')
+
+
+class ShardRegistry:
+    """
+    The open shard engines of this process, least recently used first.
+
+    Attributes:
+        directory (str): Where the shard files live.
+        max_open (int): The most engines kept open at once.
+        idle_seconds (float): Engines unused for this long are closed.
+    """
+
+    def __init__(self, directory: str, max_open: int, idle_seconds: float, engine_options: dict = None):
+        self.directory = directory
+        self.max_open = max_open
+        self.idle_seconds = idle_seconds
+        self.engine_options = engine_options or {}
+        self._engines = OrderedDict()  # user_id -> [engine, last used]
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.closed = 0
+
+    def path(self, user_id: int) -> str:
+        return os.path.join(self.directory, 'business_{}.db'.format(int(user_id)))
+
+    def businesses(self) -> list:
+        """ returns the ids of the businesses that have a shard file, in order """
+        if not os.path.isdir(self.directory):
+            return []
+        matches = (SHARD_FILE.match(name) for name in os.listdir(self.directory))
+        return sorted(int(match.group(1)) for match in matches if match)
+
+    def engine(self, user_id: int, metadata: sa.MetaData) -> sa.engine.Engine:
+        """ returns the engine of a business' shard, opening (and if need be creating) it """
+        user_id = int(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._engines.get(user_id)
+            if entry is None:
+                entry = self._engines[user_id] = [self._open(user_id, metadata), now]
+                self.opened += 1
+            else:
+                entry[1] = now
+                self._engines.move_to_end(user_id)
+            self._evict(now)
+            return entry[0]
+
+    def _open(self, user_id, metadata):
+        os.makedirs(self.directory, exist_ok=True)
+        engine = sa.create_engine('sqlite:///{}'.format(self.path(user_id)), **self.engine_options)
+        with engine.connect() as connection:
+            # another worker may be creating the same shard: take the write lock before looking
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+            metadata.create_all(connection, tables=[metadata.tables[name] for name in sorted(SHARDED_TABLES)])
+            connection.commit()
+        return engine
+
+    def _evict(self, now):
+        """ closes the least recently used engines over max_open, and the idle ones """
+        while self._engines:
+            user_id, (engine, last_used) = next(iter(self._engines.items()))
+            if len(self._engines) <= self.max_open and now - last_used < self.idle_seconds:
+                return
+            del self._engines[user_id]
+            # connections still checked out by a request are closed when it returns them
+            engine.dispose()
+            self.closed += 1
+
+    def close_idle(self):
+        """ closes the engines left unused for idle_seconds. they are also closed on the next engine() call """
+        with self._lock:
+            self._evict(time.monotonic())
+
+    def close_all(self):
+        with self._lock:
+            for engine, _ in self._engines.values():
+                engine.dispose()
+            self.closed += len(self._engines)
+            self._engines.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'open': len(self._engines), 'opened': self.opened, 'closed': self.closed}
+
+
+_registry = None
+_business = contextvars.ContextVar('fundsflow_business', default=None)
+
+
+def get_registry() -> ShardRegistry:
+    """ returns the shard registry, or None if sharding is off """
+    return _registry
+
+
+def enabled() -> bool:
+    return _registry is not None
+
+
+@contextmanager
+def use_business(user_id: int):
+    """ sends statements on sharded tables inside the block to the shard of user_id """
+    token = _business.set(int(user_id))
+    try:
+        yield
+    finally:
+        _business.reset(token)
+
+
+def current_business() -> int:
+    """ returns the business selected with use_business, else the user of the request's JWT, else None """
+    user_id = _business.get()
+    if user_id is None and has_request_context():
+        try:
+            user_id = get_jwt_identity()
+        except RuntimeError:
+            # no JWT has been verified in this request
+            return None
+    return int(user_id) if user_id is not None else None
+
+
+def each_business():
+    """
+    Yields the id of every business with a shard, selecting its shard for the body of
+    the loop. Without sharding it yields None once and everything stays in one database.
+    Commit, or at least flush, before moving on to the next business.
+    """
+    if _registry is None:
+        yield None
+        return
+    for user_id in _registry.businesses():
+        with use_business(user_id):
+            yield user_id
+
+
+def _sharded_table(mapper, clause):
+    if mapper is not None:
+        table = sa.inspect(mapper).local_table
+    elif isinstance(clause, sa.Table):
+        table = clause
+    elif isinstance(clause, sa.sql.dml.UpdateBase) and isinstance(clause.table, sa.Table):
+        table = clause.table
+    else:
+        return None
+    return table if table.name in SHARDED_TABLES else None
+
+
+class ShardedSession(Session):
+    """
+    A Flask-SQLAlchemy session that sends statements on SHARDED_TABLES to the shard of
+    the current business when sharding is on. Core statements on a sharded table must
+    name it (or pass bind_arguments={'mapper': ...}) to be routed.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _registry is not None:
+            table = _sharded_table(mapper, clause)
+            if table is not None:
+                user_id = current_business()
+                if user_id is None:
+                    raise RuntimeError('No business selected for table {}: wrap the code in '
+                                       'shards.use_business() or loop over shards.each_business()'.format(table.name))
+                return _registry.engine(user_id, table.metadata)
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def next_id(table_name: str) -> int:
+    """ returns a row id unique across every shard of table_name, drawn from the main database """
+    from myapp.functions import id_allocator
+    block_size = current_app.config['SHARD_ID_BLOCK_SIZE']
+    return id_allocator.get_allocator('{}_id'.format(table_name), block_size).allocate()
+
+
+def _assign_id(_mapper, _connection, target):
+    if _registry is not None and target.id is None:
+        target.id = next_id(target.__tablename__)
+
+
+def init_app(app):
+    """ opens the shard registry if SHARDING_ENABLED and registers the id hooks. call it once db exists """
+    global _registry
+    from myapp.models import Customer, Transaction
+    for model in (Customer, Transaction):
+        sa.event.listen(model, 'before_insert', _assign_id)
+    if app.config['SHARDING_ENABLED']:
+        _registry = ShardRegistry(app.config['SHARD_DIR'], app.config['SHARD_MAX_OPEN'],
+                                  app.config['SHARD_IDLE_SECONDS'], app.config['SHARD_ENGINE_OPTIONS'])
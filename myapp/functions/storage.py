@@ -0,0 +1,32 @@
+""" this module applies the SQLite storage profile to every new database connection
+
+    The profile (SQLITE_PRAGMAS in config.py) switches SQLite to write-ahead logging so
+    readers no longer block the writer, waits busy_timeout ms for a lock instead of
+    failing with 'database is locked', and sizes the page cache, mmap window and
+    temp storage for a server workload.
+"""
+import sqlite3
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def apply_pragmas(dbapi_connection, pragmas: dict):
+    """ runs PRAGMA name = value on a sqlite3 connection for every item of pragmas """
+    # busy_timeout goes first so switching the journal mode waits for other connections
+    ordered = sorted(pragmas.items(), key=lambda item: item[0] != 'busy_timeout')
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in ordered:
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+    finally:
+        cursor.close()
+
+
+def init_app(app):
+    """ registers the connect hook that applies app.config['SQLITE_PRAGMAS'] to new sqlite connections """
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+
+    @event.listens_for(Engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, _connection_record):
+        if pragmas and isinstance(dbapi_connection, sqlite3.Connection):
+            apply_pragmas(dbapi_connection, pragmas)
@@ -0,0 +1,87 @@
+""" this module caches the user looked up for every authenticated request
+
+    Each process keeps small read-only snapshots of recently seen users so that
+    @jwt_required routes can fill in current_user without a database round trip.
+    Writes to a user in this process drop its snapshot straight away; other
+    processes notice the change at the latest after USER_CACHE_TTL_SECONDS.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event
+from myapp.models import User
+from myapp.functions.cache import LRUCache
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """
+    Read-only copy of the User columns request handlers need.
+    """
+    id: int
+    email: str
+    first_name: str
+    last_name: str
+    business_id: str
+    business_name: str
+    admin_type: str
+    activated: int
+    block_stat: int
+    last_login: datetime
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(id=user.id, email=user.email, first_name=user.first_name, last_name=user.last_name,
+                   business_id=user.business_id, business_name=user.business_name, admin_type=user.admin_type,
+                   activated=user.activated, block_stat=user.block_stat, last_login=user.last_login)
+
+
+_cache = None
+
+
+def get_cache() -> LRUCache:
+    """ returns the process-wide snapshot cache, creating it from the app config on first use """
+    global _cache
+    if _cache is None:
+        _cache = LRUCache(current_app.config['USER_CACHE_SIZE'], current_app.config['USER_CACHE_TTL_SECONDS'])
+    return _cache
+
+
+def lookup_user(identity):
+    """
+    Returns the snapshot of the user with the given JWT identity.
+
+    Args:
+        identity (str or int): The user ID stored in the token.
+
+    Returns:
+        UserSnapshot: The user, or None if no such user exists.
+    """
+    cache = get_cache()
+    user_id = int(identity)
+    snapshot = cache.get(user_id)
+    if snapshot is None:
+        user = User.query.filter_by(id=user_id).one_or_none()
+        if user is None:
+            return None
+        snapshot = UserSnapshot.from_user(user)
+        cache.set(user_id, snapshot)
+    return snapshot
+
+
+def invalidate_user(user_id):
+    """ drops the cached snapshot of a user after it has been modified """
+    if _cache is not None and user_id is not None:
+        _cache.pop(int(user_id))
+
+
+def stats() -> dict:
+    """ returns the hit/miss counters of the cache """
+    return get_cache().stats()
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(_mapper, _connection, target):
+    # covers changes made through the ORM, e.g. blocking or activating an account
+    invalidate_user(target.id)
@@ -3,10 +3,9 @@ SQLAlchemy models for the database.
 """
 from . import db
 from flask_jwt_extended import create_access_token, create_refresh_token
-import json
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.mysql import ENUM
-from werkzeug.security import generate_password_hash
+from myapp.functions import passwords
 
 
 class User(db.Model):
@@ -23,6 +22,7 @@ class User(db.Model):
         business_address (str): The address of the user's business.
         business_logo_link (str): The link to the business logo.
         business_id (str): The ID for business identification.
+        ledger_version (int): Incremented whenever the user's customers or any of their ledgers change.
     """
 
     id = db.Column(db.Integer, primary_key=True)
@@ -46,6 +46,7 @@ class User(db.Model):
     activated = db.Column(db.Integer, default=1)  # default to 0 if using email validation
     activatecode = db.Column(db.String(255), nullable=True)
     last_activation_code_time = db.Column(db.DateTime(), nullable=True)
+    ledger_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     customers = db.relationship('Customer', backref='user', lazy=True)
 
     def __repr__(self):
@@ -83,7 +84,7 @@ class User(db.Model):
             return False, 'User with this username already exists'
 
         new_user = cls(email=new_user_info['email'],
-                       password=generate_password_hash(new_user_info['password']))
+                       password=passwords.hash_password(new_user_info['password']))
         db.session.add(new_user)
         db.session.commit()
         return True, 'User added successfully'
@@ -100,6 +101,7 @@ class Customer(db.Model):
         email (str): The email address of the customer.
         phone_number (str): The phone number of the customer.
         shipping_address (str): The shipping address of the customer.
+        ledger_version (int): Incremented on every write to the customer's transactions.
     """
 
     id = db.Column(db.Integer, primary_key=True)
@@ -108,7 +110,8 @@ class Customer(db.Model):
     email = db.Column(db.String(100), unique=False, nullable=True)
     phone_number = db.Column(db.String(15), nullable=False)
     shipping_address = db.Column(db.String(200), nullable=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    ledger_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     transactions = db.relationship('Transaction', backref='customer', lazy=True)
 
     def __repr__(self):
@@ -122,6 +125,13 @@ class Transaction(db.Model):
     """
     Represents a transaction instance for a given customer.
     """
+    __table_args__ = (
+        # a customer's ledger, paged newest order_date first
+        db.Index('ix_transaction_customer_order_date', 'customer_id', 'order_date', 'id'),
+        # due and overdue invoices across all customers
+        db.Index('ix_transaction_due_date_status', 'due_date', 'payment_status'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
     order_id = db.Column(db.String(50), nullable=True)
@@ -141,7 +151,7 @@ class Transaction(db.Model):
     amount_paid = db.Column(db.Float, default=0)
     remaining_balance = db.Column(db.Float, nullable=True)
     due_date = db.Column(db.DateTime)
-    payment_status = db.Column(db.String(20), nullable=False)  # full,part,none
+    payment_status = db.Column(db.String(20), nullable=False)  # paid, pending or overdue
 
     def __repr__(self):
         """
@@ -150,6 +160,212 @@ class Transaction(db.Model):
         return f"Transaction('{self.order_id}', '{self.product_name}', '{self.order_date}')"
 
 
+class BalanceSummary:
+    """
+    Columns shared by the running balance tables.
+
+    Attributes:
+        total_payable (float): Sum of amount_payable over the transactions.
+        total_paid (float): Sum of amount_paid over the transactions.
+        outstanding (float): Sum of remaining_balance over the transactions.
+        transaction_count (int): Number of transactions.
+        paid_count (int): Number of transactions with payment_status 'paid'.
+        pending_count (int): Number of transactions with payment_status 'pending'.
+        overdue_count (int): Number of transactions with payment_status 'overdue'.
+    """
+    total_payable = db.Column(db.Float, nullable=False, default=0)
+    total_paid = db.Column(db.Float, nullable=False, default=0)
+    outstanding = db.Column(db.Float, nullable=False, default=0)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    paid_count = db.Column(db.Integer, nullable=False, default=0)
+    pending_count = db.Column(db.Integer, nullable=False, default=0)
+    overdue_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        """
+        Returns the summary figures as a dictionary.
+        """
+        return {'total_payable': self.total_payable, 'total_paid': self.total_paid,
+                'outstanding': self.outstanding, 'transaction_count': self.transaction_count,
+                'paid_count': self.paid_count, 'pending_count': self.pending_count,
+                'overdue_count': self.overdue_count}
+
+
+class CustomerBalance(BalanceSummary, db.Model):
+    """
+    Running totals of one customer's transactions, kept in step by every transaction write.
+    """
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+
+    def __repr__(self):
+        """
+        Returns a printable representation of the CustomerBalance object.
+        """
+        return f"CustomerBalance('{self.customer_id}', '{self.outstanding}')"
+
+
+class UserBalance(BalanceSummary, db.Model):
+    """
+    Running totals of the transactions of all of a user's customers.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+
+    def __repr__(self):
+        """
+        Returns a printable representation of the UserBalance object.
+        """
+        return f"UserBalance('{self.user_id}', '{self.outstanding}')"
+
+
+class AgingRollup(db.Model):
+    """
+    Represents a user's receivables aging buckets as of one day.
+
+    Attributes:
+        user_id (int): The user the report belongs to.
+        as_of (date): The day the buckets were computed for.
+        current (float): Outstanding balance not yet past its due date (or without one).
+        days_1_30 (float): Outstanding balance 1 to 30 days past due.
+        days_31_60 (float): Outstanding balance 31 to 60 days past due.
+        days_61_90 (float): Outstanding balance 61 to 90 days past due.
+        days_over_90 (float): Outstanding balance more than 90 days past due.
+        computed_at (datetime): When the row was computed.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    as_of = db.Column(db.Date, primary_key=True)
+    current = db.Column(db.Float, nullable=False, default=0)
+    days_1_30 = db.Column(db.Float, nullable=False, default=0)
+    days_31_60 = db.Column(db.Float, nullable=False, default=0)
+    days_61_90 = db.Column(db.Float, nullable=False, default=0)
+    days_over_90 = db.Column(db.Float, nullable=False, default=0)
+    computed_at = db.Column(db.DateTime, default=func.now())
+
+    def __repr__(self):
+        """
+        Returns a printable representation of the AgingRollup object.
+        """
+        return f"AgingRollup('{self.user_id}', '{self.as_of}')"
+
+
+class IdSequence(db.Model):
+    """
+    Represents a named counter that hands out unique numbers in blocks.
+
+    Attributes:
+        name (str): The name of the sequence, e.g. 'business_id'.
+        next_value (int): The first number not yet reserved by any process.
+    """
+    name = db.Column(db.String(50), primary_key=True)
+    next_value = db.Column(db.Integer, nullable=False, default=1)
+
+    def __repr__(self):
+        """
+        Returns a printable representation of the IdSequence object.
+        """
+        return f"IdSequence('{self.name}', '{self.next_value}')"
+
+
+class SweepMark(db.Model):
+    """
+    Represents how far an incremental background job has worked through the rows it sweeps.
+
+    Attributes:
+        name (str): The name of the job, e.g. 'overdue'.
+        high_water (datetime): Every row up to this point has been swept.
+        updated (datetime): When the mark last moved.
+    """
+    name = db.Column(db.String(50), primary_key=True)
+    high_water = db.Column(db.DateTime, nullable=True)
+    updated = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        """
+        Returns a printable representation of the SweepMark object.
+        """
+        return f"SweepMark('{self.name}', '{self.high_water}')"
+
+
+class DocumentJob(db.Model):
+    """
+    Represents a request to render an invoice or receipt, queued for the document workers.
+
+    Attributes:
+        id (int): The unique identifier for the job, returned to the client straight away.
+        transaction_id (int): The transaction the document is rendered from.
+        user_id (int): The user who requested the document.
+        kind (str): 'invoice' or 'receipt'.
+        file_format (str): 'html' or 'pdf'.
+        content_hash (str): SHA-256 of everything printed on the document. Jobs with the
+                            same hash share one rendered file.
+        link (str): Where the rendered document is served from.
+        status (str): 'queued', 'done' or 'failed'.
+        error (str): Why rendering failed.
+        created (datetime): When the job was queued.
+        finished (datetime): When the job completed or failed.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(10), nullable=False)
+    file_format = db.Column(db.String(10), nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False, index=True)
+    link = db.Column(db.String(200), nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='queued', index=True)
+    error = db.Column(db.Text, nullable=True)
+    created = db.Column(db.DateTime, default=func.now())
+    finished = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        """
+        Returns a printable representation of the DocumentJob object.
+        """
+        return f"DocumentJob('{self.id}', '{self.kind}', '{self.status}')"
+
+
+class ReceiptOutbox(db.Model):
+    """
+    Represents a receipt email waiting to be sent, written in the same commit as the payment.
+
+    Attributes:
+        id (int): The unique identifier for the message.
+        transaction_id (int): The transaction that was paid.
+        user_id (int): The business the receipt is sent on behalf of.
+        recipient (str): The customer's email address.
+        subject (str): The subject line.
+        body (str): The plain text message.
+        status (str): 'pending', 'sent' or 'failed' (given up after OUTBOX_MAX_ATTEMPTS).
+        attempts (int): How many delivery attempts failed so far.
+        next_attempt_at (datetime): When the sender may pick the message up next (UTC).
+        last_error (str): Why the latest attempt failed.
+        created (datetime): When the message was written.
+        sent_at (datetime): When the SMTP server accepted the message (UTC).
+    """
+    __table_args__ = (
+        # the sender's batch query: due pending messages, oldest first
+        db.Index('ix_receipt_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id', ondelete='SET NULL'), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    recipient = db.Column(db.String(100), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=func.now())
+    last_error = db.Column(db.Text, nullable=True)
+    created = db.Column(db.DateTime, default=func.now())
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        """
+        Returns a printable representation of the ReceiptOutbox object.
+        """
+        return f"ReceiptOutbox('{self.id}', '{self.recipient}', '{self.status}')"
+
+
 class Settings(db.Model):
     """
     Represents user account preferences in the database.
@@ -161,7 +377,7 @@ class Settings(db.Model):
     """
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     template_mode = db.Column(db.String(10), nullable=True)
 
     def __repr__(self):
@@ -171,58 +387,73 @@ class Settings(db.Model):
         return f"Settings('{self.user_id}', '{self.template_mode}')"
 
 
-class RevokedTokens(db.Model):
+class RevokedToken(db.Model):
     """
-    Model to manage revoked tokens for users.
+    Represents a revoked JWT, one row per token.
+
+    Attributes:
+        id (int): The unique identifier for the row. Ids are never reused so
+                  readers can pick up new revocations by id.
+        jti (str): The unique identifier of the revoked token.
+        user_id (int): The ID of the user the token was issued to.
+        expires (datetime): When the token expires (UTC). Rows past this point can be purged.
     """
+    __table_args__ = {'sqlite_autoincrement': True}
+
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer)
-    token_list = db.Column(db.String(500), default=json.dumps([]))  # Assuming max length for token list
+    jti = db.Column(db.String(36), unique=True, index=True, nullable=False)
+    user_id = db.Column(db.Integer, nullable=True)
+    expires = db.Column(db.DateTime, nullable=False, index=True)
 
-    def __init__(self, user_id):
+    def __repr__(self):
         """
-        Initializes a RevokedTokenModel instance.
-
-        Args:
-        - user_id: ID of the user associated with the tokens
-        - token_list: List of revoked tokens (JSON-formatted string)
+        Returns a printable representation of the RevokedToken object.
         """
-        self.user_id = user_id
+        return f"RevokedToken('{self.jti}', '{self.user_id}', '{self.expires}')"
 
     @classmethod
-    def add_revoked_token(cls, token):
+    def add_revoked_token(cls, jti, user_id, expires):
         """
-        Adds a revoked token for a user to the database.
+        Adds a revoked token to the database.
 
         Args:
+        - jti: Unique identifier of the token
         - user_id: ID of the user associated with the token
-        - token: Token string to be added to the revoked list
+        - expires: Expiry datetime (UTC) of the token
         """
-        revoked_token = cls.query.filter_by(user_id=cls.user_id).first()
-        tokens = json.loads(revoked_token.token_list)
-        tokens.append(token)
-        revoked_token.token_list = json.dumps(tokens)
-        db.session.commit()
+        if not cls.query.filter_by(jti=jti).first():
+            db.session.add(cls(jti=jti, user_id=user_id, expires=expires))
+            db.session.commit()
         return
 
-    def get_token_list(self):
+    @classmethod
+    def is_token_revoked(cls, jti):
         """
-        Returns the list of revoked tokens for the user.
+        Checks if a token is revoked.
+
+        Args:
+        - jti: Unique identifier of the token to be checked for revocation
+
+        Returns:
+        - True if the token is revoked, False otherwise
         """
-        return json.loads(self.token_list) if self.token_list else []
+        return db.session.query(cls.id).filter_by(jti=jti).first() is not None
 
-    def is_token_revoked(self, token):
+    @classmethod
+    def purge_expired(cls, now):
         """
-        Checks if a token is revoked for the user.
+        Deletes revoked tokens that expired before now.
 
         Args:
-        - token: Token string to be checked for revocation
+        - now: UTC datetime to compare expiries with
 
         Returns:
-        - True if the token is revoked for the user, False otherwise
+        - Number of rows deleted
         """
-        token_list = json.loads(self.token_list) if self.token_list else []
-        return token in token_list
+        deleted = cls.query.filter(cls.expires < now).delete()
+        db.session.commit()
+        return deleted
+
 
 class WaitList(db.Model):
     """
@@ -236,9 +467,11 @@ class WaitList(db.Model):
         reason (str): reason for needing our produc
         reg_date (datetime): timestamp of when the entry was submitted
     """
+    __bind_key__ = 'waitlist'
+
     wid = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(225), nullable=False)
-    phone = db.Column(db.String(18), nullable=True)
+    phone = db.Column(db.String(18), nullable=True, index=True)
     email = db.Column(db.String(100), unique=True, nullable=True)
     business_type = db.Column(db.String(100), nullable=True)
     reason = db.Column(db.Text, nullable=True)
@@ -1,20 +1,35 @@
-from flask import jsonify, request
-from myapp import app, db, jwt
+import hmac
+from flask import Response, jsonify, request, send_from_directory, stream_with_context
+from sqlalchemy import or_
+from myapp import app, db, jwt, sockets
 from myapp.models import *
 from flask_jwt_extended import (
     jwt_required, create_access_token, create_refresh_token,
-    get_jwt_identity, current_user, get_jwt
+    current_user, get_jwt
 )
-import json
-from datetime import datetime
+from datetime import datetime, timezone
 from myapp.functions import myfunctions as myfunc
-from werkzeug.security import check_password_hash
 from myapp.functions import resources as resource
+from myapp.functions import ledger
+from myapp.functions.blocklist import blocklist
+from myapp.functions import user_cache
+from myapp.functions import passwords
+from myapp.functions import reports as report
+from myapp.functions import importer
+from myapp.functions import exporter
+from myapp.functions import conditional
+from myapp.functions import documents
+from myapp.functions import outbox
+from myapp.functions import ratelimit
+from myapp.functions import metrics
+from myapp.functions import search
+from myapp.functions import shards
+from myapp.functions.serializers import dumps
 
 
 @jwt.user_identity_loader
 def user_identity_lookup(user):
-    return user.id
+    return str(user.id)
 
 
 @jwt.needs_fresh_token_loader
@@ -33,29 +48,71 @@ def token_not_fresh_callback(jwt_header, jwt_payload):
 @jwt.user_lookup_loader
 def user_lookup_callback(_jwt_header, jwt_data):
     identity = jwt_data["sub"]
-    return User.query.filter_by(userid=identity).one_or_none()
+    return user_cache.lookup_user(identity)
+
+
+@jwt.token_in_blocklist_loader
+def check_if_token_revoked(_jwt_header, jwt_payload):
+    return blocklist.is_revoked(jwt_payload['jti'])
+
+
+@jwt.revoked_token_loader
+def revoked_token_callback(_jwt_header, _jwt_payload):
+    err = 'authentication token has been revoked.'
+    message = 'User could not be authenticated. Pleas login again!'
+    return dumps({'status': 2, 'data': None, 'message': message, 'error': [err]}), 401
 
 
 @jwt.expired_token_loader
 def my_expired_token_callback(jwt_header, jwt_payload):
     err = 'authentication token has expired.'
     message = 'User could not be authenticated. Pleas login again!'
-    return json.dumps({'status': 2, 'data': None, 'message': message, 'error': [err]}), 401
+    return dumps({'status': 2, 'data': None, 'message': message, 'error': [err]}), 401
 
 
 @app.route('/refresh', methods=['POST'])
 @jwt_required(refresh=True)
 def refresh():
-    current_user_id = get_jwt_identity()
-    new_access_token = create_access_token(identity=current_user_id)
+    new_access_token = create_access_token(identity=current_user)
     message = 'Access token refreshed successfully'
-    return json.dumps({'status': 1, 'data': {'access_token': new_access_token},
+    return dumps({'status': 1, 'data': {'access_token': new_access_token},
                        'message': message, 'error': [None]}), 200
 
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
-    return json.dumps({'status': 1, 'data': None, 'message': 'Connection successful.', 'error': [None]})
+    return dumps({'status': 1, 'data': None, 'message': 'Connection successful.', 'error': [None]})
+
+
+def metrics_token_valid() -> bool:
+    """ True if METRICS_TOKEN is unset or the request sends it as a bearer token """
+    token = app.config['METRICS_TOKEN']
+    return not token or hmac.compare_digest(request.headers.get('Authorization', ''), 'Bearer ' + token)
+
+
+@app.route('/stats/cache', methods=['GET'])
+def cache_stats():
+    """
+    Reports the hit/miss counters of this process' in-memory caches, behind METRICS_TOKEN like /metrics.
+    """
+    if not metrics_token_valid():
+        message = 'metrics token required'
+        return dumps({'status': 2, 'data': None, 'message': message, 'error': [message]}), 401
+
+    worker = {'user_lookup': user_cache.stats(), 'token_blocklist': blocklist.stats()}
+    if shards.enabled():
+        worker['shard_engines'] = shards.get_registry().stats()
+    return dumps({'status': 1, 'data': worker, 'message': 'Cache statistics.', 'error': [None]})
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_export():
+    """
+    Serves this process' request metrics in the Prometheus text format.
+    """
+    if not metrics_token_valid():
+        return Response('metrics token required\n', status=401, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/test', methods=['GET'])
@@ -79,6 +136,7 @@ def test_route():
 
 
 @app.route("/signup", methods=["POST"])
+@ratelimit.limit('signup')
 def signup() -> str:
     """ receives sign up request and converts the data into python dict then returns a response """
 
@@ -90,20 +148,21 @@ def signup() -> str:
             # validate password strength
             check_password = myfunc.check_password_strength(password)
             if check_password['status'] > 1:
-                return json.dumps(check_password)
+                return dumps(check_password)
 
             # register user
             users = User()
             user_is_registered, message = users.add_user(data)
             if user_is_registered:
                 user = User.query.filter_by(email=data['email']).first()
+                user_cache.invalidate_user(user.id)
                 worker = {'email': user.email, 'user_id': user.id}
-                return json.dumps({'status': 1, 'data': worker, 'message': message, 'error': [None]})
+                return dumps({'status': 1, 'data': worker, 'message': message, 'error': [None]})
             else:
-                return json.dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+                return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
 
         message = 'user parameters not recognised.'
-        return json.dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+        return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
 
     elif action == 'REGISTER-USER-PERSONAL-INFORMATION':
         if 'user_id' in data:
@@ -114,6 +173,7 @@ def signup() -> str:
                              'last_name': data['last_name'].title(),
                              'phone_number': data['phone']})
                 db.session.commit()
+                user_cache.invalidate_user(data['user_id'])
                 status = 1
                 # fetch the saved user-data
                 user = User.query.filter_by(id=data['user_id']).first()
@@ -126,10 +186,10 @@ def signup() -> str:
                 message = 'User not found'
                 worker = None
 
-            return json.dumps({'status': status, 'data': worker, 'message': message, 'error': [message]})
+            return dumps({'status': status, 'data': worker, 'message': message, 'error': [message]})
 
         message = 'No user id provided'
-        return json.dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+        return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
 
     elif action == 'REGISTER-USER-BUSINESS-INFORMATION':
         if 'user_id' in data and 'business_name' in data:
@@ -144,10 +204,11 @@ def signup() -> str:
                              'business_email': data['business_email'] if data['business_email'] else user.email,
                              'business_type': data['business_type'], 'business_id': data['business_id']})
                 db.session.commit()
+                user_cache.invalidate_user(data['user_id'])
                 status = 1
                 # fetch the saved user-data
                 user = User.query.filter_by(id=data['user_id']).first()
-                worker = resource.fetch_user_information(user.id)
+                worker = resource.fetch_user_info(user.id)
                 message = 'User business info updated successfully'
 
             else:
@@ -155,16 +216,17 @@ def signup() -> str:
                 message = 'User not found'
                 worker = None
 
-            return json.dumps({'status': status, 'data': worker, 'message': message, 'error': [message]})
+            return dumps({'status': status, 'data': worker, 'message': message, 'error': [message]})
 
         message = 'No user id and or business name provided'
-        return json.dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+        return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
 
     message = 'No action defined'
-    return json.dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+    return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
 
 
 @app.route("/login", methods=["POST"])
+@ratelimit.limit('login')
 def login() -> str:
     """ receives login request and converts the data into python dict then returns a response """
     data = request.get_json()
@@ -175,52 +237,69 @@ def login() -> str:
         # check if user exists
         if not user:
             message = 'User does not exist.'
-            return json.dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+            return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
 
         # check if password matches
-        if not check_password_hash(user.password, password):
+        try:
+            password_ok = passwords.verify_password(user.password, password)
+        except passwords.PasswordCheckBusy:
+            message = 'Server is busy. Please try again shortly.'
+            return dumps({'status': 2, 'data': None, 'message': message, 'error': [message]}), 503
+        if not password_ok:
             message = 'Password is incorrect.'
-            return json.dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+            return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
 
         # check if user is active
-        if not User.query.filter_by(email=email, activated=1).first():
+        if user.activated != 1:
             message = 'User has not confirmed their email'
-            return json.dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+            return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
 
         # check if user is blocked
-        if not User.query.filter_by(email=email, block_stat=0).first():
+        if user.block_stat != 0:
             message = 'Account is blocked. Pleased contact admin.'
-            return json.dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+            return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+
+        # upgrade the stored hash if the configured cost has changed since it was made
+        if passwords.needs_rehash(user.password):
+            user.password = passwords.hash_password(password)
+            db.session.commit()
 
         # log user in
         response = user.encode_auth_token(user)
         if response['status'] == 1:
-            worker = resource.fetch_user_information(user.id)
+            worker = resource.serialize_user(user)
             worker['access_token'] = response['access_token']
             worker['refresh_token'] = response['refresh_token']
             message = 'Login was successful.'
-            return json.dumps({'status': 1, 'data': worker, 'message': message, 'error': [None]})
+            return dumps({'status': 1, 'data': worker, 'message': message, 'error': [None]})
 
         # else
         message = 'Login was not successful.'
-        return json.dumps({'status': 2, 'data': data, 'message': message, 'error': response['error']})
+        return dumps({'status': 2, 'data': data, 'message': message, 'error': response['error']})
 
     message = 'user parameters not recognised.'
-    return json.dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+    return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
 
 
 @app.route("/logout", methods=["POST"])
 @jwt_required()
 def logout():
-    jti = get_jwt()["jti"]
-    worker = RevokedToken(current_user.id)
-    worker.add_revoked_token(jti)
-    return json.dumps({'status': 1, 'data': None, 'message': 'Logged out successfully.', 'error': [None]})
+    token = get_jwt()
+    expires = datetime.fromtimestamp(token['exp'], timezone.utc).replace(tzinfo=None)
+    blocklist.revoke(token['jti'], current_user.id, expires)
+    return dumps({'status': 1, 'data': None, 'message': 'Logged out successfully.', 'error': [None]})
 
 
 @app.route('/customer', methods=['POST'])
 @jwt_required()
 def customer():
+    """
+    Adds, fetches and searches customers.
+
+    FETCH-CUSTOMERS and FETCH-CUSTOMER-TRANSACTIONS responses carry an ETag built from
+    the user's or customer's ledger_version. A request that sends it back in
+    If-None-Match gets an empty 304 Not Modified until something is written.
+    """
     data = request.get_json()
     action = request.args.get('action')
     if action == 'ADD-CUSTOMER' and 'first_name' in data:
@@ -234,98 +313,299 @@ def customer():
         )
 
         db.session.add(new_customer)
+        ledger.bump_user_version(current_user.id)
         db.session.commit()
         message = 'Customer added successfully'
         worker = resource.fetch_customer_info(current_user.id, new_customer.id)
+        sockets.publish_customer_added(current_user.id, worker)
 
-        return json.dumps({'status': 1, 'data': worker, 'message': message, 'error': [None]})
+        return dumps({'status': 1, 'data': worker, 'message': message, 'error': [None]})
 
     elif action == 'FETCH-CUSTOMERS':
+        # the version is read before the data, so a concurrent write can only make the tag older
+        etag = conditional.make_etag(action, current_user.id, ledger.fetch_user_version(current_user.id))
+        if conditional.is_fresh(etag):
+            return conditional.not_modified(etag)
+
         worker = resource.fetch_customer_info(current_user.id)
-        return json.dumps({'status': 1, 'data': worker, 'message': 'Succeeded.', 'error': [None]})
+        return conditional.tagged(dumps({'status': 1, 'data': worker, 'message': 'Succeeded.', 'error': [None]}),
+                                  etag)
 
     elif action == 'FETCH-CUSTOMER-TRANSACTIONS' and 'customer_id' in data:
-        worker = resource.fetch_customer_transactions(data['customer_id'])
-
-        return json.dumps({'status': 1, 'data': worker, 'message': 'Succeeded', 'error': [None]})
+        filters = {key: data[key] for key in ('payment_status', 'due_date_from', 'due_date_to',
+                                              'order_date_from', 'order_date_to') if data.get(key)}
+        version = ledger.fetch_ledger_version(data['customer_id'], current_user.id)
+        if version is None:
+            message = 'Customer not found'
+            return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+
+        etag = conditional.make_etag(action, current_user.id, data['customer_id'], version, filters,
+                                     data.get('limit'), data.get('cursor'))
+        if conditional.is_fresh(etag):
+            return conditional.not_modified(etag)
+
+        try:
+            if 'limit' in data or 'cursor' in data:
+                # keyset pagination: data holds 'transactions' and 'next_cursor'
+                limit = int(data.get('limit') or app.config['TRANSACTIONS_PAGE_SIZE'])
+                limit = max(1, min(limit, app.config['TRANSACTIONS_MAX_PAGE_SIZE']))
+                worker = resource.fetch_customer_transactions_page(data['customer_id'], limit,
+                                                                   data.get('cursor'), filters)
+            else:
+                worker = resource.fetch_customer_transactions(data['customer_id'], filters)
+        except (TypeError, ValueError) as e:
+            message = str(e)
+            return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+
+        body = dumps({'status': 1, 'data': worker, 'message': 'Succeeded', 'error': [None]})
+        return conditional.tagged(body, etag)
+
+    elif action == 'SEARCH-CUSTOMERS' and 'query' in data:
+        # type-ahead search over name, email, phone number and address, best matches first
+        if not isinstance(data['query'], str):
+            message = 'query must be a string'
+            return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+        try:
+            limit = int(data.get('limit') or app.config['CUSTOMER_SEARCH_LIMIT'])
+        except (TypeError, ValueError) as e:
+            return dumps({'status': 2, 'data': data, 'message': str(e), 'error': [str(e)]})
+        limit = max(1, min(limit, app.config['CUSTOMER_SEARCH_MAX_LIMIT']))
+        worker = search.search_customers(current_user.id, data['query'], limit)
+        return dumps({'status': 1, 'data': worker, 'message': 'Succeeded.', 'error': [None]})
+
+    elif action == 'FETCH-BALANCE-SUMMARY':
+        # running totals of one customer if customer_id is given, else of all the user's customers
+        worker = ledger.fetch_balance_summary(current_user.id, data.get('customer_id'))
+        if worker is None:
+            message = 'Customer not found'
+            return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+
+        return dumps({'status': 1, 'data': worker, 'message': 'Succeeded.', 'error': [None]})
 
     message = 'Invalid request action argument or no valid resource parameter in request data'
-    return json.dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+    return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
 
 
-@app.route('/transactions', methods=['POST']) 
+@app.route('/transactions', methods=['POST'])
 @jwt_required()
 def transaction():
-    data = request.get_json()
+    """
+    Logs, updates and deletes customer transactions.
+
+    By default every action responds with the customer's full transaction list.
+    With ?response=delta the data is only the affected transaction (or the id of the
+    deleted one) and the customer's new ledger_version, so clients can patch their local
+    copy and re-sync only when they notice a gap in the version numbers.
+    """
+    data = request.get_json(silent=True) or {}
     action = request.args.get('action')
+    delta = request.args.get('response') == 'delta'
 
     if action == 'LOG-TRANSACTION' and 'customer_id' in data:  # logging generated invoice data
-        amount_payable = data['total_price'] + data['delivery_fee'] - data['discount']
-        remaining_balance = amount_payable - data['amount_paid'] if data['amount_paid'] else amount_payable
-        new_transaction = Transaction(
-            customer_id=data['customer_id'],
-            product_name=data['product_name'],
-            product_description=data['product_description'],
-            order_date=datetime.strptime(data['order_date'], '%Y-%m-%d %H:%M:%S') if data['order_date'] else None,
-            delivery_address=data['delivery_address'],
-            delivery_date=datetime.strptime(data['delivery_date'], '%Y-%m-%d %H:%M:%S') if data[
-                'delivery_date'] else None,
-            number_of_items=data['number_of_items'],
-            discount_applied=data['discount'],
-            total_price=data['total_price'],
-            delivery_fee=data['delivery_fee'],
-            amount_payable=amount_payable,
-            invoice_link=data['invoice_link'],
-            receipt_link=data['receipt_link'],
-            amount_paid=data['amount_paid'] if data['amount_paid'] else 0,
-            remaining_balance=remaining_balance,
-            due_date=datetime.strptime(data['due_date'], '%Y-%m-%d %H:%M:%S') if data['due_date'] else None,
-            payment_status='paid' if remaining_balance == 0 else 'pending'
-        )
+        if not Customer.query.filter_by(id=data['customer_id'], user_id=current_user.id).count():
+            message = 'Customer not found'
+            return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+
+        new_transaction = Transaction(**resource.transaction_values(data))
 
         db.session.add(new_transaction)
+        db.session.flush()
+        version, owner_id = ledger.record_transaction_write(new_transaction.customer_id,
+                                                           after=ledger.balance_state(new_transaction))
+        if new_transaction.payment_status == 'paid':
+            outbox.queue_receipt(new_transaction)
         db.session.commit()
+        transaction_info = resource.serialize_transaction(new_transaction)
+        sockets.publish_transaction('transaction_logged', owner_id, transaction_info, version)
 
-        worker = resource.fetch_customer_transactions(data['customer_id'])
+        if delta:
+            worker = {'transaction': transaction_info, 'ledger_version': version}
+        else:
+            worker = resource.fetch_customer_transactions(data['customer_id'])
 
-        return json.dumps({'status': 1, 'data': worker, 'message': 'Transaction Logged successfully.', 'error': [None]})
+        return dumps({'status': 1, 'data': worker, 'message': 'Transaction Logged successfully.', 'error': [None]})
 
     elif action == 'UPDATE-TRANSACTION-INFO' and 'transaction_id' in data and 'customer_id' in data:
-        trans_info = Transaction.query.filter_by(id=data['transaction_id']).first()
+        trans_info = resource.owned_transaction(current_user.id, data['transaction_id'])
         if trans_info:
+            before = ledger.balance_state(trans_info)
             total_paid = trans_info.amount_paid + data['amount_paid']
             remaining_balance = trans_info.amount_payable - total_paid
-            status = 'paid' if remaining_balance == 0 else 'pending'
+            status = resource.payment_status(remaining_balance, trans_info.due_date)
             Transaction.query.filter_by(id=data['transaction_id']) \
                 .update({'amount_paid': total_paid,
                          'remaining_balance': remaining_balance,
                          'payment_status': status})
+            version, owner_id = ledger.record_transaction_write(trans_info.customer_id, before,
+                                                                ledger.balance_state(trans_info))
+            if status == 'paid' and before['payment_status'] != 'paid':
+                # queued in the same commit as the payment, delivered later by `flask send-receipts`
+                outbox.queue_receipt(trans_info)
             db.session.commit()
+            transaction_info = resource.serialize_transaction(trans_info)
+            sockets.publish_transaction('transaction_updated', owner_id, transaction_info, version)
 
-            worker = resource.fetch_customer_transactions(data['customer_id'])
+            if delta:
+                worker = {'transaction': transaction_info, 'ledger_version': version}
+            else:
+                worker = resource.fetch_customer_transactions(trans_info.customer_id)
 
-            return json.dumps(
+            return dumps(
                 {'status': 1, 'data': worker, 'message': 'Transaction updated successfully.', 'error': [None]})
 
         message = 'record not found'
-        return json.dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+        return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
 
     elif action == 'DELETE-TRANSACTION' and 'transaction_id' in data and 'customer_id' in data:
-        trans_info = Transaction.query.filter_by(id=data['transaction_id']).first()
+        trans_info = resource.owned_transaction(current_user.id, data['transaction_id'])
         if trans_info:
-            Transaction.query.filter_by(id=data['transaction_id']).delete()
+            transaction_id, customer_id = trans_info.id, trans_info.customer_id
+            before = ledger.balance_state(trans_info)
+            Transaction.query.filter_by(id=transaction_id).delete()
+            version, owner_id = ledger.record_transaction_write(customer_id, before=before)
             db.session.commit()
+            sockets.publish_transaction_deleted(owner_id, customer_id, transaction_id, version)
 
-            worker = resource.fetch_customer_transactions(data['customer_id'])
+            if delta:
+                worker = {'deleted_transaction_id': transaction_id, 'ledger_version': version}
+            else:
+                worker = resource.fetch_customer_transactions(customer_id)
 
-            return json.dumps(
+            return dumps(
                 {'status': 1, 'data': worker, 'message': 'Transaction deleted successfully.', 'error': [None]})
 
         message = 'Transaction record not found'
-        return json.dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+        return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+
+    elif action == 'IMPORT-TRANSACTIONS':
+        # bulk import: a JSON array, {'transactions': [...]} or an uploaded CSV/NDJSON 'file'
+        upload = request.files.get('file')
+        if upload:
+            file_format = request.args.get('format') or upload.filename.rsplit('.', 1)[-1].lower()
+            rows = importer.read_upload(upload.stream, file_format)
+            customer_id = request.form.get('customer_id', type=int)
+        elif isinstance(data, list):
+            rows, customer_id = data, None
+        elif isinstance(data.get('transactions'), list):
+            rows, customer_id = data['transactions'], data.get('customer_id')
+        else:
+            message = 'No transactions provided'
+            return dumps({'status': 2, 'data': None, 'message': message, 'error': [message]})
+
+        try:
+            worker = importer.import_transactions(current_user.id, rows, app.config['BULK_IMPORT_BATCH_SIZE'],
+                                                  customer_id)
+        except ValueError as e:
+            return dumps({'status': 2, 'data': None, 'message': str(e), 'error': [str(e)]})
+
+        if worker['inserted'] == 0 and worker['failed']:
+            message = 'No transaction could be imported'
+            return dumps({'status': 2, 'data': worker, 'message': message, 'error': [message]})
+
+        message = '{} transactions imported, {} rejected.'.format(worker['inserted'], worker['failed'])
+        return dumps({'status': 1, 'data': worker, 'message': message, 'error': [None]})
+
+    message = 'Invalid request action argument or no valid resource parameter in request data'
+    return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+
+
+@app.route('/export/transactions', methods=['GET'])
+@jwt_required()
+def export_transactions():
+    """
+    Streams every transaction of the logged-in user's customers as a download.
+
+    Query Parameters:
+        format (str): 'csv' (default) or 'ndjson'.
+
+    Returns:
+        A streamed response. No Content-Length is set, so the server sends it chunked.
+    """
+    file_format = request.args.get('format', 'csv')
+    batch_size = app.config['EXPORT_BATCH_SIZE']
+    if file_format == 'csv':
+        body, mimetype = exporter.stream_csv(current_user.id, batch_size), 'text/csv'
+    elif file_format == 'ndjson':
+        body, mimetype = exporter.stream_ndjson(current_user.id, batch_size), 'application/x-ndjson'
+    else:
+        message = 'Unsupported export format. Use csv or ndjson'
+        return dumps({'status': 2, 'data': None, 'message': message, 'error': [message]}), 400
+
+    filename = 'transactions-{}.{}'.format(datetime.now().strftime('%Y%m%d'), file_format)
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': 'attachment; filename={}'.format(filename),
+                             'X-Accel-Buffering': 'no'})
+
+
+@app.route('/reports', methods=['POST'])
+@jwt_required()
+def reports():
+    data = request.get_json(silent=True) or {}
+    action = request.args.get('action')
+
+    if action == 'AGING-REPORT':
+        # receivables aging across all the user's customers, served from the daily rollup
+        try:
+            as_of = myfunc.parse_datetime(data['as_of']).date() if data.get('as_of') else None
+        except ValueError as e:
+            return dumps({'status': 2, 'data': data, 'message': str(e), 'error': [str(e)]})
+
+        worker = report.fetch_aging_report(current_user.id, as_of, bool(data.get('fresh')))
+        if worker is None:
+            message = 'No aging report stored for that day'
+            return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+
+        return dumps({'status': 1, 'data': worker, 'message': 'Succeeded.', 'error': [None]})
 
     message = 'Invalid request action argument or no valid resource parameter in request data'
-    return json.dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+    return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+
+
+@app.route('/documents', methods=['POST'])
+@jwt_required()
+def document_jobs():
+    """
+    Renders invoices and receipts in the background.
+
+    RENDER-DOCUMENT queues a document of one transaction ('kind': 'invoice' or 'receipt',
+    'format': 'pdf' or 'html') and returns the job at once. Poll it with FETCH-DOCUMENT-JOB
+    or wait for the transaction_updated event that carries the new invoice_link/receipt_link.
+    """
+    data = request.get_json(silent=True) or {}
+    action = request.args.get('action')
+
+    if action == 'RENDER-DOCUMENT' and 'transaction_id' in data:
+        try:
+            worker = documents.request_document(current_user.id, data['transaction_id'],
+                                                data.get('kind', 'invoice'), data.get('format', 'pdf'))
+        except ValueError as e:
+            return dumps({'status': 2, 'data': data, 'message': str(e), 'error': [str(e)]})
+
+        if worker is None:
+            message = 'Transaction not found'
+            return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+
+        return dumps({'status': 1, 'data': worker, 'message': 'Document queued.', 'error': [None]})
+
+    elif action == 'FETCH-DOCUMENT-JOB' and 'job_id' in data:
+        worker = documents.fetch_job(current_user.id, data['job_id'])
+        if worker is None:
+            message = 'Document job not found'
+            return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+
+        return dumps({'status': 1, 'data': worker, 'message': 'Succeeded.', 'error': [None]})
+
+    message = 'Invalid request action argument or no valid resource parameter in request data'
+    return dumps({'status': 2, 'data': data, 'message': message, 'error': [message]})
+
+
+@app.route('/documents/<string:filename>', methods=['GET'])
+def document_file(filename):
+    """
+    Serves a rendered document. The file name is the SHA-256 of the document's content,
+    so the link itself is what grants access and can be shared with the customer.
+    """
+    return send_from_directory(app.config['DOCUMENT_DIR'], filename, max_age=31536000)
 
 
 @app.route('/settings', methods=['POST'])
@@ -409,29 +689,37 @@ def waitList(query):
             query (str): search query action to perform
     """
     if query == 'fetch' and request.method == 'GET':
-        waitlist = WaitList.query.all()
-        waitlist_data = []
-        for user in waitlist:
-            waitlist_data.append({
-                'wid': user.wid,
-                'name': user.name,
-                'email': user.email,
-                'phone': user.phone,
-                'business_type': user.business_type,
-                'reason': user.reason,
-                'registered_at': user.reg_date.strftime('%Y-%m-%d %H:%M:%S') if user.reg_date else ''
-            })
-        return json.dumps({'status': 1, 'data': waitlist_data, 'message': 'Waitlist data fetched successfully',
+        if request.args.get('format') == 'ndjson':
+            # one entry per line, built lazily from a server-side cursor
+            return Response(stream_with_context(resource.stream_waitlist()), mimetype='application/x-ndjson')
+
+        if 'limit' in request.args or 'cursor' in request.args:
+            try:
+                limit = int(request.args.get('limit') or app.config['WAITLIST_PAGE_SIZE'])
+                limit = max(1, min(limit, app.config['WAITLIST_MAX_PAGE_SIZE']))
+                waitlist_data = resource.fetch_waitlist_page(limit, request.args.get('cursor'))
+            except (TypeError, ValueError) as e:
+                return dumps({'status': 2, 'data': None, 'message': str(e), 'error': [str(e)]}), 400
+        else:
+            waitlist_data = resource.fetch_waitlist()
+
+        return dumps({'status': 1, 'data': waitlist_data, 'message': 'Waitlist data fetched successfully',
                            'error': [None]}), 200
     
     elif query == 'add' and request.method == 'POST':
+        limited = ratelimit.limited_response('waitlist_add')
+        if limited:
+            return limited
+
         data = request.get_json()
 
         # check if email or phone number already exists
-        if WaitList.query.filter_by(email=data['email']).first():
-            return json.dumps({'status': 2, 'data': None, 'message': 'Email already exists', 'error': ['Email already exists']}), 201
-        if WaitList.query.filter_by(phone=data['phone']).first():
-            return json.dumps({'status': 2, 'data': None, 'message': 'Phone number already exists', 'error': ['Phone number already exists']}), 201
+        existing = WaitList.query.with_entities(WaitList.email, WaitList.phone) \
+            .filter(or_(WaitList.email == data['email'], WaitList.phone == data['phone'])).all()
+        if any(email == data['email'] for email, _ in existing):
+            return dumps({'status': 2, 'data': None, 'message': 'Email already exists', 'error': ['Email already exists']}), 201
+        if existing:
+            return dumps({'status': 2, 'data': None, 'message': 'Phone number already exists', 'error': ['Phone number already exists']}), 201
         
         # add new user to waitlist
         new_waitlist_user = WaitList(
@@ -445,20 +733,10 @@ def waitList(query):
         db.session.add(new_waitlist_user)
         db.session.commit()
 
-        # fetch all the data
-        waitlist = WaitList.query.all()
-        waitlist_data = []
-        for user in waitlist:
-            waitlist_data.append({
-                'wid': user.wid,
-                'name': user.name.title(),
-                'email': user.email,
-                'phone': user.phone,
-                'business_type': user.business_type,
-                'reason': user.reason,
-                'registered_at': user.reg_date.strftime('%Y-%m-%d %H:%M:%S') if user.reg_date else ''
-            })
-        return json.dumps({'status': 1, 'data': waitlist_data, 'message': 'Waitlist user added successfully', 'error': [None]}), 201
+        # echo back only the new entry
+        worker = resource.serialize_waitlist_entry(new_waitlist_user)
+        worker['name'] = worker['name'].title()
+        return dumps({'status': 1, 'data': worker, 'message': 'Waitlist user added successfully', 'error': [None]}), 201
     
     elif query == 'remove' and request.method == 'DELETE':
         data = request.get_json()
@@ -466,11 +744,11 @@ def waitList(query):
             try:
                 WaitList.query.filter_by(wid=int(data['wid'])).delete()
                 db.session.commit()
-                return json.dumps({'status': 1, 'data': None, 'message': 'Waitlist user removed successfully', 'error': [None]}), 200
+                return dumps({'status': 1, 'data': None, 'message': 'Waitlist user removed successfully', 'error': [None]}), 200
             except Exception as e:
-                return json.dumps({'status': 2, 'data': None, 'message': 'Error deleteing user record: {e}', 'error': ['Error deleting user record {e}']}), 200
+                return dumps({'status': 2, 'data': None, 'message': 'Error deleteing user record: {e}', 'error': ['Error deleting user record {e}']}), 200
             
-        return json.dumps({'status': 2, 'data': None, 'message': 'Invalid query', 'error': ['Invalid query']}), 200
+        return dumps({'status': 2, 'data': None, 'message': 'Invalid query', 'error': ['Invalid query']}), 200
 
-    return json.dumps({'status': 2, 'data': None, 'message': 'Invalid query', 'error': ['Invalid query']}), 400
+    return dumps({'status': 2, 'data': None, 'message': 'Invalid query', 'error': ['Invalid query']}), 400
 
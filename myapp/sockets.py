@@ -0,0 +1,133 @@
+""" Socket.IO namespace that pushes ledger changes to connected clients
+
+    Clients connect to the /ledger namespace with their access token, either as
+    auth={'token': ...} or as ?token=... in the query string. Every connection joins the
+    room of its business and can 'subscribe' to the rooms of individual customers.
+    The write routes call the publish_* functions after their commit, so an event
+    always describes data that other requests can already read. Each event carries
+    only the changed record and the new ledger_version; a client that sees a gap in
+    the versions re-fetches with FETCH-CUSTOMER-TRANSACTIONS.
+"""
+from flask import request
+from flask_jwt_extended import decode_token
+from flask_jwt_extended.exceptions import JWTExtendedException
+from flask_socketio import Namespace, join_room, leave_room, disconnect
+from jwt.exceptions import PyJWTError
+from myapp import socketio
+from myapp.models import Customer
+from myapp.functions.blocklist import blocklist
+from myapp.functions import user_cache, shards
+
+NAMESPACE = '/ledger'
+
+# user_id and token jti of every connection to this process, by sid
+_connections = {}
+
+
+def business_room(user_id) -> str:
+    return 'business:{}'.format(user_id)
+
+
+def customer_room(customer_id) -> str:
+    return 'customer:{}'.format(customer_id)
+
+
+class LedgerNamespace(Namespace):
+    """
+    Authenticates connections and manages their room subscriptions.
+    """
+
+    def on_connect(self, auth=None):
+        token = (auth or {}).get('token') or request.args.get('token')
+        if not token:
+            raise ConnectionRefusedError('authentication token is missing.')
+        try:
+            claims = decode_token(token)
+        except (JWTExtendedException, PyJWTError) as e:
+            raise ConnectionRefusedError(str(e))
+        if claims.get('type') != 'access' or blocklist.is_revoked(claims['jti']):
+            raise ConnectionRefusedError('authentication token has been revoked.')
+
+        user = user_cache.lookup_user(claims['sub'])
+        if user is None or user.block_stat:
+            raise ConnectionRefusedError('User could not be authenticated.')
+
+        _connections[request.sid] = {'user_id': user.id, 'jti': claims['jti']}
+        join_room(business_room(user.id))
+
+    def on_disconnect(self, reason=None):
+        _connections.pop(request.sid, None)
+
+    def _session(self):
+        """ returns the connection's user_id and jti, or None after disconnecting a revoked token """
+        session = _connections.get(request.sid)
+        if session is None or blocklist.is_revoked(session['jti']):
+            disconnect()
+            return None
+        return session
+
+    def on_subscribe(self, data):
+        """ joins the room of one of the user's customers. data is {'customer_id': int} """
+        session = self._session()
+        if session is None:
+            return {'status': 2, 'message': 'authentication token has been revoked.'}
+
+        customer_id = (data or {}).get('customer_id')
+        with shards.use_business(session['user_id']):
+            owned = Customer.query.with_entities(Customer.id) \
+                .filter_by(id=customer_id, user_id=session['user_id']).first()
+        if owned is None:
+            return {'status': 2, 'message': 'Customer not found'}
+
+        join_room(customer_room(customer_id))
+        return {'status': 1, 'message': 'Subscribed'}
+
+    def on_unsubscribe(self, data):
+        """ leaves the room of a customer """
+        leave_room(customer_room((data or {}).get('customer_id')))
+        return {'status': 1, 'message': 'Unsubscribed'}
+
+
+socketio.on_namespace(LedgerNamespace(NAMESPACE))
+
+
+def _publish(event: str, payload: dict, user_id: int, customer_id: int):
+    # a client in both rooms receives the event once
+    socketio.emit(event, payload, to=[business_room(user_id), customer_room(customer_id)], namespace=NAMESPACE)
+
+
+def publish_transaction(event: str, user_id: int, transaction: dict, ledger_version: int):
+    """
+    Announces a logged or updated transaction.
+
+    Args:
+        event (str): 'transaction_logged' or 'transaction_updated'.
+        user_id (int): The ID of the business the customer belongs to.
+        transaction (dict): The transaction as returned by resources.serialize_transaction.
+        ledger_version (int): The customer's ledger version after the write.
+    """
+    _publish(event, {'customer_id': transaction['customer_id'], 'transaction': transaction,
+                     'ledger_version': ledger_version}, user_id, transaction['customer_id'])
+
+
+def publish_transaction_deleted(user_id: int, customer_id: int, transaction_id: int, ledger_version: int):
+    """ announces a deleted transaction """
+    _publish('transaction_deleted', {'customer_id': customer_id, 'deleted_transaction_id': transaction_id,
+                                     'ledger_version': ledger_version}, user_id, customer_id)
+
+
+def publish_customer_added(user_id: int, customer: dict):
+    """ announces a new customer to the business room """
+    socketio.emit('customer_added', {'customer': customer}, to=business_room(user_id), namespace=NAMESPACE)
+
+
+def publish_transactions_overdue(user_id: int, customers: list):
+    """
+    Announces the transactions of a business that the overdue sweeper has just marked overdue.
+
+    Args:
+        user_id (int): The ID of the business.
+        customers (list): {'customer_id', 'transaction_ids', 'ledger_version'} of every customer affected.
+    """
+    rooms = [business_room(user_id)] + [customer_room(customer['customer_id']) for customer in customers]
+    socketio.emit('transactions_overdue', {'customers': customers}, to=rooms, namespace=NAMESPACE)
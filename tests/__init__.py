@@ -0,0 +1,13 @@
+import os
+import tempfile
+
+# keep the test run off the bundled sqlite file
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('SECRETE_KEY', 'fundsflow-test-secret-key-for-the-suite')
+# render documents inline, into a scratch directory
+os.environ.setdefault('DOCUMENT_WORKERS', '0')
+os.environ.setdefault('DOCUMENT_DIR', tempfile.mkdtemp(prefix='fundsflow-documents-'))
+# rate limits are exercised by test_rate_limit only
+os.environ.setdefault('RATELIMIT_ENABLED', '0')
+os.environ.setdefault('RATELIMIT_STORE_PATH',
+                      os.path.join(tempfile.mkdtemp(prefix='fundsflow-ratelimit-'), 'buckets'))
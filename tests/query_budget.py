@@ -0,0 +1,95 @@
+""" helpers that hold requests to a budget of SQL statements
+
+    QueryCounter records the statements the database engines run while it is active.
+    assertQueryBudget (a TestCase mixin method, used like assertLogs) and the
+    query_budget decorator fail a test when the code under them runs more statements
+    than the budget allows, or runs the same statement N_PLUS_ONE_REPEATS times or more,
+    which is what a lazy relationship loaded inside a loop looks like.
+"""
+import functools
+from collections import Counter
+from contextlib import contextmanager
+from sqlalchemy import event
+from myapp import db
+
+N_PLUS_ONE_REPEATS = 3
+
+
+class QueryCounter:
+    """
+    Records the SQL statements executed while the counter is entered, on every engine
+    of the app (the main database and each bind, e.g. the waitlist's) unless given engines.
+
+    Attributes:
+        statements (list): The SQL text of every statement, in order.
+    """
+
+    def __init__(self, engines=None):
+        self.engines = engines
+        self.statements = []
+
+    def _record(self, _conn, _cursor, statement, _parameters, _context, _executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        self.engines = list(self.engines or set(db.engines.values()))
+        for engine in self.engines:
+            event.listen(engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *_exc):
+        for engine in self.engines:
+            event.remove(engine, 'before_cursor_execute', self._record)
+        return False
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def repeated(self, times: int = N_PLUS_ONE_REPEATS) -> list:
+        """ returns (statement, count) of every statement that ran at least `times` times: N+1 suspects """
+        return [(statement, count) for statement, count in Counter(self.statements).most_common() if count >= times]
+
+    def report(self) -> str:
+        lines = ['{} statements:'.format(self.count)]
+        lines.extend('  {}'.format(' '.join(statement.split())) for statement in self.statements)
+        return '\n'.join(lines)
+
+
+def check_budget(counter: QueryCounter, budget: int, repeats: int = N_PLUS_ONE_REPEATS) -> list:
+    """ returns what is wrong with the statements a counter recorded, as messages """
+    problems = []
+    if counter.count > budget:
+        problems.append('ran {} SQL statements, the budget is {}'.format(counter.count, budget))
+    for statement, count in counter.repeated(repeats):
+        problems.append('possible N+1: ran {} times: {}'.format(count, ' '.join(statement.split())))
+    return problems
+
+
+class QueryBudgetMixin:
+    """ adds assertQueryBudget to a unittest.TestCase """
+
+    @contextmanager
+    def assertQueryBudget(self, budget: int, repeats: int = N_PLUS_ONE_REPEATS):
+        """
+        Fails if the block runs more than `budget` statements or any statement `repeats` times.
+
+        Yields:
+            QueryCounter: The statements recorded so far.
+        """
+        with QueryCounter() as counter:
+            yield counter
+        problems = check_budget(counter, budget, repeats)
+        if problems:
+            self.fail('\n'.join(problems + [counter.report()]))
+
+
+def query_budget(budget: int, repeats: int = N_PLUS_ONE_REPEATS):
+    """ decorates a test method so its body is held to assertQueryBudget(budget, repeats) """
+    def decorator(test):
+        @functools.wraps(test)
+        def wrapper(self, *args, **kwargs):
+            with QueryBudgetMixin.assertQueryBudget(self, budget, repeats):
+                return test(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,108 @@
+import unittest
+from datetime import date, datetime, timedelta
+from unittest import mock
+from flask import json
+from flask_jwt_extended import create_access_token
+from myapp import app, db
+from myapp.models import User, Customer, Transaction, AgingRollup
+from myapp.functions import reports
+
+
+class TestAgingReport(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        user = User(email='test@example.com', password='password')
+        db.session.add(user)
+        db.session.commit()
+        customer = Customer(first_name='Ada', phone_number='0800000000', user_id=user.id)
+        db.session.add(customer)
+        db.session.commit()
+        self.user_id, self.customer_id = user.id, customer.id
+        self.headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity=user))}
+
+        today = datetime.combine(date.today(), datetime.min.time())
+        # (days past due, remaining balance); None means no due date
+        for days, balance in ((None, 1), (-5, 2), (0, 4), (1, 8), (30, 16), (31, 32), (75, 64), (91, 128), (200, 0)):
+            db.session.add(Transaction(
+                customer_id=customer.id, product_name='Item', delivery_address='Lagos', rate=1, number_of_items=1,
+                total_price=balance, delivery_fee=0, amount_payable=balance, amount_paid=0,
+                remaining_balance=balance, payment_status='pending' if balance else 'paid',
+                due_date=today - timedelta(days=days) + timedelta(hours=9) if days is not None else None))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def aging(self, **payload):
+        response = self.app.post('/reports?action=AGING-REPORT', json=payload, headers=self.headers)
+        return json.loads(response.data.decode())
+
+    def test_buckets(self):
+        data = self.aging()['data']
+        self.assertEqual(data['current'], 7)
+        self.assertEqual(data['days_1_30'], 24)
+        self.assertEqual(data['days_31_60'], 32)
+        self.assertEqual(data['days_61_90'], 64)
+        self.assertEqual(data['days_over_90'], 128)
+        self.assertEqual(data['total_outstanding'], 255)
+
+    def transaction_id(self, remaining_balance):
+        return Transaction.query.filter_by(remaining_balance=remaining_balance).one().id
+
+    def test_rollup_is_reused_and_updated_by_writes(self):
+        self.aging()
+        self.assertEqual(AgingRollup.query.count(), 1)
+        AgingRollup.query.update({'current': 1000})
+        db.session.commit()
+        self.assertEqual(self.aging()['data']['current'], 1000)
+
+        payload = {'customer_id': self.customer_id, 'product_name': 'Rice', 'product_description': None,
+                   'order_date': None, 'delivery_address': 'Lagos', 'delivery_date': None, 'rate': 10,
+                   'number_of_items': 1, 'discount': 0, 'total_price': 10, 'delivery_fee': 0,
+                   'invoice_link': None, 'receipt_link': None, 'amount_paid': 0, 'due_date': None}
+        self.app.post('/transactions?action=LOG-TRANSACTION&response=delta', json=payload, headers=self.headers)
+        self.app.post('/transactions?action=UPDATE-TRANSACTION-INFO&response=delta', headers=self.headers,
+                      json={'customer_id': self.customer_id, 'transaction_id': self.transaction_id(128),
+                            'amount_paid': 100})
+        self.app.post('/transactions?action=DELETE-TRANSACTION&response=delta', headers=self.headers,
+                      json={'customer_id': self.customer_id, 'transaction_id': self.transaction_id(32)})
+
+        # the writes moved their amounts within today's rollup: nothing was recomputed
+        with mock.patch.object(reports, 'compute_aging', wraps=reports.compute_aging) as compute_aging:
+            data = self.aging()['data']
+        compute_aging.assert_not_called()
+        self.assertEqual((data['current'], data['days_31_60'], data['days_over_90']), (1010, 0, 28))
+        self.assertEqual(AgingRollup.query.count(), 1)
+
+        AgingRollup.query.update({'current': 17})
+        db.session.commit()
+        stored = self.aging()['data']
+        self.assertEqual({name: stored[name] for name in reports.AGING_BUCKETS},
+                         reports.compute_aging(date.today(), self.user_id)[self.user_id])
+
+    def test_writes_without_a_rollup_today_leave_the_recompute_to_the_next_read(self):
+        yesterday = (date.today() - timedelta(days=1)).isoformat()
+        self.assertEqual(reports.rollup_aging(date.today() - timedelta(days=1)), 1)
+        stored = self.aging(as_of=yesterday)['data']
+        self.app.post('/transactions?action=DELETE-TRANSACTION&response=delta', headers=self.headers,
+                      json={'customer_id': self.customer_id, 'transaction_id': self.transaction_id(128)})
+        self.assertEqual(self.aging(as_of=yesterday)['data'], stored)
+        self.assertEqual(self.aging()['data']['days_over_90'], 0)
+
+    def test_daily_rollup_for_all_users(self):
+        self.assertEqual(reports.rollup_aging(), 1)
+        self.assertEqual(db.session.get(AgingRollup, (self.user_id, date.today())).days_over_90, 128)
+        self.assertEqual(self.aging(as_of='2000-01-01')['status'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
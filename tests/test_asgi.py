@@ -0,0 +1,204 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+from flask import json
+from flask_jwt_extended import create_access_token
+from sqlalchemy import create_engine
+from myapp import app, db
+from myapp.models import User, Customer, Transaction, WaitList
+from myapp.functions import async_db, ledger, metrics, shards
+from myapp.async_routes import application, native_view, wsgi_environ
+
+
+async def asgi_request(method, path, payload=None, headers=None):
+    """ sends one request through the ASGI app and returns (status, headers, body) """
+    path, _, query_string = path.partition('?')
+    body = json.dumps(payload).encode() if payload is not None else b''
+    request_headers = [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    if payload is not None:
+        request_headers.append((b'content-type', b'application/json'))
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method, 'scheme': 'http',
+             'path': path, 'root_path': '', 'query_string': query_string.encode(), 'headers': request_headers,
+             'server': ('testserver', 80), 'client': ('127.0.0.1', 50000)}
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    try:
+        await application(scope, receive, send)
+    finally:
+        # the aiosqlite connections belong to this event loop
+        await async_db.dispose()
+    start = sent[0]
+    response_headers = {name.decode().lower(): value.decode() for name, value in start['headers']}
+    return start['status'], response_headers, b''.join(message.get('body', b'') for message in sent[1:])
+
+
+class TestASGIApp(unittest.TestCase):
+    """
+    Serves the same requests through the Flask test client and the ASGI app, which
+    needs database files: the in-memory test database is swapped for two files.
+    """
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.directory = tempfile.mkdtemp(prefix='fundsflow-asgi-')
+        main_url = 'sqlite:///' + os.path.join(self.directory, 'fundsflow.db')
+        waitlist_url = 'sqlite:///' + os.path.join(self.directory, 'fundsflow_wait.db')
+        self.engines = {None: create_engine(main_url), 'waitlist': create_engine(waitlist_url)}
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        self.patches = [mock.patch.dict(app.config, {'SQLALCHEMY_DATABASE_URI': main_url,
+                                                     'SQLALCHEMY_BINDS': {'waitlist': waitlist_url},
+                                                     'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000'}),
+                        mock.patch.dict(db.engines, self.engines)]
+        for patch in self.patches:
+            patch.start()
+        db.session.remove()
+        db.create_all()
+
+        User.add_user({'email': 'test@example.com', 'password': 'TestPassword123#'})
+        user = User.query.filter_by(email='test@example.com').one()
+        customers = [Customer(first_name=name, last_name='Okafor', phone_number='0800', shipping_address='Lagos',
+                              user_id=user.id) for name in ('Ada', 'Adaeze', 'Obi')]
+        db.session.add_all(customers)
+        db.session.add_all([WaitList(name='ada', email='ada@example.com', phone='0800', reg_date=datetime(2024, 1, 1)),
+                            WaitList(name='obi', email='obi@example.com', phone='0801', reg_date=None)])
+        db.session.commit()
+        for day in (1, 2, 3):
+            transaction = Transaction(customer_id=customers[0].id, product_name='Rice', delivery_address='Lagos',
+                                      rate=50, number_of_items=2, total_price=100, delivery_fee=0, amount_payable=100,
+                                      amount_paid=0, remaining_balance=100, payment_status='pending',
+                                      order_date=datetime(2024, 1, day))
+            db.session.add(transaction)
+            db.session.flush()
+            ledger.record_transaction_change(customers[0].id, after=ledger.balance_state(transaction))
+        db.session.commit()
+        self.user_id, self.customer_id = user.id, customers[0].id
+        self.headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity=user))}
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.app_context.pop()
+        for engine in self.engines.values():
+            engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def asgi(self, method, path, payload=None, headers=None):
+        return asyncio.run(asgi_request(method, path, payload, headers))
+
+    def flask(self, method, path, payload=None, headers=None):
+        response = self.app.open(path, method=method, json=payload, headers=headers)
+        return response.status_code, response.headers, response.data
+
+    def native(self, method, path):
+        """ the coroutine that would serve the request on the event loop, None for the Flask app """
+        path, _, query_string = path.partition('?')
+        return native_view(wsgi_environ({'method': method, 'path': path, 'query_string': query_string.encode(),
+                                         'headers': []}, b''))
+
+    def assertSameResponse(self, method, path, payload=None, headers=None):
+        status, response_headers, body = self.asgi(method, path, payload, headers)
+        expected_status, expected_headers, expected_body = self.flask(method, path, payload, headers)
+        self.assertEqual((status, body), (expected_status, expected_body), path)
+        self.assertEqual(response_headers.get('etag'), expected_headers.get('ETag'), path)
+        return body
+
+    def test_native_views_match_the_flask_views(self):
+        requests = [
+            ('/customer?action=FETCH-CUSTOMERS', {}),
+            ('/customer?action=FETCH-CUSTOMER-TRANSACTIONS', {'customer_id': self.customer_id}),
+            ('/customer?action=FETCH-CUSTOMER-TRANSACTIONS', {'customer_id': self.customer_id, 'limit': 2}),
+            ('/customer?action=FETCH-CUSTOMER-TRANSACTIONS', {'customer_id': self.customer_id,
+                                                             'order_date_from': 'not a date'}),
+            ('/customer?action=FETCH-CUSTOMER-TRANSACTIONS', {}),
+            ('/customer?action=FETCH-CUSTOMER-TRANSACTIONS', {'customer_id': self.customer_id + 100}),
+            ('/customer?action=SEARCH-CUSTOMERS', {'query': 'ada'}),
+            ('/customer?action=SEARCH-CUSTOMERS', {'query': '  '}),
+            ('/customer?action=SEARCH-CUSTOMERS', {'query': 123}),
+            ('/customer?action=FETCH-BALANCE-SUMMARY', {}),
+            ('/customer?action=FETCH-BALANCE-SUMMARY', {'customer_id': self.customer_id}),
+            ('/customer?action=FETCH-BALANCE-SUMMARY', {'customer_id': self.customer_id + 100}),
+        ]
+        for path, payload in requests:
+            self.assertIsNotNone(self.native('POST', path))
+            self.assertSameResponse('POST', path, payload, self.headers)
+
+        body = self.assertSameResponse('POST', '/customer?action=SEARCH-CUSTOMERS', {'query': 'ada'}, self.headers)
+        self.assertEqual([customer['first_name'] for customer in json.loads(body)['data']], ['Ada', 'Adaeze'])
+        self.assertSameResponse('GET', '/waitlist/fetch')
+        self.assertSameResponse('GET', '/waitlist/fetch?limit=1')
+        self.assertSameResponse('GET', '/waitlist/fetch?cursor=nonsense')
+        self.assertEqual(len(self.assertSameResponse('GET', '/waitlist/fetch?format=ndjson').splitlines()), 2)
+        self.assertIsNotNone(self.native('GET', '/waitlist/fetch'))
+        # no token: the JWT error handlers answer as they do for the Flask view
+        self.assertSameResponse('POST', '/customer?action=FETCH-CUSTOMERS', {})
+
+    def test_etags_and_metrics(self):
+        status, headers, _ = self.asgi('POST', '/customer?action=FETCH-CUSTOMERS', {}, self.headers)
+        status, _, body = self.asgi('POST', '/customer?action=FETCH-CUSTOMERS', {},
+                                    dict(self.headers, **{'If-None-Match': headers['etag']}))
+        self.assertEqual((status, body), (304, b''))
+        self.assertIn('route="/customer",action="FETCH-CUSTOMERS",status="304"', metrics.render())
+
+    def test_login(self):
+        self.assertIsNotNone(self.native('POST', '/login'))
+        status, _, body = self.asgi('POST', '/login', {'email': 'test@example.com', 'password': 'TestPassword123#'})
+        data = json.loads(body)
+        self.assertEqual((status, data['status'], data['message']), (200, 1, 'Login was successful.'))
+        headers = {'Authorization': 'Bearer {}'.format(data['data']['access_token'])}
+        self.assertEqual(self.asgi('POST', '/customer?action=FETCH-CUSTOMERS', {}, headers)[0], 200)
+
+        for payload in ({'email': 'test@example.com', 'password': 'wrong'}, {'email': 'nobody@example.com',
+                                                                            'password': 'x'}, {'email': 'x'}):
+            self.assertSameResponse('POST', '/login', payload)
+
+    def test_waitlist_writes(self):
+        entry = {'name': 'eze nwosu', 'email': 'eze@example.com', 'phone': '0802', 'business_type': 'retail',
+                 'reason': None}
+        status, _, body = self.asgi('POST', '/waitlist/add', entry)
+        data = json.loads(body)
+        self.assertEqual((status, data['data']['name']), (201, 'Eze Nwosu'))
+        self.assertSameResponse('POST', '/waitlist/add', entry)
+        self.assertSameResponse('POST', '/waitlist/add', dict(entry, email='new@example.com'))
+
+        self.asgi('DELETE', '/waitlist/remove', {'wid': data['data']['wid']})
+        self.assertIsNone(db.session.get(WaitList, data['data']['wid']))
+        self.assertSameResponse('DELETE', '/waitlist/remove', {})
+        self.assertSameResponse('POST', '/waitlist/fetch')
+
+    def test_ledger_writes_run_the_flask_view(self):
+        payload = {'customer_id': self.customer_id, 'product_name': 'Beans', 'delivery_address': 'Lagos', 'rate': 10,
+                   'number_of_items': 1, 'total_price': 10, 'delivery_fee': 0}
+        self.assertIsNone(self.native('POST', '/transactions?action=LOG-TRANSACTION'))
+        self.assertIsNone(self.native('POST', '/customer?action=ADD-CUSTOMER'))
+        status, _, body = self.asgi('POST', '/transactions?action=LOG-TRANSACTION&response=delta', payload,
+                                    self.headers)
+        data = json.loads(body)
+        self.assertEqual((status, data['status']), (200, 1))
+        self.assertEqual(data['data']['ledger_version'], ledger.fetch_ledger_version(self.customer_id))
+        self.assertEqual(ledger.rebuild_balance_summaries(check_only=True), [])
+        self.assertSameResponse('GET', '/no-such-route')
+
+    def test_sharded_endpoints_go_to_the_flask_app(self):
+        self.assertIsNotNone(self.native('POST', '/customer?action=FETCH-CUSTOMERS'))
+        with mock.patch.object(shards, '_registry', object()):
+            self.assertIsNone(self.native('POST', '/customer?action=FETCH-CUSTOMERS'))
+            self.assertIsNotNone(self.native('POST', '/login'))
+
+
+if __name__ == '__main__':
+    unittest.main()
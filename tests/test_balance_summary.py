@@ -0,0 +1,83 @@
+import unittest
+from flask import json
+from flask_jwt_extended import create_access_token
+from myapp import app, db
+from myapp.models import User, Customer, CustomerBalance
+from myapp.functions import ledger
+
+
+class TestBalanceSummary(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        user = User(email='test@example.com', password='password')
+        db.session.add(user)
+        db.session.commit()
+        customers = [Customer(first_name=name, phone_number='0800000000', user_id=user.id) for name in ('Ada', 'Obi')]
+        db.session.add_all(customers)
+        db.session.commit()
+        self.customer_ids = [customer.id for customer in customers]
+        self.headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity=user))}
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def post(self, url, payload):
+        response = self.app.post(url, json=payload, headers=self.headers)
+        return json.loads(response.data.decode())
+
+    def log_transaction(self, customer_id, total_price, amount_paid=0):
+        payload = {'customer_id': customer_id, 'product_name': 'Rice', 'product_description': None,
+                   'order_date': None, 'delivery_address': 'Lagos', 'delivery_date': None, 'rate': total_price,
+                   'number_of_items': 1, 'discount': 0, 'total_price': total_price, 'delivery_fee': 0,
+                   'invoice_link': None, 'receipt_link': None, 'amount_paid': amount_paid, 'due_date': None}
+        data = self.post('/transactions?action=LOG-TRANSACTION&response=delta', payload)['data']
+        return data['transaction']['transaction_id']
+
+    def summary(self, customer_id=None):
+        payload = {'customer_id': customer_id} if customer_id else {}
+        return self.post('/customer?action=FETCH-BALANCE-SUMMARY', payload)['data']
+
+    def test_summary_follows_writes(self):
+        ada, obi = self.customer_ids
+        first = self.log_transaction(ada, 100)
+        self.log_transaction(ada, 50, amount_paid=50)
+        third = self.log_transaction(obi, 200)
+        self.post('/transactions?action=UPDATE-TRANSACTION-INFO&response=delta',
+                  {'customer_id': ada, 'transaction_id': first, 'amount_paid': 100})
+        self.post('/transactions?action=DELETE-TRANSACTION&response=delta',
+                  {'customer_id': obi, 'transaction_id': third})
+
+        summary = self.summary(ada)
+        self.assertEqual(summary['total_payable'], 150)
+        self.assertEqual(summary['total_paid'], 150)
+        self.assertEqual(summary['outstanding'], 0)
+        self.assertEqual((summary['paid_count'], summary['pending_count']), (2, 0))
+
+        summary = self.summary()
+        self.assertEqual(summary['transaction_count'], 2)
+        self.assertEqual(self.summary(obi)['transaction_count'], 0)
+        self.assertEqual(ledger.rebuild_balance_summaries(check_only=True), [])
+
+    def test_rebuild_repairs_drift(self):
+        ada = self.customer_ids[0]
+        self.log_transaction(ada, 100)
+        CustomerBalance.query.filter_by(customer_id=ada).update({'outstanding': 5})
+        db.session.commit()
+        self.assertEqual(len(ledger.rebuild_balance_summaries(check_only=True)), 1)
+
+        result = app.test_cli_runner().invoke(args=['rebuild-balances'])
+        self.assertIn('1 corrected', result.output)
+        self.assertEqual(self.summary(ada)['outstanding'], 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import io
+import unittest
+from flask import json
+from flask_jwt_extended import create_access_token
+from myapp import app, db
+from myapp.models import User, Customer, Transaction, CustomerBalance
+from myapp.functions import ledger
+
+
+class TestBulkImport(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.batch_size = app.config['BULK_IMPORT_BATCH_SIZE']
+        app.config['BULK_IMPORT_BATCH_SIZE'] = 3
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        users = [User(email='test@example.com', password='password'), User(email='other@example.com', password='x')]
+        db.session.add_all(users)
+        db.session.commit()
+        customers = [Customer(first_name='Ada', phone_number='0800', user_id=users[0].id),
+                     Customer(first_name='Eve', phone_number='0801', user_id=users[1].id)]
+        db.session.add_all(customers)
+        db.session.commit()
+        self.customer_id, self.foreign_customer_id = customers[0].id, customers[1].id
+        self.headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity=users[0]))}
+
+    def tearDown(self):
+        app.config['BULK_IMPORT_BATCH_SIZE'] = self.batch_size
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def row(self, **overrides):
+        row = {'customer_id': self.customer_id, 'product_name': 'Rice', 'delivery_address': 'Lagos', 'rate': 10,
+               'number_of_items': 1, 'total_price': 10, 'delivery_fee': 0, 'amount_paid': 0,
+               'order_date': '2023-05-01 00:00:00'}
+        row.update(overrides)
+        return row
+
+    def test_json_import_reports_bad_rows(self):
+        rows = [self.row() for _ in range(7)]
+        rows[2] = self.row(customer_id=self.foreign_customer_id)
+        rows[4] = self.row(product_name=None)
+        rows[5] = self.row(order_date='yesterday')
+        rows.append(self.row(amount_paid=10))
+
+        response = self.app.post('/transactions?action=IMPORT-TRANSACTIONS', json={'transactions': rows},
+                                 headers=self.headers)
+        data = json.loads(response.data.decode())['data']
+        self.assertEqual(data['inserted'], 5)
+        self.assertEqual([error['row'] for error in data['errors']], [3, 5, 6])
+        self.assertEqual(Transaction.query.count(), 5)
+
+        balance = db.session.get(CustomerBalance, self.customer_id)
+        self.assertEqual((balance.transaction_count, balance.paid_count, balance.outstanding), (5, 1, 40))
+        self.assertEqual(ledger.rebuild_balance_summaries(check_only=True), [])
+
+    def test_csv_upload(self):
+        lines = ['product_name,delivery_address,rate,number_of_items,total_price,delivery_fee,discount,due_date']
+        lines += ['Beans,Abuja,5,2,10,1.5,,2024-01-01 00:00:00'] * 4
+        upload = {'file': (io.BytesIO('\n'.join(lines).encode()), 'ledger.csv'), 'customer_id': str(self.customer_id)}
+        response = self.app.post('/transactions?action=IMPORT-TRANSACTIONS', data=upload,
+                                 content_type='multipart/form-data', headers=self.headers)
+        data = json.loads(response.data.decode())
+        self.assertEqual(data['status'], 1)
+        self.assertEqual(data['data']['inserted'], 4)
+        self.assertEqual(Transaction.query.first().amount_payable, 11.5)
+
+    def test_ndjson_upload(self):
+        body = '\n'.join([json.dumps(self.row()), '{broken', json.dumps(self.row())])
+        upload = {'file': (io.BytesIO(body.encode()), 'ledger.ndjson')}
+        response = self.app.post('/transactions?action=IMPORT-TRANSACTIONS', data=upload,
+                                 content_type='multipart/form-data', headers=self.headers)
+        data = json.loads(response.data.decode())['data']
+        self.assertEqual((data['inserted'], data['failed']), (2, 1))
+
+    def upload_csv(self, body: bytes):
+        upload = {'file': (io.BytesIO(body), 'ledger.csv'), 'customer_id': str(self.customer_id)}
+        response = self.app.post('/transactions?action=IMPORT-TRANSACTIONS', data=upload,
+                                 content_type='multipart/form-data', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data.decode())
+
+    def assertStoppedAfterLastRow(self, data):
+        """ the report covers exactly what was saved, so a client can resume after last_row """
+        self.assertGreater(data['inserted'], 0)
+        self.assertEqual(data['inserted'], data['last_row'])
+        self.assertEqual(Transaction.query.count(), data['inserted'])
+        self.assertEqual(data['errors'][-1]['row'], data['last_row'] + 1)
+        self.assertIn('could not be read', data['errors'][-1]['error'])
+        self.assertEqual(ledger.rebuild_balance_summaries(check_only=True), [])
+
+    def test_upload_with_bad_utf8_reports_what_was_imported(self):
+        app.config['BULK_IMPORT_BATCH_SIZE'] = 500
+        lines = ['product_name,delivery_address,rate,number_of_items,total_price,delivery_fee']
+        lines += ['Beans,Abuja,5,2,10,1.5'] * 3000
+        data = self.upload_csv('\n'.join(lines).encode() + b'\nBeans,Ab\xffuja,5,2,10,1.5\n')
+        self.assertEqual(data['status'], 1)
+        self.assertStoppedAfterLastRow(data['data'])
+        self.assertLess(data['data']['last_row'], 3000)
+
+    def test_upload_with_an_oversized_field_reports_what_was_imported(self):
+        lines = ['product_name,delivery_address,rate,number_of_items,total_price,delivery_fee']
+        lines += ['Beans,Abuja,5,2,10,1.5'] * 10 + ['Beans,{},5,2,10,1.5'.format('x' * 200000)]
+        lines += ['Beans,Abuja,5,2,10,1.5'] * 10
+        data = self.upload_csv('\n'.join(lines).encode())
+        self.assertEqual(data['status'], 1)
+        self.assertStoppedAfterLastRow(data['data'])
+        self.assertEqual(data['data']['last_row'], 10)
+
+    def test_unsupported_upload_format(self):
+        upload = {'file': (io.BytesIO(b'{}'), 'ledger.xlsx')}
+        response = self.app.post('/transactions?action=IMPORT-TRANSACTIONS', data=upload,
+                                 content_type='multipart/form-data', headers=self.headers)
+        self.assertEqual(json.loads(response.data.decode())['status'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
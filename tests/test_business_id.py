@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from flask import json
+from myapp import app, db
+from myapp.models import User
+from myapp.functions import id_allocator
+from myapp.functions import resources as resource
+
+
+class TestBusinessIdAllocator(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_allocators_never_overlap(self):
+        # real worker processes sharing one database file; the in-memory test database
+        # is a single connection and cannot host concurrent transactions
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(directory, 'ids.db'))
+            root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+            def run(script):
+                return subprocess.Popen([sys.executable, '-c', 'from myapp import app, db\n' + script], cwd=root,
+                                        env=env, stdout=subprocess.PIPE, text=True)
+
+            run('with app.app_context(): db.create_all()').wait()
+            workers = [run('from myapp.functions import id_allocator\n'
+                           'with app.app_context():\n'
+                           '    allocator = id_allocator.BlockIdAllocator("test", block_size=7)\n'
+                           '    print(*[allocator.allocate() for _ in range(100)])') for _ in range(3)]
+            numbers = [int(number) for worker in workers for number in worker.communicate()[0].split()]
+            self.assertEqual(len(numbers), 300)
+            self.assertEqual(len(set(numbers)), 300)
+
+    def test_codes_are_unique_and_short(self):
+        samples = list(range(5000)) + [id_allocator.CODE_SPACE - 1, id_allocator.CODE_SPACE]
+        codes = [id_allocator.encode_number(number) for number in samples]
+        self.assertEqual(len(set(codes)), len(codes))
+        self.assertTrue(all(len(code) == 6 for code in codes[:-1]))
+        self.assertEqual(len(codes[-1]), 7)
+
+    def test_business_information_gets_business_id(self):
+        User.add_user({'email': 'test@example.com', 'password': 'TestPassword123#'})
+        user_id = User.query.first().id
+        payload = {'user_id': user_id, 'business_name': 'Ada & Sons Ltd.', 'business_phone': '0800',
+                   'business_email': None, 'business_type': 1}
+        response = self.app.post('/signup?action=REGISTER-USER-BUSINESS-INFORMATION', json=payload)
+        data = json.loads(response.data.decode())
+        self.assertEqual(data['status'], 1)
+        self.assertRegex(data['data']['business_id'], r'^adasonsltd_[0-9a-z]{6}$')
+        self.assertNotEqual(resource.generate_business_id('Ada & Sons Ltd.'), data['data']['business_id'])
+
+
+if __name__ == '__main__':
+    unittest.main()
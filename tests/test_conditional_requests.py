@@ -0,0 +1,101 @@
+import gzip
+import unittest
+from flask import json
+from flask_jwt_extended import create_access_token
+from myapp import app, db
+from myapp.models import User, Customer
+
+
+class TestConditionalRequests(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        user = User(email='test@example.com', password='password')
+        db.session.add(user)
+        db.session.commit()
+        customer = Customer(first_name='Ada', phone_number='0800000000', user_id=user.id)
+        db.session.add(customer)
+        db.session.commit()
+        self.customer_id = customer.id
+        self.headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity=user))}
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def fetch(self, action, payload=None, etag=None, **headers):
+        headers.update(self.headers)
+        if etag:
+            headers['If-None-Match'] = etag
+        return self.app.post('/customer?action={}'.format(action), json=payload or {}, headers=headers)
+
+    def log_transaction(self):
+        payload = {'customer_id': self.customer_id, 'product_name': 'Rice', 'order_date': '2024-01-01 10:00:00',
+                   'delivery_address': 'Lagos', 'rate': 50, 'number_of_items': 2, 'total_price': 100,
+                   'delivery_fee': 10}
+        response = self.app.post('/transactions?action=LOG-TRANSACTION&response=delta', json=payload,
+                                 headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+
+    def test_fetch_customers_not_modified_until_write(self):
+        response = self.fetch('FETCH-CUSTOMERS')
+        etag = response.headers['ETag']
+        self.assertEqual(response.status_code, 200)
+
+        response = self.fetch('FETCH-CUSTOMERS', etag=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+        customer = {'first_name': 'Bola', 'last_name': None, 'email': None, 'phone_number': '0801',
+                    'shipping_address': None}
+        self.assertEqual(self.fetch('ADD-CUSTOMER', customer).status_code, 200)
+        response = self.fetch('FETCH-CUSTOMERS', etag=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.data.decode())['data']), 2)
+
+        # a transaction bumps the customer's ledger_version, which FETCH-CUSTOMERS reports
+        etag = response.headers['ETag']
+        self.log_transaction()
+        self.assertEqual(self.fetch('FETCH-CUSTOMERS', etag=etag).status_code, 200)
+
+    def test_fetch_transactions_tag_follows_version_and_parameters(self):
+        payload = {'customer_id': self.customer_id}
+        etag = self.fetch('FETCH-CUSTOMER-TRANSACTIONS', payload).headers['ETag']
+        self.assertEqual(self.fetch('FETCH-CUSTOMER-TRANSACTIONS', payload, etag).status_code, 304)
+
+        filtered = {'customer_id': self.customer_id, 'payment_status': 'paid'}
+        self.assertEqual(self.fetch('FETCH-CUSTOMER-TRANSACTIONS', filtered, etag).status_code, 200)
+
+        self.log_transaction()
+        response = self.fetch('FETCH-CUSTOMER-TRANSACTIONS', payload, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.data.decode())['data']), 1)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_large_bodies_are_gzipped(self):
+        for _ in range(20):
+            self.log_transaction()
+        payload = {'customer_id': self.customer_id}
+
+        plain = self.fetch('FETCH-CUSTOMER-TRANSACTIONS', payload)
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertIn('Accept-Encoding', plain.headers['Vary'])
+
+        compressed = self.fetch('FETCH-CUSTOMER-TRANSACTIONS', payload, **{'Accept-Encoding': 'gzip'})
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertLess(len(compressed.data), len(plain.data))
+        self.assertEqual(gzip.decompress(compressed.data), plain.data)
+
+        small = self.fetch('FETCH-CUSTOMERS', **{'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', small.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
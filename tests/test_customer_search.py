@@ -0,0 +1,96 @@
+import unittest
+from flask import json
+from flask_jwt_extended import create_access_token
+from myapp import app, db
+from myapp.models import User, Customer
+from myapp.functions import search
+
+
+class TestCustomerSearch(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        users = [User(email='test@example.com', password='password'), User(email='other@example.com', password='x')]
+        db.session.add_all(users)
+        db.session.commit()
+        self.user_id = users[0].id
+        db.session.add_all([
+            Customer(first_name='Adaéze', last_name='Obi', email='adaeze@example.com', phone_number='0803 555 0101',
+                     shipping_address='12 Marina Road, Lagos', user_id=users[0].id),
+            Customer(first_name='Adamu', last_name='Bello', phone_number='0805 555 0102',
+                     shipping_address='4 Ahmadu Bello Way, Kaduna', user_id=users[0].id),
+            Customer(first_name='Chidi', last_name='Okafor', email='chidi@shop.ng', phone_number='0807 555 0103',
+                     user_id=users[0].id),
+            Customer(first_name='Ada', last_name='Stranger', phone_number='0809 555 0104', user_id=users[1].id),
+        ])
+        db.session.commit()
+        self.headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity=users[0]))}
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def search(self, query, **payload):
+        response = self.app.post('/customer?action=SEARCH-CUSTOMERS', json=dict(payload, query=query),
+                                 headers=self.headers)
+        data = json.loads(response.data.decode())
+        self.assertEqual(data['status'], 1, data)
+        return [customer['first_name'] for customer in data['data']]
+
+    def test_prefix_search_within_the_business(self):
+        self.assertEqual(sorted(self.search('ada')), ['Adamu', 'Adaéze'])
+        self.assertEqual(self.search('ADAE'), ['Adaéze'])
+        self.assertEqual(self.search('ada lag'), ['Adaéze'])
+        self.assertEqual(self.search('bello'), ['Adamu'])
+        self.assertEqual(self.search('shop.ng'), ['Chidi'])
+        self.assertEqual(self.search('0807'), ['Chidi'])
+        self.assertEqual(self.search('stranger'), [])
+        self.assertEqual(self.search('  '), [])
+        self.assertEqual(len(self.search('a', limit=1)), 1)
+
+    def test_query_syntax_is_not_interpreted(self):
+        for query in ('"ada', 'ada OR chidi', 'first_name:ada', 'NEAR(ada', 'ada*)', 'user_id:2'):
+            self.search(query)
+        self.assertEqual(self.search('ada OR chidi'), [])
+
+    def test_rejects_a_query_that_is_not_a_string(self):
+        for payload in ({'query': 123}, {'query': ['ada']}, {'query': 'ada', 'limit': 'ten'}):
+            response = self.app.post('/customer?action=SEARCH-CUSTOMERS', json=payload, headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.data.decode())['status'], 2)
+
+    def test_index_follows_writes(self):
+        customer = Customer.query.filter_by(first_name='Chidi').one()
+        customer.first_name = 'Chinedu'
+        db.session.commit()
+        self.assertEqual(self.search('chidi'), ['Chinedu'])  # the email still matches
+        self.assertEqual(self.search('chin'), ['Chinedu'])
+
+        # balance bookkeeping updates the customer row without reindexing it
+        Customer.query.filter_by(id=customer.id).update({'ledger_version': Customer.ledger_version + 1})
+        db.session.commit()
+        self.assertEqual(self.search('chin'), ['Chinedu'])
+
+        db.session.delete(customer)
+        db.session.commit()
+        self.assertEqual(self.search('chin'), [])
+
+        self.app.post('/customer?action=ADD-CUSTOMER', headers=self.headers,
+                      json={'first_name': 'Ngozi', 'last_name': 'Eze', 'email': None, 'phone_number': '0800',
+                            'shipping_address': None})
+        self.assertEqual(self.search('ngo'), ['Ngozi'])
+
+    def test_rebuild_index(self):
+        self.assertEqual(search.rebuild_index(), 4)
+        self.assertEqual(sorted(self.search('ada')), ['Adamu', 'Adaéze'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+from datetime import datetime, timedelta
+from flask import json
+from flask_jwt_extended import create_access_token
+from myapp import app, db
+from myapp.models import User, Customer, Transaction
+
+
+class TestFetchCustomerTransactions(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        # start from an empty schema even if an earlier test left rows behind
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        user = User(email='test@example.com', password='password')
+        db.session.add(user)
+        db.session.commit()
+        customer = Customer(first_name='Ada', phone_number='0800000000', user_id=user.id)
+        db.session.add(customer)
+        db.session.commit()
+        self.customer_id = customer.id
+
+        # ten invoices, one a day, every other one paid; the last one has no order date
+        start = datetime(2024, 1, 1)
+        for day in range(10):
+            paid = day % 2 == 0
+            db.session.add(Transaction(
+                customer_id=customer.id, product_name='Item {}'.format(day), delivery_address='Lagos',
+                order_date=start + timedelta(days=day) if day < 9 else None,
+                due_date=start + timedelta(days=day + 30), rate=100, number_of_items=1,
+                total_price=100, delivery_fee=0, amount_payable=100, amount_paid=100 if paid else 0,
+                remaining_balance=0 if paid else 100, payment_status='paid' if paid else 'pending'))
+        db.session.commit()
+
+        self.headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity=user))}
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def fetch(self, **params):
+        params['customer_id'] = self.customer_id
+        response = self.app.post('/customer?action=FETCH-CUSTOMER-TRANSACTIONS', json=params, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data.decode())
+
+    def test_unpaginated_fetch_returns_list(self):
+        data = self.fetch()
+        self.assertEqual(data['status'], 1)
+        self.assertEqual(len(data['data']), 10)
+
+    def test_pages_cover_every_transaction_once(self):
+        seen, cursor = [], None
+        while True:
+            data = self.fetch(limit=4, cursor=cursor)['data']
+            seen.extend(row['transaction_id'] for row in data['transactions'])
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 10)
+        self.assertEqual(len(set(seen)), 10)
+        # newest first and the undated transaction last
+        first_page = self.fetch(limit=2)['data']['transactions']
+        self.assertEqual(first_page[0]['order_date'], '2024-01-09 00:00:00')
+        self.assertIsNone(db.session.get(Transaction, seen[-1]).order_date)
+
+    def test_filters(self):
+        data = self.fetch(payment_status='pending')['data']
+        self.assertEqual(len(data), 5)
+        self.assertTrue(all(row['payment_status'] == 'pending' for row in data))
+
+        data = self.fetch(order_date_from='2024-01-03', order_date_to='2024-01-05 00:00:00')['data']
+        self.assertEqual(len(data), 3)
+
+        # a date-only upper bound takes in the whole of that day
+        db.session.add(Transaction(customer_id=self.customer_id, product_name='Late', delivery_address='Lagos',
+                                   order_date=datetime(2024, 1, 5, 15, 30), rate=100, number_of_items=1,
+                                   total_price=100, delivery_fee=0, amount_payable=100, amount_paid=0,
+                                   remaining_balance=100, payment_status='pending'))
+        db.session.commit()
+        data = self.fetch(order_date_from='2024-01-03', order_date_to='2024-01-05')['data']
+        self.assertEqual(len(data), 4)
+        self.assertEqual(len(self.fetch(order_date_to='2024-01-05 00:00:00')['data']), 5)
+
+        data = self.fetch(due_date_from='2024-02-05', limit=100)['data']
+        self.assertEqual(len(data['transactions']), 5)
+
+    def test_other_businesses_customers_are_not_found(self):
+        other = User(email='other@example.com', password='password')
+        db.session.add(other)
+        db.session.commit()
+        headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity=other))}
+        for params in ({}, {'limit': 2}, {'payment_status': 'pending'}):
+            response = self.app.post('/customer?action=FETCH-CUSTOMER-TRANSACTIONS', headers=headers,
+                                     json=dict(params, customer_id=self.customer_id))
+            data = json.loads(response.data.decode())
+            self.assertEqual((data['status'], data['message']), (2, 'Customer not found'))
+            self.assertNotIn('ETag', response.headers)
+
+    def test_invalid_cursor(self):
+        data = self.fetch(limit=2, cursor='not-a-cursor')
+        self.assertEqual(data['status'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import unittest
+from flask import json
+from flask_jwt_extended import create_access_token
+from myapp import app, db
+from myapp.models import User, Customer, Transaction, DocumentJob
+from myapp.functions import documents
+
+
+class TestDocuments(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        user = User(email='test@example.com', password='password', business_name='Ada & Sons')
+        other = User(email='other@example.com', password='password')
+        db.session.add_all([user, other])
+        db.session.commit()
+        customer = Customer(first_name='Bola', last_name='(B)', phone_number='0800000000', user_id=user.id)
+        db.session.add(customer)
+        db.session.commit()
+        transaction = Transaction(customer_id=customer.id, product_name='Rice', delivery_address='Lagos', rate=50,
+                                  number_of_items=2, total_price=100, delivery_fee=10, amount_payable=110,
+                                  amount_paid=0, remaining_balance=110, payment_status='pending',
+                                  product_description='long grain ' * 30)
+        db.session.add(transaction)
+        db.session.commit()
+        self.customer_id, self.transaction_id = customer.id, transaction.id
+        self.headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity=user))}
+        self.other_headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity=other))}
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def render(self, headers=None, **payload):
+        payload.setdefault('transaction_id', self.transaction_id)
+        response = self.app.post('/documents?action=RENDER-DOCUMENT', json=payload, headers=headers or self.headers)
+        return json.loads(response.data.decode())
+
+    def test_render_fills_link_and_serves_document(self):
+        data = self.render(kind='invoice', format='pdf')
+        self.assertEqual(data['status'], 1)
+        job = data['data']
+        self.assertEqual(job['status'], 'done')
+
+        transaction = db.session.get(Transaction, self.transaction_id)
+        self.assertEqual(transaction.invoice_link, job['link'])
+        self.assertEqual(transaction.customer.ledger_version, 1)
+
+        document = self.app.get(job['link'])
+        self.assertEqual(document.status_code, 200)
+        self.assertTrue(document.data.startswith(b'%PDF-1.4'))
+        self.assertTrue(document.data.rstrip().endswith(b'%%EOF'))
+        self.assertIn(b'Ada & Sons', document.data)
+        self.assertIn(b'Bola \\(B\\)', document.data)
+        document.close()
+
+        fetched = self.app.post('/documents?action=FETCH-DOCUMENT-JOB', json={'job_id': job['job_id']},
+                                headers=self.headers)
+        self.assertEqual(json.loads(fetched.data.decode())['data'], job)
+
+    def test_same_content_is_rendered_once(self):
+        first = self.render(kind='receipt', format='html')['data']
+        path = os.path.join(app.config['DOCUMENT_DIR'], os.path.basename(first['link']))
+        modified = os.path.getmtime(path)
+
+        second = self.render(kind='receipt', format='html')['data']
+        self.assertNotEqual(second['job_id'], first['job_id'])
+        self.assertEqual(second['link'], first['link'])
+        self.assertEqual(os.path.getmtime(path), modified)
+
+        # a payment changes what the receipt shows, so it gets a new document
+        self.app.post('/transactions?action=UPDATE-TRANSACTION-INFO&response=delta', headers=self.headers,
+                      json={'transaction_id': self.transaction_id, 'customer_id': self.customer_id, 'amount_paid': 10})
+        third = self.render(kind='receipt', format='html')['data']
+        self.assertNotEqual(third['link'], first['link'])
+        with open(os.path.join(app.config['DOCUMENT_DIR'], os.path.basename(third['link'])), 'rb') as html:
+            self.assertIn(b'100.00', html.read())
+
+    def test_render_requires_own_transaction_and_valid_kind(self):
+        self.assertEqual(self.render(self.other_headers)['message'], 'Transaction not found')
+        self.assertEqual(self.render(kind='quote')['status'], 2)
+        self.assertEqual(DocumentJob.query.count(), 0)
+
+    def test_queued_jobs_are_rendered_by_the_command(self):
+        job = DocumentJob(transaction_id=self.transaction_id, user_id=1, kind='invoice', file_format='html',
+                          content_hash='stale', link='/documents/stale.html')
+        db.session.add(job)
+        db.session.commit()
+
+        result = app.test_cli_runner().invoke(args=['render-documents'])
+        self.assertIn('1 document jobs processed.', result.output)
+        job = db.session.get(DocumentJob, job.id)
+        self.assertEqual(job.status, 'done')
+        self.assertTrue(os.path.exists(os.path.join(app.config['DOCUMENT_DIR'], os.path.basename(job.link))))
+
+    def test_pdf_spans_pages(self):
+        context = documents.document_context(1, self.transaction_id)
+        context['transaction']['product_description'] = 'word ' * 2000
+        pdf = documents.render_pdf('invoice', context)
+        self.assertGreater(pdf.count(b'/Type /Page '), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import csv
+import io
+import unittest
+from datetime import datetime
+from flask import json
+from flask_jwt_extended import create_access_token
+from myapp import app, db
+from myapp.models import User, Customer, Transaction
+
+
+class TestExportTransactions(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.batch_size = app.config['EXPORT_BATCH_SIZE']
+        app.config['EXPORT_BATCH_SIZE'] = 4
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        users = [User(email='test@example.com', password='password'), User(email='other@example.com', password='x')]
+        db.session.add_all(users)
+        db.session.commit()
+        for user, count in zip(users, (10, 3)):
+            customer = Customer(first_name='Ada', phone_number='0800', user_id=user.id)
+            db.session.add(customer)
+            db.session.commit()
+            for number in range(count):
+                db.session.add(Transaction(
+                    customer_id=customer.id, product_name='Item {}'.format(number), delivery_address='Lagos',
+                    rate=1, number_of_items=1, total_price=1, delivery_fee=0, amount_payable=1,
+                    remaining_balance=1, payment_status='pending', order_date=datetime(2024, 1, 1)))
+        db.session.commit()
+        self.headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity=users[0]))}
+
+    def tearDown(self):
+        app.config['EXPORT_BATCH_SIZE'] = self.batch_size
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_csv_export(self):
+        response = self.app.get('/export/transactions?format=csv', headers=self.headers)
+        self.assertTrue(response.is_streamed)
+        self.assertIn('attachment', response.headers['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(response.data.decode())))
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(rows[0]['order_date'], '2024-01-01 00:00:00')
+
+    def test_ndjson_export(self):
+        response = self.app.get('/export/transactions?format=ndjson', headers=self.headers)
+        lines = response.data.decode().splitlines()
+        self.assertEqual(len(lines), 10)
+        self.assertEqual(json.loads(lines[-1])['product_name'], 'Item 9')
+
+    def test_unknown_format(self):
+        response = self.app.get('/export/transactions?format=xlsx', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
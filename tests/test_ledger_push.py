@@ -0,0 +1,126 @@
+import unittest
+from flask_jwt_extended import create_access_token
+from myapp import app, db, socketio
+from myapp.models import User, Customer, Transaction
+from myapp.functions import ledger
+
+
+class TestLedgerPush(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        user = User(email='test@example.com', password='password')
+        other = User(email='other@example.com', password='password')
+        db.session.add_all([user, other])
+        db.session.commit()
+        customer = Customer(first_name='Ada', phone_number='0800000000', user_id=user.id)
+        foreign = Customer(first_name='Eze', phone_number='0800000001', user_id=other.id)
+        db.session.add_all([customer, foreign])
+        db.session.commit()
+        self.customer_id, self.foreign_id = customer.id, foreign.id
+        self.token = create_access_token(identity=user)
+        self.other_token = create_access_token(identity=other)
+        self.headers = {'Authorization': 'Bearer {}'.format(self.token)}
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            if client.is_connected('/ledger'):
+                client.disconnect('/ledger')
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def connect(self, token):
+        client = socketio.test_client(app, namespace='/ledger', auth={'token': token})
+        self.clients.append(client)
+        return client
+
+    def events(self, client):
+        return [(event['name'], event['args'][0]) for event in client.get_received('/ledger')]
+
+    def log_transaction(self, customer_id=None, headers=None):
+        payload = {'customer_id': customer_id or self.customer_id, 'product_name': 'Rice',
+                   'delivery_address': 'Lagos', 'rate': 50, 'number_of_items': 2, 'total_price': 100,
+                   'delivery_fee': 10}
+        response = self.app.post('/transactions?action=LOG-TRANSACTION&response=delta', json=payload,
+                                 headers=headers or self.headers)
+        return response.get_json(force=True)['data']
+
+    def test_connect_requires_valid_token(self):
+        self.assertFalse(self.connect('not-a-token').is_connected('/ledger'))
+        self.assertFalse(socketio.test_client(app, namespace='/ledger').is_connected('/ledger'))
+        self.assertTrue(self.connect(self.token).is_connected('/ledger'))
+
+    def test_transaction_events_reach_business_and_customer_rooms_once(self):
+        business = self.connect(self.token)
+        stranger = self.connect(self.other_token)
+        ack = business.emit('subscribe', {'customer_id': self.customer_id}, namespace='/ledger', callback=True)
+        self.assertEqual(ack['status'], 1)
+
+        data = self.log_transaction()
+        events = self.events(business)
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0][0], 'transaction_logged')
+        self.assertEqual(events[0][1]['transaction'], data['transaction'])
+        self.assertEqual(events[0][1]['ledger_version'], data['ledger_version'])
+        self.assertEqual(self.events(stranger), [])
+
+        transaction_id = data['transaction']['transaction_id']
+        self.app.post('/transactions?action=UPDATE-TRANSACTION-INFO&response=delta', headers=self.headers,
+                      json={'transaction_id': transaction_id, 'customer_id': self.customer_id, 'amount_paid': 110})
+        self.app.post('/transactions?action=DELETE-TRANSACTION&response=delta', headers=self.headers,
+                      json={'transaction_id': transaction_id, 'customer_id': self.customer_id})
+        events = self.events(business)
+        self.assertEqual([name for name, _ in events], ['transaction_updated', 'transaction_deleted'])
+        self.assertEqual(events[0][1]['transaction']['payment_status'], 'paid')
+        self.assertEqual(events[1][1], {'customer_id': self.customer_id, 'deleted_transaction_id': transaction_id,
+                                        'ledger_version': 3})
+
+    def test_subscribe_only_to_own_customers(self):
+        stranger = self.connect(self.other_token)
+        ack = stranger.emit('subscribe', {'customer_id': self.customer_id}, namespace='/ledger', callback=True)
+        self.assertEqual(ack['status'], 2)
+        self.log_transaction()
+        self.assertEqual(self.events(stranger), [])
+
+    def test_writes_to_foreign_customers_are_rejected(self):
+        business = self.connect(self.token)
+        victim = self.connect(self.other_token)
+        victim.emit('subscribe', {'customer_id': self.foreign_id}, namespace='/ledger', callback=True)
+        foreign_transaction = self.log_transaction(self.foreign_id, {'Authorization': 'Bearer ' + self.other_token})
+        transaction_id = foreign_transaction['transaction']['transaction_id']
+        self.events(victim)
+
+        response = self.app.post('/transactions?action=LOG-TRANSACTION&response=delta', headers=self.headers,
+                                 json={'customer_id': self.foreign_id, 'product_name': 'Rice',
+                                       'delivery_address': 'Lagos', 'rate': 50, 'number_of_items': 2,
+                                       'total_price': 100, 'delivery_fee': 10}).get_json(force=True)
+        self.assertEqual(response['status'], 2)
+        for action, payload in (('UPDATE-TRANSACTION-INFO', {'amount_paid': 110}), ('DELETE-TRANSACTION', {})):
+            response = self.app.post('/transactions?action={}&response=delta'.format(action), headers=self.headers,
+                                     json=dict(payload, transaction_id=transaction_id, customer_id=self.foreign_id))
+            self.assertEqual(response.get_json(force=True)['status'], 2)
+
+        self.assertEqual(self.events(business), [])
+        self.assertEqual(self.events(victim), [])
+        self.assertEqual(Transaction.query.filter_by(customer_id=self.foreign_id).count(), 1)
+        self.assertEqual(db.session.get(Transaction, transaction_id).amount_paid, 0)
+        self.assertEqual(ledger.fetch_ledger_version(self.foreign_id), foreign_transaction['ledger_version'])
+
+    def test_customer_added_event(self):
+        business = self.connect(self.token)
+        customer = {'first_name': 'Bola', 'last_name': None, 'email': None, 'phone_number': '0801',
+                    'shipping_address': None}
+        data = self.app.post('/customer?action=ADD-CUSTOMER', json=customer, headers=self.headers).get_json(force=True)
+        self.assertEqual(self.events(business), [('customer_added', {'customer': data['data']})])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+from flask import json
+from myapp import app, db
+from myapp.models import User
+
+
+class TestLoginHashing(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.hash_method = app.config['PASSWORD_HASH_METHOD']
+        app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        User.add_user({'email': 'test@example.com', 'password': 'TestPassword123#'})
+
+    def tearDown(self):
+        app.config['PASSWORD_HASH_METHOD'] = self.hash_method
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def login(self, password='TestPassword123#'):
+        response = self.app.post('/login', json={'email': 'test@example.com', 'password': password})
+        return json.loads(response.data.decode())
+
+    def test_successful_login(self):
+        data = self.login()
+        self.assertEqual(data['status'], 1)
+        self.assertIsNotNone(data['data']['access_token'])
+        self.assertEqual(data['data']['email'], 'test@example.com')
+
+    def test_wrong_password_and_blocked_user(self):
+        self.assertEqual(self.login('wrong')['message'], 'Password is incorrect.')
+        User.query.filter_by(email='test@example.com').update({'block_stat': 1})
+        db.session.commit()
+        self.assertEqual(self.login()['message'], 'Account is blocked. Pleased contact admin.')
+
+    def test_hash_is_upgraded_on_login(self):
+        app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+        self.assertEqual(self.login()['status'], 1)
+        stored = User.query.filter_by(email='test@example.com').first().password
+        self.assertTrue(stored.startswith('pbkdf2:sha256:2000$'))
+        self.assertEqual(self.login()['status'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import re
+import unittest
+from flask import json
+from flask_jwt_extended import create_access_token
+from myapp import app, db
+from myapp.models import User, Customer
+from myapp.functions import metrics
+
+
+def samples(text: str) -> dict:
+    """ parses the exposition format into {(metric, labels): value} """
+    found = {}
+    for line in text.splitlines():
+        match = re.match(r'(\w+)\{(.*)\} (\S+)$', line)
+        if match:
+            found[match.group(1), match.group(2)] = float(match.group(3))
+    return found
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        metrics.reset()
+
+        user = User(email='test@example.com', password='password')
+        db.session.add(user)
+        db.session.commit()
+        for number in range(3):
+            db.session.add(Customer(first_name='Customer {}'.format(number), phone_number='0800', user_id=user.id))
+        db.session.commit()
+        self.headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity=user))}
+        self.saved = {key: app.config[key] for key in ('METRICS_TOKEN', 'METRICS_SLOW_REQUEST_SECONDS',
+                                                       'METRICS_MAX_SERIES', 'COMPRESS_MIN_SIZE')}
+
+    def tearDown(self):
+        app.config.update(self.saved)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def scrape(self) -> dict:
+        response = self.app.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        return samples(response.data.decode())
+
+    def test_requests_labelled_by_route_and_action(self):
+        self.app.post('/customer?action=FETCH-CUSTOMERS', json={}, headers=self.headers)
+        self.app.post('/customer?action=FETCH-CUSTOMERS', json={}, headers=self.headers)
+        self.app.post('/customer?action=FETCH-BALANCE-SUMMARY', json={}, headers=self.headers)
+        self.app.get('/waitlist/fetch')
+
+        found = self.scrape()
+        fetch = 'method="POST",route="/customer",action="FETCH-CUSTOMERS",status="200"'
+        self.assertEqual(found['fundsflow_request_duration_seconds_count', fetch], 2)
+        self.assertEqual(found['fundsflow_request_duration_seconds_bucket', fetch + ',le="+Inf"'], 2)
+        self.assertEqual(found['fundsflow_response_size_bytes_count', fetch], 2)
+        self.assertGreater(found['fundsflow_response_size_bytes_sum', fetch], 0)
+        self.assertGreaterEqual(found['fundsflow_sql_statements_total', fetch], 2)
+        self.assertGreater(found['fundsflow_sql_duration_seconds_total', fetch], 0)
+
+        summary = 'method="POST",route="/customer",action="FETCH-BALANCE-SUMMARY",status="200"'
+        self.assertEqual(found['fundsflow_request_duration_seconds_count', summary], 1)
+        waitlist = 'method="GET",route="/waitlist/<string:query>",action="fetch",status="200"'
+        self.assertEqual(found['fundsflow_request_duration_seconds_count', waitlist], 1)
+
+    def test_response_size_is_bytes_sent(self):
+        app.config['COMPRESS_MIN_SIZE'] = 1
+        response = self.app.post('/customer?action=FETCH-CUSTOMERS', json={},
+                                 headers=dict(self.headers, **{'Accept-Encoding': 'gzip'}))
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+
+        labels = 'method="POST",route="/customer",action="FETCH-CUSTOMERS",status="200"'
+        self.assertEqual(self.scrape()['fundsflow_response_size_bytes_sum', labels], len(response.data))
+
+    def test_unknown_actions_do_not_add_series(self):
+        self.app.post('/customer?action=<script>', json={}, headers=self.headers)
+        app.config['METRICS_MAX_SERIES'] = 1
+        self.app.post('/customer?action=MADE-UP', json={}, headers=self.headers)
+
+        found = self.scrape()
+        other = 'method="POST",route="/customer",action="other",status="200"'
+        self.assertEqual(found['fundsflow_request_duration_seconds_count', other], 2)
+        self.assertFalse([key for key in found if 'MADE-UP' in key[1]])
+
+    def test_slow_requests_are_logged_with_their_sql(self):
+        app.config['METRICS_SLOW_REQUEST_SECONDS'] = 0
+        with self.assertLogs(app.logger, 'WARNING') as logs:
+            self.app.post('/customer?action=FETCH-CUSTOMERS', json={}, headers=self.headers)
+        self.assertIn('Slow request POST /customer action=FETCH-CUSTOMERS status=200', logs.output[0])
+        self.assertIn('FROM customer', logs.output[0])
+
+    def test_metrics_token(self):
+        app.config['METRICS_TOKEN'] = 'scrape-secret'
+        self.assertEqual(self.app.get('/metrics').status_code, 401)
+        self.assertEqual(self.app.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code, 401)
+        response = self.app.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_cache_stats_need_the_metrics_token(self):
+        app.config['METRICS_TOKEN'] = 'scrape-secret'
+        response = self.app.get('/stats/cache')
+        self.assertEqual((response.status_code, json.loads(response.data.decode())['status']), (401, 2))
+        self.assertEqual(self.app.get('/stats/cache', headers={'Authorization': 'Bearer wrong'}).status_code, 401)
+        response = self.app.get('/stats/cache', headers={'Authorization': 'Bearer scrape-secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('user_lookup', json.loads(response.data.decode())['data'])
+
+
+if __name__ == '__main__':
+    unittest.main()
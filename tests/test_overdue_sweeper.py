@@ -0,0 +1,180 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from flask_jwt_extended import create_access_token
+from myapp import app, db, socketio
+from myapp.models import User, Customer, Transaction, SweepMark
+from myapp.functions import ledger, overdue
+
+NOW = datetime(2024, 6, 1, 12, 0)
+
+
+class TestOverdueSweeper(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        user = User(email='test@example.com', password='password')
+        other = User(email='other@example.com', password='password')
+        db.session.add_all([user, other])
+        db.session.commit()
+        ada = Customer(first_name='Ada', phone_number='0800000000', user_id=user.id)
+        obi = Customer(first_name='Obi', phone_number='0800000001', user_id=user.id)
+        eze = Customer(first_name='Eze', phone_number='0800000002', user_id=other.id)
+        db.session.add_all([ada, obi, eze])
+        db.session.commit()
+        self.user_id = user.id
+        self.ada, self.obi, self.eze = ada.id, obi.id, eze.id
+        self.token = create_access_token(identity=user)
+        self.other_token = create_access_token(identity=other)
+        self.headers = {'Authorization': 'Bearer {}'.format(self.token)}
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            if client.is_connected('/ledger'):
+                client.disconnect('/ledger')
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_transaction(self, customer_id, due_date, remaining_balance=100):
+        """ stores a transaction the way LOG-TRANSACTION would before it fell due """
+        transaction = Transaction(customer_id=customer_id, product_name='Rice', delivery_address='Lagos', rate=100,
+                                  number_of_items=1, total_price=100, delivery_fee=0, amount_payable=100,
+                                  amount_paid=100 - remaining_balance, remaining_balance=remaining_balance,
+                                  due_date=due_date, payment_status='paid' if remaining_balance == 0 else 'pending')
+        db.session.add(transaction)
+        db.session.flush()
+        ledger.record_transaction_change(customer_id, after=ledger.balance_state(transaction))
+        db.session.commit()
+        return transaction.id
+
+    def statuses(self):
+        return dict(db.session.query(Transaction.id, Transaction.payment_status))
+
+    def test_marks_pending_transactions_past_due(self):
+        late = self.add_transaction(self.ada, NOW - timedelta(days=3))
+        paid = self.add_transaction(self.ada, NOW - timedelta(days=3), remaining_balance=0)
+        upcoming = self.add_transaction(self.obi, NOW + timedelta(days=3))
+        undated = self.add_transaction(self.obi, None)
+
+        self.assertEqual(overdue.sweep_overdue(NOW), 1)
+        self.assertEqual(self.statuses(), {late: 'overdue', paid: 'paid', upcoming: 'pending', undated: 'pending'})
+        self.assertEqual(db.session.get(SweepMark, overdue.SWEEP_NAME).high_water, NOW - timedelta(minutes=5))
+
+        summary = ledger.fetch_balance_summary(self.user_id)
+        self.assertEqual((summary['pending_count'], summary['overdue_count'], summary['paid_count']), (2, 1, 1))
+        self.assertEqual(ledger.rebuild_balance_summaries(check_only=True), [])
+
+    def test_runs_are_incremental_and_idempotent(self):
+        first = self.add_transaction(self.ada, NOW - timedelta(days=1))
+        second = self.add_transaction(self.ada, NOW + timedelta(hours=1))
+        self.assertEqual(overdue.sweep_overdue(NOW), 1)
+        version = ledger.fetch_ledger_version(self.ada)
+
+        self.assertEqual(overdue.sweep_overdue(NOW), 0)
+        self.assertEqual(ledger.fetch_ledger_version(self.ada), version)
+
+        later = NOW + timedelta(hours=2)
+        self.assertEqual(overdue.sweep_overdue(later), 1)
+        self.assertEqual(self.statuses(), {first: 'overdue', second: 'overdue'})
+        self.assertEqual(ledger.fetch_balance_summary(self.user_id)['overdue_count'], 2)
+
+    def test_sweeps_in_batches_without_skipping_ties(self):
+        due_dates = [NOW - timedelta(days=day) for day in (5, 4, 4, 4, 2, 1)]
+        for due_date in due_dates:
+            self.add_transaction(self.ada, due_date)
+        with mock.patch.object(overdue, 'sweep_batch', wraps=overdue.sweep_batch) as sweep_batch:
+            self.assertEqual(overdue.sweep_overdue(NOW, batch_size=2), len(due_dates))
+        # (5, 4, 4, 4), (2, 1) and the empty tail up to NOW
+        self.assertEqual(sweep_batch.call_count, 3)
+        self.assertEqual(set(self.statuses().values()), {'overdue'})
+
+    def test_reads_only_due_dates_after_the_mark(self):
+        self.add_transaction(self.ada, NOW - timedelta(days=1))
+        overdue.sweep_overdue(NOW)
+        # a transaction left pending behind the mark is not looked at again
+        stale = self.add_transaction(self.obi, NOW - timedelta(days=2))
+        self.assertEqual(overdue.sweep_overdue(NOW + timedelta(days=1)), 0)
+        self.assertEqual(self.statuses()[stale], 'pending')
+
+    def test_sweeps_a_pending_transaction_committed_after_the_sweep(self):
+        overdue.sweep_overdue(NOW)
+        # a LOG-TRANSACTION that judged this pending a moment before NOW, and committed after the sweep
+        late_commit = self.add_transaction(self.ada, NOW - timedelta(seconds=30))
+        self.assertEqual(overdue.sweep_overdue(NOW + timedelta(minutes=1)), 1)
+        self.assertEqual(self.statuses()[late_commit], 'overdue')
+        self.assertEqual(ledger.rebuild_balance_summaries(check_only=True), [])
+
+    def test_backs_off_when_another_sweeper_moved_the_mark(self):
+        self.add_transaction(self.ada, NOW - timedelta(days=1))
+        overdue.fetch_mark()
+        real_fetch = overdue.fetch_mark
+        calls = []
+
+        def fetch_then_lose_the_race():
+            high_water = real_fetch()
+            if not calls:
+                # another worker sweeps between our read of the mark and our compare-and-set
+                db.session.query(SweepMark).update({'high_water': NOW})
+                db.session.commit()
+            calls.append(high_water)
+            return high_water
+
+        with mock.patch.object(overdue, 'fetch_mark', fetch_then_lose_the_race):
+            high_water, affected = overdue.sweep_batch(NOW, 100)
+        self.assertIsNone(affected)
+        self.assertEqual(high_water, NOW)
+        self.assertEqual(set(self.statuses().values()), {'pending'})
+
+    def test_one_event_per_affected_business(self):
+        business = socketio.test_client(app, namespace='/ledger', auth={'token': self.token})
+        stranger = socketio.test_client(app, namespace='/ledger', auth={'token': self.other_token})
+        self.clients.extend([business, stranger])
+        business.emit('subscribe', {'customer_id': self.ada}, namespace='/ledger', callback=True)
+
+        ada_ids = [self.add_transaction(self.ada, NOW - timedelta(days=day)) for day in (1, 2)]
+        obi_id = self.add_transaction(self.obi, NOW - timedelta(days=1))
+        eze_id = self.add_transaction(self.eze, NOW - timedelta(days=1))
+        overdue.sweep_overdue(NOW)
+
+        events = business.get_received('/ledger')
+        self.assertEqual([event['name'] for event in events], ['transactions_overdue'])
+        customers = {customer['customer_id']: customer for customer in events[0]['args'][0]['customers']}
+        self.assertEqual(set(customers), {self.ada, self.obi})
+        self.assertEqual(sorted(customers[self.ada]['transaction_ids']), sorted(ada_ids))
+        self.assertEqual(customers[self.obi]['transaction_ids'], [obi_id])
+        self.assertEqual(customers[self.ada]['ledger_version'], ledger.fetch_ledger_version(self.ada))
+
+        events = stranger.get_received('/ledger')
+        self.assertEqual([event['args'][0]['customers'][0]['transaction_ids'] for event in events], [[eze_id]])
+
+    def test_writes_keep_overdue_status(self):
+        past = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
+        payload = {'customer_id': self.ada, 'product_name': 'Rice', 'delivery_address': 'Lagos', 'rate': 50,
+                   'number_of_items': 2, 'total_price': 100, 'delivery_fee': 0, 'due_date': past}
+        response = self.app.post('/transactions?action=LOG-TRANSACTION&response=delta', json=payload,
+                                 headers=self.headers)
+        transaction = response.get_json(force=True)['data']['transaction']
+        self.assertEqual(transaction['payment_status'], 'overdue')
+
+        update = {'customer_id': self.ada, 'transaction_id': transaction['transaction_id'], 'amount_paid': 40}
+        response = self.app.post('/transactions?action=UPDATE-TRANSACTION-INFO&response=delta', json=update,
+                                 headers=self.headers)
+        self.assertEqual(response.get_json(force=True)['data']['transaction']['payment_status'], 'overdue')
+
+        update['amount_paid'] = 60
+        response = self.app.post('/transactions?action=UPDATE-TRANSACTION-INFO&response=delta', json=update,
+                                 headers=self.headers)
+        self.assertEqual(response.get_json(force=True)['data']['transaction']['payment_status'], 'paid')
+        self.assertEqual(ledger.rebuild_balance_summaries(check_only=True), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
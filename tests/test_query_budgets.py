@@ -0,0 +1,231 @@
+import unittest
+from flask import json
+from flask_jwt_extended import create_access_token, create_refresh_token
+from myapp import app, db
+from myapp.models import User, Customer, Transaction, Settings, WaitList
+from myapp.functions import user_cache
+from tests.query_budget import QueryBudgetMixin, QueryCounter, query_budget
+
+# the most SQL statements one request of each route and action may run, with warm user
+# and token caches. A budget going up is a regression unless the route really needs more
+BUDGETS = {
+    ('/', None): 0,
+    ('/refresh', None): 0,
+    ('/stats/cache', None): 0,
+    ('/metrics', None): 0,
+    ('/test', None): 0,
+    ('/signup', 'SIGNUP-USER'): 3,
+    ('/signup', 'REGISTER-USER-PERSONAL-INFORMATION'): 3,
+    ('/signup', 'REGISTER-USER-BUSINESS-INFORMATION'): 7,
+    ('/login', None): 1,
+    ('/logout', None): 2,
+    ('/customer', 'ADD-CUSTOMER'): 4,
+    ('/customer', 'FETCH-CUSTOMERS'): 2,
+    ('/customer', 'FETCH-CUSTOMER-TRANSACTIONS'): 3,
+    ('/customer', 'SEARCH-CUSTOMERS'): 1,
+    ('/customer', 'FETCH-BALANCE-SUMMARY'): 2,
+    ('/transactions', 'LOG-TRANSACTION'): 9,
+    ('/transactions', 'UPDATE-TRANSACTION-INFO'): 9,
+    ('/transactions', 'DELETE-TRANSACTION'): 8,
+    ('/transactions', 'IMPORT-TRANSACTIONS'): 7,
+    ('/export/transactions', None): 1,
+    ('/reports', 'AGING-REPORT'): 3,
+    ('/documents', 'RENDER-DOCUMENT'): 12,  # rendered inline, as DOCUMENT_WORKERS is 0 in tests
+    ('/documents', 'FETCH-DOCUMENT-JOB'): 1,
+    ('/documents/<string:filename>', None): 0,
+    ('/settings', None): 1,
+    ('/user', None): 1,
+    ('/waitlist/<string:query>', 'fetch'): 1,
+    ('/waitlist/<string:query>', 'add'): 3,
+    ('/waitlist/<string:query>', 'remove'): 1,
+}
+
+TRANSACTION = {'product_name': 'Rice', 'order_date': '2024-01-01 10:00:00', 'delivery_address': 'Lagos', 'rate': 50,
+               'number_of_items': 2, 'total_price': 100, 'delivery_fee': 10}
+
+
+class TestQueryBudgets(QueryBudgetMixin, unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.saved = {key: app.config[key] for key in ('PASSWORD_HASH_METHOD', 'JWT_BLOCKLIST_SYNC_SECONDS')}
+        app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+        # a sync of the token blocklist would land in whichever request happens to be due
+        app.config['JWT_BLOCKLIST_SYNC_SECONDS'] = 3600
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        user_cache.get_cache().clear()
+
+        # enough rows that a lazy load inside a loop shows up as a repeated statement
+        User.add_user({'email': 'test@example.com', 'password': 'TestPassword123#'})
+        user = User.query.filter_by(email='test@example.com').one()
+        self.user_id = user.id
+        customers = [Customer(first_name='Customer {}'.format(number), phone_number='0800', user_id=user.id)
+                     for number in range(4)]
+        db.session.add_all(customers)
+        db.session.commit()
+        self.customer_id = customers[0].id
+        for customer in customers:
+            for _ in range(3):
+                self.post('/transactions?action=LOG-TRANSACTION&response=delta',
+                          dict(TRANSACTION, customer_id=customer.id), headers=self.auth(user))
+        self.transaction_id = Transaction.query.filter_by(customer_id=self.customer_id).first().id
+        db.session.add_all([Settings(user_id=user.id, template_mode='dark'),
+                            WaitList(name='ada', email='ada@example.com', phone='0800', business_type='retail')])
+        db.session.commit()
+        self.headers = self.auth(user)
+        self.refresh_headers = {'Authorization': 'Bearer {}'.format(create_refresh_token(identity=user))}
+        # warm the user snapshot cache and the token blocklist
+        self.post('/customer?action=FETCH-BALANCE-SUMMARY', {}, headers=self.headers)
+
+    def tearDown(self):
+        app.config.update(self.saved)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    @staticmethod
+    def auth(user) -> dict:
+        return {'Authorization': 'Bearer {}'.format(create_access_token(identity=user))}
+
+    def post(self, url, payload, **kwargs):
+        response = self.app.post(url, json=payload, **kwargs)
+        self.assertLess(response.status_code, 400, response.data)
+        return response
+
+    def within_budget(self, route, action, call):
+        """ runs call() under the budget of (route, action) and returns its response """
+        with self.assertQueryBudget(BUDGETS[route, action]):
+            response = call()
+        self.assertLess(response.status_code, 400, response.data)
+        return response
+
+    @staticmethod
+    def envelope(response) -> dict:
+        return json.loads(response.data.decode())
+
+    def test_every_endpoint_has_a_budget(self):
+        budgeted = {route for route, _ in BUDGETS}
+        routes = {rule.rule for rule in app.url_map.iter_rules() if rule.endpoint != 'static'}
+        self.assertEqual(routes - budgeted, set())
+
+    def test_detects_lazy_loads_in_a_loop(self):
+        with self.assertRaises(AssertionError) as failure:
+            with self.assertQueryBudget(20):
+                user = db.session.get(User, self.user_id)
+                [len(customer.transactions) for customer in user.customers]
+        self.assertIn('possible N+1', str(failure.exception))
+
+    @query_budget(0)
+    def test_static_routes(self):
+        for route in ('/', '/stats/cache', '/metrics', '/test'):
+            self.assertEqual(self.app.get(route).status_code, 200)
+        self.post('/refresh', {}, headers=self.refresh_headers)
+
+    def test_signup(self):
+        data = self.envelope(self.within_budget('/signup', 'SIGNUP-USER', lambda: self.post(
+            '/signup?action=SIGNUP-USER', {'email': 'new@example.com', 'password': 'TestPassword123#'})))
+        user_id = data['data']['user_id']
+        self.within_budget('/signup', 'REGISTER-USER-PERSONAL-INFORMATION', lambda: self.post(
+            '/signup?action=REGISTER-USER-PERSONAL-INFORMATION',
+            {'user_id': user_id, 'first_name': 'ada', 'last_name': 'obi', 'phone': '0800'}))
+        self.within_budget('/signup', 'REGISTER-USER-BUSINESS-INFORMATION', lambda: self.post(
+            '/signup?action=REGISTER-USER-BUSINESS-INFORMATION',
+            {'user_id': user_id, 'business_name': 'Ada Stores', 'business_phone': None, 'business_email': None,
+             'business_type': 'retail'}))
+
+    def test_login_and_logout(self):
+        data = self.envelope(self.within_budget('/login', None, lambda: self.post(
+            '/login', {'email': 'test@example.com', 'password': 'TestPassword123#'})))
+        self.assertEqual(data['status'], 1)
+        headers = {'Authorization': 'Bearer {}'.format(data['data']['access_token'])}
+        self.within_budget('/logout', None, lambda: self.post('/logout', {}, headers=headers))
+
+    def test_customer_actions(self):
+        self.within_budget('/customer', 'ADD-CUSTOMER', lambda: self.post(
+            '/customer?action=ADD-CUSTOMER', {'first_name': 'Eve', 'last_name': 'Obi', 'email': 'eve@example.com',
+                                              'phone_number': '0801', 'shipping_address': 'Abuja'},
+            headers=self.headers))
+        data = self.envelope(self.within_budget('/customer', 'FETCH-CUSTOMERS', lambda: self.post(
+            '/customer?action=FETCH-CUSTOMERS', {}, headers=self.headers)))
+        self.assertEqual(len(data['data']), 5)
+        for payload in ({'customer_id': self.customer_id}, {'customer_id': self.customer_id, 'limit': 2}):
+            self.within_budget('/customer', 'FETCH-CUSTOMER-TRANSACTIONS', lambda: self.post(
+                '/customer?action=FETCH-CUSTOMER-TRANSACTIONS', payload, headers=self.headers))
+        data = self.envelope(self.within_budget('/customer', 'SEARCH-CUSTOMERS', lambda: self.post(
+            '/customer?action=SEARCH-CUSTOMERS', {'query': 'cust'}, headers=self.headers)))
+        self.assertEqual(len(data['data']), 4)
+        for payload in ({}, {'customer_id': self.customer_id}):
+            self.within_budget('/customer', 'FETCH-BALANCE-SUMMARY', lambda: self.post(
+                '/customer?action=FETCH-BALANCE-SUMMARY', payload, headers=self.headers))
+
+    def test_transaction_actions(self):
+        for response in ('', '&response=delta'):
+            self.within_budget('/transactions', 'LOG-TRANSACTION', lambda: self.post(
+                '/transactions?action=LOG-TRANSACTION' + response, dict(TRANSACTION, customer_id=self.customer_id),
+                headers=self.headers))
+            self.within_budget('/transactions', 'UPDATE-TRANSACTION-INFO', lambda: self.post(
+                '/transactions?action=UPDATE-TRANSACTION-INFO' + response,
+                {'customer_id': self.customer_id, 'transaction_id': self.transaction_id, 'amount_paid': 10},
+                headers=self.headers))
+        transaction_ids = [row.id for row in Transaction.query.filter_by(customer_id=self.customer_id)]
+        for response, transaction_id in zip(('', '&response=delta'), transaction_ids):
+            self.within_budget('/transactions', 'DELETE-TRANSACTION', lambda: self.post(
+                '/transactions?action=DELETE-TRANSACTION' + response,
+                {'customer_id': self.customer_id, 'transaction_id': transaction_id}, headers=self.headers))
+
+        rows = [dict(TRANSACTION, customer_id=self.customer_id, amount_paid=0) for _ in range(20)]
+        data = self.envelope(self.within_budget('/transactions', 'IMPORT-TRANSACTIONS', lambda: self.post(
+            '/transactions?action=IMPORT-TRANSACTIONS', {'transactions': rows}, headers=self.headers)))
+        self.assertEqual(data['data']['inserted'], 20)
+
+    def test_export(self):
+        for file_format in ('csv', 'ndjson'):
+            response = self.within_budget('/export/transactions', None, lambda: self.app.get(
+                '/export/transactions?format={}'.format(file_format), headers=self.headers))
+            self.assertEqual(len(response.data.decode().strip().splitlines()), 12 + (file_format == 'csv'))
+
+    def test_reports(self):
+        for payload in ({}, {'fresh': True}):
+            self.within_budget('/reports', 'AGING-REPORT', lambda: self.post(
+                '/reports?action=AGING-REPORT', payload, headers=self.headers))
+
+    def test_documents(self):
+        data = self.envelope(self.within_budget('/documents', 'RENDER-DOCUMENT', lambda: self.post(
+            '/documents?action=RENDER-DOCUMENT', {'transaction_id': self.transaction_id}, headers=self.headers)))
+        self.within_budget('/documents', 'FETCH-DOCUMENT-JOB', lambda: self.post(
+            '/documents?action=FETCH-DOCUMENT-JOB', {'job_id': data['data']['job_id']}, headers=self.headers))
+        self.within_budget('/documents/<string:filename>', None, lambda: self.app.get(data['data']['link']))
+
+    def test_settings(self):
+        self.within_budget('/settings', None, lambda: self.post('/settings', {'user_id': self.user_id}))
+
+    @unittest.expectedFailure
+    def test_save_user_info(self):
+        # /user builds a User with a business_address it no longer has, and without a password
+        self.within_budget('/user', None, lambda: self.post('/user', {'email': 'saved@example.com',
+                                                                      'password': 'x'}))
+
+    def test_waitlist(self):
+        for url in ('/waitlist/fetch', '/waitlist/fetch?limit=10', '/waitlist/fetch?format=ndjson'):
+            self.within_budget('/waitlist/<string:query>', 'fetch', lambda: self.app.get(url))
+        data = self.envelope(self.within_budget('/waitlist/<string:query>', 'add', lambda: self.post(
+            '/waitlist/add', {'name': 'eve', 'email': 'eve@example.com', 'phone': '0801', 'business_type': 'retail',
+                              'reason': None})))
+        self.within_budget('/waitlist/<string:query>', 'remove', lambda: self.app.delete(
+            '/waitlist/remove', json={'wid': data['data']['wid']}))
+
+    def test_counts_statements_on_every_bind(self):
+        # the waitlist has a database of its own, which the budgets must see too
+        with QueryCounter() as counter:
+            self.app.get('/waitlist/fetch')
+        self.assertIn(db.engines['waitlist'], counter.engines)
+        self.assertGreater(counter.count, 0)
+        self.assertTrue(all('wait_list' in statement for statement in counter.statements), counter.report())
+
+
+if __name__ == '__main__':
+    unittest.main()
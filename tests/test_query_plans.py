@@ -0,0 +1,113 @@
+import unittest
+from datetime import datetime
+from sqlalchemy import event
+from flask_jwt_extended import create_access_token
+from myapp import app, db
+from myapp.models import User, Customer, Transaction, Settings, WaitList
+from myapp.functions import resources as resource
+from myapp.functions import reports
+
+
+class TestQueryPlans(unittest.TestCase):
+    """
+    Runs the hot read paths, captures the SQL they issue and fails if SQLite
+    plans any of it as a full table scan.
+    """
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        user = User(email='test@example.com', password='password')
+        db.session.add(user)
+        db.session.commit()
+        customer = Customer(first_name='Ada', phone_number='0800', user_id=user.id)
+        db.session.add_all([customer, Settings(user_id=user.id, template_mode='dark'),
+                            WaitList(name='Ada', email='ada@example.com', phone='0800')])
+        db.session.commit()
+        db.session.add(Transaction(customer_id=customer.id, product_name='Rice', delivery_address='Lagos', rate=1,
+                                   number_of_items=1, total_price=1, delivery_fee=0, amount_payable=1,
+                                   remaining_balance=1, payment_status='pending', order_date=datetime(2024, 1, 1),
+                                   due_date=datetime(2024, 2, 1)))
+        db.session.commit()
+        self.user_id, self.customer_id = user.id, customer.id
+        self.headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity=user))}
+
+        # the waitlist has a database of its own: capture the statements of every bind
+        self.statements = []
+        self.engines = set(db.engines.values())
+        for engine in self.engines:
+            event.listen(engine, 'before_cursor_execute', self.capture)
+
+    def tearDown(self):
+        for engine in self.engines:
+            event.remove(engine, 'before_cursor_execute', self.capture)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def capture(self, connection, _cursor, statement, parameters, _context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            self.statements.append((connection.engine, statement, parameters))
+
+    def assertNoFullScans(self, *tables):
+        """ EXPLAINs every captured statement on its own engine; tables must each appear in one of them """
+        self.assertTrue(self.statements, 'no statements captured')
+        for table in tables:
+            self.assertTrue(any(table in statement for _, statement, _ in self.statements),
+                            'no statement on {} captured'.format(table))
+        for engine, statement, parameters in self.statements:
+            connection = engine.raw_connection()
+            try:
+                plan = connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+            finally:
+                connection.close()
+            scans = [row[3] for row in plan if row[3].startswith('SCAN ') and 'COVERING INDEX' not in row[3]]
+            self.assertEqual(scans, [], 'full scan in:\n{}\nplan: {}'.format(statement, plan))
+        self.statements.clear()
+
+    def post(self, url, payload):
+        response = self.app.post(url, json=payload, headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.data)
+
+    def test_customer_lookups(self):
+        resource.fetch_customer_info(self.user_id)
+        resource.fetch_customer_info(self.user_id, self.customer_id)
+        self.post('/customer?action=FETCH-BALANCE-SUMMARY', {'customer_id': self.customer_id})
+        self.assertNoFullScans()
+
+    def test_transaction_lookups(self):
+        resource.fetch_customer_transactions(self.customer_id, {'payment_status': 'pending'})
+        page = resource.fetch_customer_transactions_page(self.customer_id, 1, filters={'due_date_from': '2024-01-01'})
+        resource.fetch_customer_transactions_page(self.customer_id, 1, resource.myfunc.encode_cursor(
+            datetime(2024, 1, 1), 99))
+        self.assertIsNotNone(page)
+        self.post('/transactions?action=UPDATE-TRANSACTION-INFO&response=delta',
+                  {'customer_id': self.customer_id, 'transaction_id': 1, 'amount_paid': 0})
+        self.assertNoFullScans()
+
+    def test_due_date_lookups(self):
+        Transaction.query.filter(Transaction.due_date <= datetime(2024, 3, 1),
+                                 Transaction.payment_status == 'pending').all()
+        reports.compute_aging(datetime(2024, 3, 1).date(), self.user_id)
+        self.assertNoFullScans()
+
+    def test_export_join(self):
+        self.app.get('/export/transactions?format=ndjson', headers=self.headers).get_data()
+        self.assertNoFullScans()
+
+    def test_settings_and_waitlist_lookups(self):
+        self.app.post('/settings', json={'user_id': self.user_id})
+        self.app.post('/waitlist/add', json={'name': 'Obi', 'email': 'obi@example.com', 'phone': '0801',
+                                             'business_type': None, 'reason': None})
+        self.app.get('/waitlist/fetch?limit=10&cursor={}'.format(resource.myfunc.encode_cursor(0)))
+        self.assertNoFullScans('settings', 'wait_list')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import multiprocessing
+import os
+import tempfile
+import unittest
+from flask import json
+from myapp import app, db
+from myapp.functions import ratelimit
+
+
+def drain(path, key):
+    store = ratelimit.TokenBucketStore(path, 64)
+    for _ in range(3):
+        store.take(key, 1.0, 3, now=1000.0)
+
+
+class TestRateLimit(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.saved = {key: app.config[key] for key in ('RATELIMIT_ENABLED', 'RATELIMIT_STORE_PATH',
+                                                       'RATELIMIT_RULES')}
+        app.config.update(RATELIMIT_ENABLED=True, RATELIMIT_STORE_PATH=os.path.join(self.directory.name, 'buckets'),
+                          RATELIMIT_RULES={'login': {'ip': '3/minute', 'email': '2/minute'},
+                                           'waitlist_add': {'ip': '1/minute'}})
+
+    def tearDown(self):
+        app.config.update(self.saved)
+        self.directory.cleanup()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_bucket_refills_at_rate(self):
+        store = ratelimit.TokenBucketStore(os.path.join(self.directory.name, 'unit'), 64)
+        self.assertEqual([store.take('k', 1.0, 3, now=100.0) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(store.take('k', 1.0, 3, now=100.0), 1.0)
+        self.assertAlmostEqual(store.take('k', 1.0, 3, now=100.5), 0.5)
+        self.assertEqual(store.take('k', 1.0, 3, now=101.0), 0)
+        self.assertEqual(store.take('other', 1.0, 3, now=101.0), 0)
+
+    def test_buckets_are_shared_between_processes(self):
+        path = os.path.join(self.directory.name, 'shared')
+        store = ratelimit.TokenBucketStore(path, 64)
+        self.assertEqual(store.take('warm-up', 1.0, 3, now=1000.0), 0)
+
+        child = multiprocessing.get_context('fork').Process(target=drain, args=(path, 'client'))
+        child.start()
+        child.join()
+        self.assertGreater(store.take('client', 1.0, 3, now=1000.0), 0)
+
+    def test_full_table_reuses_oldest_slot(self):
+        store = ratelimit.TokenBucketStore(os.path.join(self.directory.name, 'small'), 4)
+        for number in range(20):
+            self.assertEqual(store.take('key{}'.format(number), 1.0, 1, now=float(number)), 0)
+        self.assertEqual(store.take('key19', 1.0, 1, now=19.0), 1.0)
+
+    def login(self, email, ip='10.0.0.1'):
+        return self.app.post('/login', json={'email': email, 'password': 'wrong'},
+                             environ_base={'REMOTE_ADDR': ip})
+
+    def test_login_limited_by_ip_and_email(self):
+        self.assertEqual([self.login('a@example.com').status_code for _ in range(2)], [200, 200])
+        response = self.login('a@example.com')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+        self.assertEqual(json.loads(response.data.decode())['status'], 2)
+
+        # the same email from another address is still limited, another email is not
+        self.assertEqual(self.login('a@example.com', ip='10.0.0.2').status_code, 429)
+        self.assertEqual(self.login('b@example.com', ip='10.0.0.2').status_code, 200)
+        # and the first address has used up its own limit
+        self.assertEqual(self.login('c@example.com').status_code, 429)
+
+        app.config['RATELIMIT_ENABLED'] = False
+        self.assertEqual(self.login('a@example.com').status_code, 200)
+
+    def test_only_waitlist_add_is_limited(self):
+        entry = {'name': 'ada', 'email': 'ada@example.com', 'phone': '0800', 'business_type': 'retail',
+                 'reason': None}
+        self.assertEqual(self.app.post('/waitlist/add', json=entry).status_code, 201)
+        self.assertEqual(self.app.post('/waitlist/add', json=entry).status_code, 429)
+        self.assertEqual(self.app.get('/waitlist/fetch').status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
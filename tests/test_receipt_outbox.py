@@ -0,0 +1,168 @@
+import socket
+import socketserver
+import threading
+import unittest
+from datetime import timedelta
+from email import message_from_bytes
+from flask_jwt_extended import create_access_token
+from myapp import app, db
+from myapp.models import User, Customer, ReceiptOutbox
+from myapp.functions import outbox
+from myapp.functions.blocklist import utcnow
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """ a minimal local SMTP server that keeps what it receives. recipients containing
+        'bounce' are refused with 550 and those containing 'later' with 451 """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPSinkHandler)
+        self.messages, self.connections = [], 0
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 sink ESMTP')
+        while True:
+            line = self.rfile.readline().decode().strip()
+            command = line[:4].upper()
+            if not line or command == 'QUIT':
+                self.reply('221 bye')
+                return
+            if command == 'RCPT' and 'bounce' in line:
+                self.reply('550 no such user')
+            elif command == 'RCPT' and 'later' in line:
+                self.reply('451 try again later')
+            elif command == 'DATA':
+                self.reply('354 go ahead')
+                data = b''
+                while True:
+                    chunk = self.rfile.readline()
+                    if chunk in (b'.\r\n', b''):
+                        break
+                    data += chunk
+                self.server.messages.append(message_from_bytes(data))
+                self.reply('250 queued')
+            else:
+                self.reply('250 ok')
+
+
+class TestReceiptOutbox(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        user = User(email='test@example.com', password='password', business_name='Ada Stores')
+        db.session.add(user)
+        db.session.commit()
+        customer = Customer(first_name='Bola', email='bola@example.com', phone_number='0800', user_id=user.id)
+        silent = Customer(first_name='Eze', phone_number='0801', user_id=user.id)
+        db.session.add_all([customer, silent])
+        db.session.commit()
+        self.user_id, self.customer_id, self.silent_id = user.id, customer.id, silent.id
+        self.headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity=user))}
+
+        self.sink = SMTPSink()
+        threading.Thread(target=self.sink.serve_forever, daemon=True).start()
+        self.config = dict(app.config, SMTP_HOST='127.0.0.1', SMTP_PORT=self.sink.server_address[1],
+                           SMTP_POOL_SIZE=2, OUTBOX_BATCH_SIZE=3)
+
+    def tearDown(self):
+        self.sink.shutdown()
+        self.sink.server_close()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def log_transaction(self, customer_id, amount_paid=0):
+        payload = {'customer_id': customer_id, 'product_name': 'Rice', 'delivery_address': 'Lagos', 'rate': 50,
+                   'number_of_items': 2, 'total_price': 100, 'delivery_fee': 10, 'amount_paid': amount_paid}
+        response = self.app.post('/transactions?action=LOG-TRANSACTION&response=delta', json=payload,
+                                 headers=self.headers)
+        return response.get_json(force=True)['data']['transaction']['transaction_id']
+
+    def pay(self, transaction_id, amount):
+        self.app.post('/transactions?action=UPDATE-TRANSACTION-INFO&response=delta', headers=self.headers,
+                      json={'transaction_id': transaction_id, 'customer_id': self.customer_id, 'amount_paid': amount})
+
+    def queue(self, recipient):
+        message = ReceiptOutbox(user_id=self.user_id, recipient=recipient, subject='Receipt', body='Thanks',
+                                next_attempt_at=utcnow())
+        db.session.add(message)
+        db.session.commit()
+        return message.id
+
+    def test_receipt_queued_when_transaction_becomes_paid(self):
+        transaction_id = self.log_transaction(self.customer_id)
+        self.pay(transaction_id, 60)
+        self.assertEqual(ReceiptOutbox.query.count(), 0)
+
+        self.pay(transaction_id, 50)
+        message = ReceiptOutbox.query.one()
+        self.assertEqual((message.recipient, message.status, message.transaction_id),
+                         ('bola@example.com', 'pending', transaction_id))
+        self.assertIn('Amount paid: 110.00', message.body)
+        self.assertEqual(message.subject, 'Payment receipt from Ada Stores')
+
+        # paid in full when logged; no address to send to
+        self.log_transaction(self.customer_id, amount_paid=110)
+        self.log_transaction(self.silent_id, amount_paid=110)
+        self.assertEqual(ReceiptOutbox.query.count(), 2)
+        self.assertEqual(self.sink.connections, 0)
+
+    def test_sender_drains_outbox_over_pooled_connections(self):
+        for number in range(7):
+            self.queue('customer{}@example.com'.format(number))
+        self.assertEqual(outbox.send_receipts(self.config, once=True), 7)
+
+        self.assertEqual(sorted(message['To'] for message in self.sink.messages),
+                         sorted('customer{}@example.com'.format(number) for number in range(7)))
+        self.assertLessEqual(self.sink.connections, 2)
+        self.assertEqual({message.status for message in ReceiptOutbox.query.all()}, {'sent'})
+        self.assertTrue(self.sink.messages[0]['Message-ID'].startswith('<receipt-'))
+        self.assertEqual(outbox.send_receipts(self.config, once=True), 0)
+        self.assertEqual(len(self.sink.messages), 7)
+
+    def test_failures_are_retried_with_backoff(self):
+        later, bounce = self.queue('later@example.com'), self.queue('bounce@example.com')
+        good = self.queue('good@example.com')
+        outbox.send_receipts(self.config, once=True)
+
+        later, bounce, good = [db.session.get(ReceiptOutbox, message_id) for message_id in (later, bounce, good)]
+        self.assertEqual((good.status, bounce.status, later.status), ('sent', 'failed', 'pending'))
+        self.assertEqual(later.attempts, 1)
+        self.assertIn('451', later.last_error)
+        self.assertGreater(later.next_attempt_at, utcnow() + timedelta(seconds=10))
+
+        # not due yet, so nothing is attempted
+        self.assertEqual(outbox.send_receipts(self.config, once=True), 0)
+
+        later.next_attempt_at, later.attempts = utcnow(), self.config['OUTBOX_MAX_ATTEMPTS'] - 1
+        db.session.commit()
+        outbox.send_receipts(self.config, once=True)
+        self.assertEqual(db.session.get(ReceiptOutbox, later.id).status, 'failed')
+
+    def test_unreachable_server_keeps_messages_pending(self):
+        message_id = self.queue('good@example.com')
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        port = closed.getsockname()[1]
+        closed.close()
+        outbox.send_receipts(dict(self.config, SMTP_PORT=port, SMTP_TIMEOUT=1), once=True)
+
+        message = db.session.get(ReceiptOutbox, message_id)
+        self.assertEqual((message.status, message.attempts), ('pending', 1))
+
+if __name__ == '__main__':
+    unittest.main()
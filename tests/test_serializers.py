@@ -0,0 +1,62 @@
+import json
+import unittest
+from datetime import datetime
+from myapp import app, db
+from myapp.models import User, Customer, Transaction
+from myapp.functions import resources as resource
+from myapp.functions import serializers
+
+
+class TestSerializers(unittest.TestCase):
+    def setUp(self):
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        user = User(email='plan@example.com', password='x', first_name='Ada')
+        db.session.add(user)
+        db.session.commit()
+        customer = Customer(first_name='Bola', phone_number='0800', user_id=user.id)
+        db.session.add(customer)
+        db.session.commit()
+        self.user_id, self.customer_id = user.id, customer.id
+
+        self.transaction = Transaction(customer_id=customer.id, product_name='Rice', delivery_address='Lagos',
+                                       order_date=datetime(2023, 1, 2, 3, 4, 5), rate=10, number_of_items=3,
+                                       total_price=30, delivery_fee=2, amount_payable=32, amount_paid=0,
+                                       remaining_balance=32, payment_status='pending')
+        db.session.add(self.transaction)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_rows_match_objects(self):
+        rows = resource.fetch_customer_transactions(self.customer_id)
+        self.assertEqual(rows, [resource.serialize_transaction(self.transaction)])
+        self.assertEqual(rows[0]['order_date'], '2023-01-02 03:04:05')
+        self.assertIsNone(rows[0]['due_date'])
+        self.assertEqual(rows[0]['quantity'], 3)
+
+    def test_customer_and_user_info(self):
+        customers = resource.fetch_customer_info(self.user_id)
+        self.assertEqual(customers, [resource.fetch_customer_info(self.user_id, self.customer_id)])
+        self.assertEqual(customers[0]['first_name'], 'Bola')
+        self.assertEqual(resource.fetch_customer_info(self.user_id, self.customer_id + 1), {})
+
+        user_info = resource.fetch_user_info(self.user_id)
+        self.assertEqual(user_info, resource.serialize_user(db.session.get(User, self.user_id)))
+        self.assertEqual(user_info['customers'], [])
+        self.assertEqual(resource.fetch_user_info(self.user_id + 1), {})
+
+    def test_dumps_round_trips(self):
+        payload = {'status': 1, 'data': resource.fetch_customer_transactions(self.customer_id), 'error': [None]}
+        self.assertEqual(json.loads(serializers.dumps(payload)), payload)
+
+
+if __name__ == '__main__':
+    unittest.main()
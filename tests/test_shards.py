@@ -0,0 +1,143 @@
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from flask import json
+from flask_jwt_extended import create_access_token
+from myapp import app, db
+from myapp.models import User, Customer, Transaction
+from myapp.functions import shards, ledger, overdue
+
+
+class TestShardRegistry(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='fundsflow-shards-')
+        self.registry = shards.ShardRegistry(self.directory, max_open=2, idle_seconds=300)
+
+    def tearDown(self):
+        self.registry.close_all()
+        shutil.rmtree(self.directory)
+
+    def test_closes_least_recently_used_shards(self):
+        first = self.registry.engine(1, db.metadata)
+        self.registry.engine(2, db.metadata)
+        self.assertIs(self.registry.engine(1, db.metadata), first)
+        self.registry.engine(3, db.metadata)  # 2 is now the least recently used
+        self.assertEqual(self.registry.stats(), {'open': 2, 'opened': 3, 'closed': 1})
+        self.assertIs(self.registry.engine(1, db.metadata), first)
+        self.assertEqual(self.registry.businesses(), [1, 2, 3])
+
+    def test_closes_idle_shards(self):
+        self.registry.engine(1, db.metadata)
+        self.registry.idle_seconds = 0
+        self.registry.close_idle()
+        self.assertEqual(self.registry.stats()['open'], 0)
+
+    def test_new_shard_has_the_sharded_tables(self):
+        self.registry.engine(7, db.metadata)
+        tables = {name for name, in sqlite3.connect(self.registry.path(7)).execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.assertTrue(shards.SHARDED_TABLES <= tables)
+        self.assertIn('customer_search', tables)
+        self.assertNotIn('user', tables)
+
+
+class TestShardedRequests(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        self.directory = tempfile.mkdtemp(prefix='fundsflow-shards-')
+        self.registry = shards.ShardRegistry(self.directory, max_open=4, idle_seconds=300)
+        self.sharding = mock.patch.object(shards, '_registry', self.registry)
+        self.sharding.start()
+
+        ada = User(email='ada@example.com', password='password')
+        obi = User(email='obi@example.com', password='password')
+        db.session.add_all([ada, obi])
+        db.session.commit()
+        self.users = {user.id: {'Authorization': 'Bearer {}'.format(create_access_token(identity=user))}
+                      for user in (ada, obi)}
+        self.ada_id, self.obi_id = ada.id, obi.id
+
+    def tearDown(self):
+        db.session.remove()
+        self.sharding.stop()
+        self.registry.close_all()
+        shutil.rmtree(self.directory)
+        db.drop_all()
+        self.app_context.pop()
+
+    def post(self, user_id, url, payload):
+        return json.loads(self.app.post(url, json=payload, headers=self.users[user_id]).data.decode())
+
+    def add_customer(self, user_id, first_name):
+        payload = {'first_name': first_name, 'last_name': 'Okafor', 'email': None, 'phone_number': '0800',
+                   'shipping_address': 'Lagos'}
+        return self.post(user_id, '/customer?action=ADD-CUSTOMER', payload)['data']['id']
+
+    def log_transaction(self, user_id, customer_id, due_date=None):
+        payload = {'customer_id': customer_id, 'product_name': 'Rice', 'delivery_address': 'Lagos', 'rate': 50,
+                   'number_of_items': 2, 'total_price': 100, 'delivery_fee': 0, 'due_date': due_date}
+        data = self.post(user_id, '/transactions?action=LOG-TRANSACTION&response=delta', payload)['data']
+        return data['transaction']['transaction_id']
+
+    def shard_rows(self, user_id, table):
+        connection = sqlite3.connect(self.registry.path(user_id))
+        try:
+            return [row_id for row_id, in connection.execute('SELECT id FROM "{}" ORDER BY id'.format(table))]
+        finally:
+            connection.close()
+
+    def test_each_business_writes_to_its_own_shard(self):
+        ada_customer = self.add_customer(self.ada_id, 'Chinedu')
+        obi_customer = self.add_customer(self.obi_id, 'Ngozi')
+        ada_transaction = self.log_transaction(self.ada_id, ada_customer)
+        obi_transaction = self.log_transaction(self.obi_id, obi_customer)
+
+        self.assertNotEqual(ada_customer, obi_customer)
+        self.assertNotEqual(ada_transaction, obi_transaction)
+        self.assertEqual(self.shard_rows(self.ada_id, 'customer'), [ada_customer])
+        self.assertEqual(self.shard_rows(self.obi_id, 'transaction'), [obi_transaction])
+        # the main database only holds the users and their summaries
+        with db.engine.connect() as connection:
+            self.assertEqual(connection.exec_driver_sql('SELECT count(*) FROM customer').scalar(), 0)
+
+        data = self.post(self.ada_id, '/customer?action=FETCH-CUSTOMERS', {})['data']
+        self.assertEqual([customer['id'] for customer in data], [ada_customer])
+        data = self.post(self.obi_id, '/customer?action=SEARCH-CUSTOMERS', {'query': 'ng'})['data']
+        self.assertEqual([customer['id'] for customer in data], [obi_customer])
+        summary = self.post(self.ada_id, '/customer?action=FETCH-BALANCE-SUMMARY', {})['data']
+        self.assertEqual((summary['transaction_count'], summary['outstanding']), (1, 100))
+
+    def test_sharded_tables_need_a_business(self):
+        with self.assertRaises(RuntimeError):
+            Customer.query.count()
+        with shards.use_business(self.ada_id):
+            self.assertEqual(Customer.query.count(), 0)
+
+    def test_jobs_visit_every_shard(self):
+        past = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
+        ids = [self.log_transaction(user_id, self.add_customer(user_id, 'Chinedu'))
+               for user_id in (self.ada_id, self.obi_id)]
+        for user_id in (self.ada_id, self.obi_id):
+            with shards.use_business(user_id):
+                Transaction.query.update({'due_date': datetime.strptime(past, '%Y-%m-%d %H:%M:%S')})
+                db.session.commit()
+
+        self.assertEqual(overdue.run_sweeper(app.config, once=True), 2)
+        for user_id, transaction_id in zip((self.ada_id, self.obi_id), ids):
+            with shards.use_business(user_id):
+                self.assertEqual(db.session.get(Transaction, transaction_id).payment_status, 'overdue')
+        self.assertEqual(ledger.rebuild_balance_summaries(check_only=True), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
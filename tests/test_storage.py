@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+import unittest
+from sqlalchemy import create_engine
+from myapp import app
+
+SYNCHRONOUS_LEVELS = {'OFF': 0, 'NORMAL': 1, 'FULL': 2, 'EXTRA': 3}
+SWITCHES = {'ON': 1, 'TRUE': 1, 'YES': 1, '1': 1, 'OFF': 0, 'FALSE': 0, 'NO': 0, '0': 0}
+
+
+class TestStorageProfile(unittest.TestCase):
+    """
+    Opens a database file, as the servers do (the tests otherwise run on an in-memory
+    database), and reads back the pragmas the connect hook should have applied.
+    """
+
+    def setUp(self):
+        self.pragmas = app.config['SQLITE_PRAGMAS']
+        if not self.pragmas:
+            self.skipTest('SQLITE_STORAGE_PROFILE=default applies no pragmas')
+        self.directory = tempfile.mkdtemp(prefix='fundsflow-storage-')
+        self.engine = create_engine('sqlite:///' + os.path.join(self.directory, 'fundsflow.db'))
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def read_pragma(self, name):
+        with self.engine.connect() as connection:
+            return connection.exec_driver_sql('PRAGMA {}'.format(name)).scalar()
+
+    def test_profile_is_applied_to_new_connections(self):
+        self.assertEqual(self.read_pragma('journal_mode').lower(), str(self.pragmas['journal_mode']).lower())
+        synchronous = str(self.pragmas['synchronous']).upper()
+        self.assertEqual(self.read_pragma('synchronous'), SYNCHRONOUS_LEVELS.get(synchronous, synchronous))
+        self.assertEqual(self.read_pragma('busy_timeout'), int(self.pragmas['busy_timeout']))
+        # not part of the profile unless configured, so sqlite's default (off) applies
+        foreign_keys = str(self.pragmas.get('foreign_keys', 'OFF')).upper()
+        self.assertEqual(self.read_pragma('foreign_keys'), SWITCHES[foreign_keys])
+
+    def test_every_pooled_connection_gets_the_profile(self):
+        # synchronous is per connection, and defaults to FULL where the hook did not run
+        synchronous = str(self.pragmas['synchronous']).upper()
+        connections = [self.engine.connect() for _ in range(2)]
+        try:
+            for connection in connections:
+                self.assertEqual(connection.exec_driver_sql('PRAGMA synchronous').scalar(),
+                                 SYNCHRONOUS_LEVELS.get(synchronous, synchronous))
+        finally:
+            for connection in connections:
+                connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from datetime import timedelta
+from flask import json
+from flask_jwt_extended import create_access_token
+from myapp import app, db
+from myapp.models import User, RevokedToken
+from myapp.functions.blocklist import BloomFilter, blocklist, utcnow
+
+
+class TestTokenBlocklist(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        # start from an empty schema even if an earlier test left rows behind
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        user = User(email='test@example.com', password='password')
+        db.session.add(user)
+        db.session.commit()
+        self.user = user
+        blocklist.purge()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_logout_revokes_token(self):
+        headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity=self.user))}
+        response = self.app.post('/logout', headers=headers)
+        self.assertEqual(json.loads(response.data.decode())['status'], 1)
+        self.assertEqual(RevokedToken.query.count(), 1)
+
+        response = self.app.post('/logout', headers=headers)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(json.loads(response.data.decode())['status'], 2)
+
+    def test_revocations_from_other_workers_are_synced(self):
+        # simulate another process writing straight to the table
+        RevokedToken.add_revoked_token('other-worker-jti', self.user.id, utcnow() + timedelta(hours=1))
+        blocklist.sync()
+        self.assertTrue(blocklist.is_revoked('other-worker-jti'))
+        self.assertFalse(blocklist.is_revoked('unknown-jti'))
+
+    def test_purge_removes_expired_tokens(self):
+        blocklist.revoke('expired-jti', self.user.id, utcnow() - timedelta(minutes=1))
+        blocklist.revoke('live-jti', self.user.id, utcnow() + timedelta(hours=1))
+        self.assertEqual(blocklist.purge(), 1)
+        self.assertFalse(blocklist.is_revoked('expired-jti'))
+        self.assertTrue(blocklist.is_revoked('live-jti'))
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        keys = ['jti-{}'.format(i) for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        false_positives = sum('other-{}'.format(i) in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+from flask import json
+from flask_jwt_extended import create_access_token
+from myapp import app, db
+from myapp.models import User, Customer
+
+
+class TestTransactionDeltas(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        # start from an empty schema even if an earlier test left rows behind
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        user = User(email='test@example.com', password='password')
+        db.session.add(user)
+        db.session.commit()
+        customer = Customer(first_name='Ada', phone_number='0800000000', user_id=user.id)
+        db.session.add(customer)
+        db.session.commit()
+        self.customer_id = customer.id
+        self.headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity=user))}
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def post(self, action, payload, delta=True):
+        url = '/transactions?action={}{}'.format(action, '&response=delta' if delta else '')
+        response = self.app.post(url, json=payload, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data.decode())
+
+    def log_transaction(self, delta=True):
+        payload = {'customer_id': self.customer_id, 'product_name': 'Rice', 'product_description': None,
+                   'order_date': '2024-01-01 10:00:00', 'delivery_address': 'Lagos', 'delivery_date': None,
+                   'rate': 50, 'number_of_items': 2, 'discount': 0, 'total_price': 100, 'delivery_fee': 10,
+                   'invoice_link': None, 'receipt_link': None, 'amount_paid': 0, 'due_date': None}
+        return self.post('LOG-TRANSACTION', payload, delta)
+
+    def test_log_update_delete_return_deltas(self):
+        data = self.log_transaction()['data']
+        self.assertEqual(data['ledger_version'], 1)
+        self.assertEqual(data['transaction']['remaining_balance'], 110)
+        transaction_id = data['transaction']['transaction_id']
+
+        data = self.post('UPDATE-TRANSACTION-INFO', {'customer_id': self.customer_id,
+                                                     'transaction_id': transaction_id, 'amount_paid': 110})['data']
+        self.assertEqual(data['ledger_version'], 2)
+        self.assertEqual(data['transaction']['payment_status'], 'paid')
+
+        data = self.post('DELETE-TRANSACTION', {'customer_id': self.customer_id,
+                                                'transaction_id': transaction_id})['data']
+        self.assertEqual(data, {'deleted_transaction_id': transaction_id, 'ledger_version': 3})
+
+    def test_full_response_is_default(self):
+        self.log_transaction()
+        data = self.log_transaction(delta=False)['data']
+        self.assertIsInstance(data, list)
+        self.assertEqual(len(data), 2)
+        self.assertEqual(db.session.get(Customer, self.customer_id).ledger_version, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from flask import json
+from flask_jwt_extended import create_access_token
+from myapp import app, db
+from myapp.models import User
+from myapp.functions import user_cache
+
+
+class TestUserLookupCache(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        user_cache.get_cache().clear()
+
+        user = User(email='test@example.com', password='password')
+        db.session.add(user)
+        db.session.commit()
+        self.user_id = user.id
+        self.headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity=user))}
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_repeated_requests_hit_the_cache(self):
+        before = user_cache.stats()
+        for _ in range(3):
+            response = self.app.post('/customer?action=FETCH-CUSTOMERS', json={}, headers=self.headers)
+            self.assertEqual(json.loads(response.data.decode())['status'], 1)
+        after = user_cache.stats()
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 2)
+
+    def test_personal_info_update_invalidates_snapshot(self):
+        self.assertIsNone(user_cache.lookup_user(self.user_id).first_name)
+        self.app.post('/signup?action=REGISTER-USER-PERSONAL-INFORMATION',
+                      json={'user_id': self.user_id, 'first_name': 'ada', 'last_name': 'obi', 'phone': '0800'})
+        self.assertEqual(user_cache.lookup_user(self.user_id).first_name, 'Ada')
+
+    def test_orm_changes_invalidate_snapshot(self):
+        self.assertEqual(user_cache.lookup_user(self.user_id).block_stat, 0)
+        user = db.session.get(User, self.user_id)
+        user.block_stat = 1
+        db.session.commit()
+        self.assertEqual(user_cache.lookup_user(self.user_id).block_stat, 1)
+
+    def test_stats_endpoint(self):
+        data = json.loads(self.app.get('/stats/cache').data.decode())
+        self.assertEqual(data['status'], 1)
+        self.assertIn('hits', data['data']['user_lookup'])
+
+
+if __name__ == '__main__':
+    unittest.main()
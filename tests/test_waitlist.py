@@ -0,0 +1,68 @@
+import unittest
+from flask import json
+from sqlalchemy import inspect
+from myapp import app, db
+from myapp.models import WaitList
+
+
+class TestWaitListRoute(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add(self, number):
+        entry = {'name': 'user {}'.format(number), 'email': 'user{}@example.com'.format(number),
+                 'phone': '080{:08d}'.format(number), 'business_type': 'retail', 'reason': None}
+        return json.loads(self.app.post('/waitlist/add', json=entry).data.decode())
+
+    def test_add_returns_only_new_entry(self):
+        self.add(1)
+        data = self.add(2)
+        self.assertEqual(data['status'], 1)
+        self.assertEqual(data['data']['email'], 'user2@example.com')
+        self.assertEqual(data['data']['name'], 'User 2')
+        self.assertEqual(self.add(2)['message'], 'Email already exists')
+
+    def test_paginated_fetch(self):
+        for number in range(7):
+            self.add(number)
+        seen, cursor = [], ''
+        while True:
+            data = json.loads(self.app.get('/waitlist/fetch?limit=3&cursor={}'.format(cursor)).data.decode())['data']
+            seen.extend(entry['wid'] for entry in data['waitlist'])
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(len(seen), 7)
+
+    def test_ndjson_stream(self):
+        for number in range(5):
+            self.add(number)
+        response = self.app.get('/waitlist/fetch?format=ndjson')
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = response.data.decode().splitlines()
+        self.assertEqual(len(lines), WaitList.query.count())
+        self.assertEqual(json.loads(lines[0])['email'], 'user0@example.com')
+
+    def test_entries_live_in_the_waitlist_database(self):
+        self.add(1)
+        self.assertIsNot(db.engines['waitlist'], db.engine)
+        self.assertFalse(inspect(db.engine).has_table('wait_list'))
+        with db.engines['waitlist'].connect() as connection:
+            self.assertEqual(connection.exec_driver_sql('SELECT email FROM wait_list').scalars().all(),
+                             ['user1@example.com'])
+
+
+if __name__ == '__main__':
+    unittest.main()